@@ -1,12 +1,26 @@
 # ai_text.py
 import os
 import json
-import base64
+import time
+import hashlib
 import logging
-from typing import Dict, Any, List, Optional
-
-import httpx
-from openai import OpenAI
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+from openai import APIConnectionError, APIStatusError, OpenAI
+
+import image_prep
+import llm_metrics
+import llm_repair
+import model_health
+import pdf_raster
+from llm_client import get_client
+from model_health import Deadline, DeadlineExceeded
+from model_routes import RouteTable
+from materials import BOM_UNITS, KEYS, MATERIALS, REGISTRY_VERSION, STAFF_UNITS, norm_unit, to_canonical
+from response_cache import ResponseCache, make_key, normalize_prompt
+from singleflight import SingleFlight
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
@@ -14,50 +28,56 @@ log.setLevel(logging.INFO)
 # Model can be overridden via env
 MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
-# Inventory keys you price
-ALLOWED_KEYS: List[str] = [
-    # Aggregates
-    "sand_m3", "sharp_sand_m3", "gravel_m3", "red_sand_m3", "backfill_m3", "soakaway_boulders_m3",
-    # Cement
-    "cement_bag", "cement_bag_eco", "cement_bag_premium", "cement_loose_lb",
-    # Blocks
-    "block_4in", "block_6in", "block_8in", "block_clay_4in",
-    # Steel (per meter)
-    "rebar_corr_3_8_m", "rebar_corr_1_2_m", "rebar_corr_5_8_m",
-    "rebar_mild_3_8_m", "rebar_mild_1_2_m", "rebar_mild_5_8_m",
-    # Mesh / wire / purlins
-    "mesh_A142_sheet", "tie_wire_kg", "purlin_z_m", "purlin_c_m",
-    # Paint
-    "paint_gal",
-]
+
+class OutputTruncated(RuntimeError):
+    """The model stopped at max_tokens (finish_reason "length"); its answer is incomplete."""
+
+    def __init__(self, message: str, usage: Any = None):
+        super().__init__(message)
+        self.usage = usage  # the tokens were still billed
+
+# Inventory keys you price (registry order, as shown to the models)
+ALLOWED_KEYS: List[str] = list(KEYS)
+
+# Model calls run on a bounded pool so a slow one can be hedged; the request thread just waits.
+# Every attempt holds one of LLM_CALL_THREADS slots until it returns, so nothing queues in the pool.
+LLM_HEDGING = os.getenv("LLM_HEDGING", "1") != "0"
+LLM_CALL_THREADS = max(1, int(os.getenv("LLM_CALL_THREADS", "16")))
+_LLM_POOL = ThreadPoolExecutor(max_workers=LLM_CALL_THREADS, thread_name_prefix="llm-call")
+_LLM_SLOTS = threading.BoundedSemaphore(LLM_CALL_THREADS)
+
+# Invoice/receipt PDF pages with a real text layer are sent as text, not images ("0" disables)
+PDF_TEXT_LAYER = os.getenv("PDF_TEXT_LAYER", "1") != "0"
+
+# Repeated /api/chat prompts are answered from here (None when RESPONSE_CACHE=0)
+RESPONSE_CACHE = ResponseCache.from_env()
+
+# Concurrent identical requests (double clicks, client retries) share one model call
+SINGLE_FLIGHT = SingleFlight.from_env()
+
+# Model tier, max output tokens, timeout and latency SLO per entry point (op)
+MODEL_ROUTES = RouteTable.from_env()
 
 # Units we accept and will normalize to
-_ALLOWED_UNITS = {"m3", "m", "kg", "bag", "sheet", "pcs", "gal", "lb"}
+_ALLOWED_UNITS = BOM_UNITS
 
 # Staff purchases/receipts also allow cubic yards
-_ALLOWED_UNITS_STAFF = {"yd3", "m3", "m", "kg", "bag", "sheet", "pcs", "gal", "lb"}
+_ALLOWED_UNITS_STAFF = STAFF_UNITS
 
 def _make_client() -> Optional[OpenAI]:
-    """Create an OpenAI client. Returns None if no API key is configured."""
-    key = os.getenv("OPENAI_API_KEY")
-    if not key:
-        log.warning("OPENAI_API_KEY is not set")
-        return None
-
-    proxy = os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
-    if proxy:
-        http_client = httpx.Client(proxies=proxy, timeout=60.0)
-    else:
-        http_client = httpx.Client(timeout=60.0)
+    """The shared, pooled OpenAI client (see llm_client). Returns None if no API key is configured."""
+    return get_client()
 
-    return OpenAI(api_key=key, http_client=http_client)
 
-
-def _get_model_sequence(kind: str) -> List[str]:
-    """Return primary model followed by fallback candidates for the given kind.
+def _get_model_sequence(kind: str, op: Optional[str] = None) -> List[str]:
+    """Return primary model followed by fallback candidates for op's route
+    (see model_routes), or for the given kind when op has no route.
     kind: "text" | "vision"
     Can be overridden by env OPENAI_MODEL and OPENAI_MODEL_FALLBACKS (comma-separated).
     """
+    routed = MODEL_ROUTES.models(op) if op else None
+    if routed:
+        return routed
     primary = os.getenv("OPENAI_MODEL", MODEL)
     fallbacks_env = os.getenv("OPENAI_MODEL_FALLBACKS", "").strip()
 
@@ -79,75 +99,227 @@ def _get_model_sequence(kind: str) -> List[str]:
     return sequence
 
 
+def _start_attempt(fn, *args) -> Future:
+    """
+    fn(*args) on the call pool; the caller holds a _LLM_SLOTS slot, released
+    when the attempt ends (an abandoned hedge keeps its slot until then). With
+    a slot per running attempt the pool never queues, so the hedge timer
+    measures the model, and in-flight attempts stay capped under a burst.
+    """
+    fut = _LLM_POOL.submit(fn, *args)
+    fut.add_done_callback(lambda _f: _LLM_SLOTS.release())
+    return fut
+
+
+def _is_model_fault(e: BaseException) -> bool:
+    """5xx, timeouts and connection errors say the model is unwell; a 4xx about one request does not."""
+    if isinstance(e, APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(e, APIStatusError):
+        return e.status_code >= 500
+    return isinstance(e, (TimeoutError, ConnectionError))
+
+
 def _chat_completion_with_fallback(
     client: OpenAI,
     *,
     messages: List[Dict[str, Any]],
     response_format: Optional[Dict[str, Any]] = None,
-    timeout: float = 60.0,
+    timeout: Optional[float] = None,
     model_kind: str = "text",
+    stream: bool = False,
+    deadline: Optional[Deadline] = None,
+    op: str = "unknown",
 ):
-    """Try primary model then fallbacks until one succeeds, else re-raise last error."""
-    last_err: Optional[BaseException] = None
-    for model_name in _get_model_sequence(model_kind):
+    """
+    Try primary model then fallbacks until one succeeds, else re-raise last error.
+    - Models whose circuit breaker is open are skipped (see model_health).
+      Only 5xx, timeouts and connection errors count against a breaker.
+    - If the newest call has not answered after its model's hedge_after()
+      (a latency percentile), the next model is asked too; the first success
+      wins and the slower call is left to finish in the background.
+    - With a deadline, every attempt's timeout is capped to the time left and
+      DeadlineExceeded is raised once it runs out.
+    With stream=True the chunk iterator is returned and there is no hedging;
+    fallback only covers errors raised before the first chunk, and the time
+    to the first chunk is kept out of the model's latency window.
+    op's route (model_routes) picks the models, max output tokens and the
+    default timeout, and is told each successful call's wall time. An answer
+    cut off at max_tokens (finish_reason "length") counts as a failed
+    attempt, so the next model is tried and, failing that, the call errors.
+    Every call is recorded in llm_metrics under op (the calling function).
+    """
+    # The fallback chain, breaker and hedge replace the SDK's own retries, so a
+    # failure is seen (and counted) at once instead of after backoff.
+    client = client.with_options(max_retries=0)
+    route = MODEL_ROUTES.get(op)
+    if timeout is None:
+        timeout = route.timeout if route is not None else 60.0
+
+    def attempt(model_name: str, attempt_timeout: float):
+        kwargs: Dict[str, Any] = {"model": model_name, "messages": messages, "timeout": attempt_timeout}
+        if route is not None and route.max_tokens is not None:
+            kwargs["max_tokens"] = route.max_tokens
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+        if stream:
+            kwargs["stream"] = True
+            kwargs["stream_options"] = {"include_usage": True}
+        t0 = time.monotonic()
         try:
-            if response_format is not None:
-                return client.chat.completions.create(
-                    model=model_name,
-                    response_format=response_format,
-                    messages=messages,
-                    timeout=timeout,
-                )
-            else:
-                return client.chat.completions.create(
-                    model=model_name,
-                    messages=messages,
-                    timeout=timeout,
-                )
+            resp = client.chat.completions.create(**kwargs)
         except Exception as e:  # API errors: BadRequestError, RateLimitError, etc.
-            log.warning("Model %s failed: %s", model_name, e)
-            last_err = e
-            continue
-    if last_err is not None:
-        raise last_err
-    raise RuntimeError("No model candidates available for completion")
+            if _is_model_fault(e):
+                model_health.health(model_name).record(False, time.monotonic() - t0, e)
+            else:
+                model_health.health(model_name).record_rejected(e)
+            raise
+        model_health.health(model_name).record(True, time.monotonic() - t0, sample=not stream)
+        if not stream and resp.choices and getattr(resp.choices[0], "finish_reason", None) == "length":
+            # the model is fine; the answer is not. Try the next model rather than use half of it
+            raise OutputTruncated(f"{model_name} stopped at max_tokens", getattr(resp, "usage", None))
+        return resp
+
+    models = _get_model_sequence(model_kind, op)
+    queue = [m for m in models if model_health.health(m).available()] or models[:1]
+    first = True
+    launched: List[str] = []
+    hedges = 0
+    t_start = time.perf_counter()
+    images, payload_bytes = llm_metrics.payload_size(messages)
+
+    def finish(model: str, usage: Any = None, error: Optional[BaseException] = None) -> None:
+        wall = time.perf_counter() - t_start
+        if error is None:
+            MODEL_ROUTES.observe(op, wall)
+        llm_metrics.METRICS.record(
+            op, model, ok=error is None, wall_ms=wall * 1000.0,
+            attempts=len(launched), fallback=model != models[0], hedged=hedges > 0,
+            usage=usage, images=images, payload_bytes=payload_bytes, error=error,
+        )
+
+    def spent(model: str, fut: Future) -> None:
+        """Tokens billed for an attempt that did not produce the answer (hedge loser, cut-off reply)."""
+        if fut.cancelled():
+            return
+        e = fut.exception()
+        usage = getattr(e, "usage", None) if e is not None else getattr(fut.result(), "usage", None)
+        if usage is not None:
+            llm_metrics.METRICS.record_usage(op, model, usage)
+
+    def launch(hedge: bool = False) -> Optional[Future]:
+        """Start the next allowed model. A hedge only takes a free slot; otherwise wait up to the timeout for one."""
+        nonlocal first, hedging
+        while queue:
+            t = deadline.clamp(timeout) if deadline is not None else timeout
+            if not _LLM_SLOTS.acquire(timeout=0 if hedge else t):
+                if hedge:
+                    hedging = False  # every slot is busy; don't add load, wait for what is running
+                    return None
+                raise TimeoutError(f"all {LLM_CALL_THREADS} model call slots stayed busy for {t:g}s")
+            m = queue.pop(0)
+            # the first model is always tried, so an all-open chain still probes
+            if model_health.health(m).allow() or (first and not queue):
+                first = False
+                launched.append(m)
+                fut = _start_attempt(attempt, m, t)
+                pending[fut] = (m, time.monotonic())
+                return fut
+            _LLM_SLOTS.release()
+        return None
+
+    pending: Dict[Future, Any] = {}
+    last_err: Optional[BaseException] = None
+    hedging = LLM_HEDGING and not stream
+    try:
+        launch()
+        while pending:
+            wait_for: Optional[float] = None
+            if hedging and queue and len(pending) < 2:
+                m, started = list(pending.values())[-1]
+                wait_for = max(0.0, model_health.health(m).hedge_after() - (time.monotonic() - started))
+            if deadline is not None:
+                left = deadline.remaining()
+                wait_for = left if wait_for is None else min(wait_for, left)
+
+            done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+            if not done:
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded(f"model calls exceeded the {deadline.seconds:g}s deadline")
+                slow = list(pending.values())[-1][0]
+                if launch(hedge=True) is not None:
+                    hedges += 1
+                    log.info("Hedging: %s is slow, also asking %s", slow, list(pending.values())[-1][0])
+                continue
+
+            for fut in done:
+                m, _started = pending.pop(fut)
+                try:
+                    resp = fut.result()
+                except Exception as e:
+                    log.warning("Model %s failed: %s", m, e)
+                    spent(m, fut)
+                    last_err = e
+                    continue
+                if stream:
+                    return llm_metrics.track_stream(resp, lambda usage, err, m=m: finish(m, usage, err))
+                finish(m, getattr(resp, "usage", None))
+                return resp
+            if not pending:
+                launch()
+        if last_err is not None:
+            raise last_err
+        raise RuntimeError("No model candidates available for completion")
+    except Exception as e:
+        finish(launched[-1] if launched else models[0], error=e)
+        raise
+    finally:
+        # Nothing waits for these any more; attempts already running finish in the
+        # background and their tokens are still counted
+        for fut, (m, _started) in pending.items():
+            if not fut.cancel():
+                fut.add_done_callback(lambda f, m=m: spent(m, f))
 
 def _norm_unit(u: str) -> str:
     """Normalize unit strings to our canonical set."""
-    if not isinstance(u, str):
-        return ""
-    u = u.strip().lower()
-    # common synonyms
-    if u in {"meter", "meters", "metre", "metres"}:
-        return "m"
-    if u in {"m^3", "m³", "cubic meter", "cubic meters", "cubic metre", "cubic metres"}:
-        return "m3"
-    if u in {"bags"}:
-        return "bag"
-    if u in {"sheets"}:
-        return "sheet"
-    if u in {"pieces", "piece"}:
-        return "pcs"
-    if u in {"gallon", "gallons"}:
-        return "gal"
-    if u in {"pound", "pounds"}:
-        return "lb"
-    return u
+    return norm_unit(u)
 
 def _norm_unit_staff(u: str) -> str:
     """Normalize unit strings for staff purchases, including cubic yards."""
-    if not isinstance(u, str):
-        return ""
-    u = (u or "").strip().lower()
-    # yards synonyms
-    if u in {"yd", "yds", "yard", "yards", "yd^3", "yd³", "cubic yard", "cubic yards"}:
-        return "yd3"
-    # fall back to generic normalization
-    u2 = _norm_unit(u)
-    return u2
-
-def _validate_lines(raw: Any) -> List[Dict[str, Any]]:
-    """Validate/clean AI-returned lines."""
+    return norm_unit(u, staff=True)
+
+def _load_json(content: str, op: str, repairs: List[str], list_key: Optional[str] = None) -> dict:
+    """
+    The model's JSON object, repaired locally when malformed (see llm_repair)
+    rather than asking again. A bare list is taken as {list_key: list}.
+    Cut-off output raises llm_repair.TruncatedOutput, so the caller fails
+    instead of using a BOM or invoice with lines missing.
+    """
+    try:
+        data, fixed = llm_repair.loads(content)
+    except llm_repair.TruncatedOutput:
+        llm_repair.REPORT.record(op, repairs, ok=False, truncated=True)
+        raise
+    except ValueError:
+        llm_repair.REPORT.record(op, repairs, ok=False)
+        raise
+    repairs.extend(fixed)
+    if isinstance(data, list) and list_key:
+        data = {list_key: data}
+        repairs.append(f"json: bare list taken as {list_key!r}")
+    if not isinstance(data, dict):
+        llm_repair.REPORT.record(op, repairs, ok=False)
+        raise ValueError("Model output is not a JSON object")
+    return data
+
+def _record_repairs(op: str, repairs: List[str]) -> None:
+    llm_repair.REPORT.record(op, repairs)
+    if repairs:
+        log.info("%s: repaired model output: %s", op, "; ".join(repairs))
+
+def _validate_lines(raw: Any, repairs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Validate/clean AI-returned lines. Near-miss keys and units are mapped
+    onto the registry (llm_repair) and noted in repairs."""
     out: List[Dict[str, Any]] = []
     if not isinstance(raw, list):
         return out
@@ -158,7 +330,12 @@ def _validate_lines(raw: Any) -> List[Dict[str, Any]]:
         qty = it.get("qty")
         unit = _norm_unit(it.get("unit", ""))
 
-        if k not in ALLOWED_KEYS:
+        if isinstance(k, str) and k not in MATERIALS:
+            fixed = llm_repair.match_key(k)
+            if fixed is not None and repairs is not None:
+                repairs.append(f"key: {k} -> {fixed}")
+            k = fixed
+        if not isinstance(k, str):
             continue
         try:
             qty_f = float(qty)
@@ -166,20 +343,51 @@ def _validate_lines(raw: Any) -> List[Dict[str, Any]]:
             continue
         if qty_f <= 0:
             continue
-        if unit not in _ALLOWED_UNITS:
+        # Convert to the key's own unit (ft -> m, lb -> kg, ...); drop lines
+        # whose unit measures something else (e.g. sand in m)
+        conv = to_canonical(k, qty_f, unit)
+        if conv is None:
+            fixed = llm_repair.match_unit(it.get("unit"))
+            conv = to_canonical(k, qty_f, fixed) if fixed else None
+            if conv is not None and repairs is not None:
+                repairs.append(f"unit: {it.get('unit')} -> {fixed}")
+        if conv is None:
+            log.debug("Dropping %s: unit %r does not fit", k, unit)
             continue
+        qty_f, unit = conv
 
         out.append({"key": k, "qty": qty_f, "unit": unit})
     return out
 
-def propose_bom_with_ai(prompt: str, spec: dict) -> dict:
+def _coalesced(key: str, fn, deadline: Optional[Deadline] = None):
+    """fn() through SINGLE_FLIGHT; a waiter gives up when its deadline does."""
+    if SINGLE_FLIGHT is None:
+        return fn()
+    return SINGLE_FLIGHT.do(key, fn, wait=deadline.remaining() if deadline is not None else None)
+
+def propose_bom_with_ai(prompt: str, spec: dict, deadline: Optional[Deadline] = None) -> dict:
+    """
+    Cached, coalesced front for _propose_bom_with_ai. Only the unpriced lines
+    are cached; callers price them against the current catalog.
+    """
+    key = make_key("bom", normalize_prompt(prompt), spec or {}, _get_model_sequence("text", "propose_bom_with_ai")[0],
+                   REGISTRY_VERSION)
+
+    def call():
+        return _coalesced(key, lambda: _propose_bom_with_ai(prompt, spec, deadline), deadline)
+
+    if RESPONSE_CACHE is None:
+        return call()
+    return RESPONSE_CACHE.get_or_call("bom", key, call, keep=lambda r: bool(r and r.get("lines")))
+
+def _propose_bom_with_ai(prompt: str, spec: dict, deadline: Optional[Deadline] = None) -> dict:
     """
     Ask the model for a STRICT JSON object:
     {
       "lines": [{"key": <ALLOWED_KEYS item>, "qty": <number>, "unit": "m3|m|kg|bag|sheet|pcs|gal|lb"}],
       "notes": "short rationale"
     }
-    Returns {} on failure.
+    Returns {} on failure (including running out of deadline).
     """
     client = _make_client()
     if not client:
@@ -194,7 +402,9 @@ def propose_bom_with_ai(prompt: str, spec: dict) -> dict:
         "  - unit: one of m3, m, kg, bag, sheet, pcs, gal, lb (use these EXACT tokens).\n"
         "If the project is a slab/driveway/pad, include reinforcement: "
         "'mesh_A142_sheet' (typ. one layer) or a rebar grid using 'rebar_corr_3_8_m'.\n"
-        "Use units that match the key (e.g. *_m3 uses m3; rebar_*_m uses m; cement_bag uses bag)."
+        "Use units that match the key (e.g. *_m3 uses m3; rebar_*_m and lumber_*_m use m; "
+        "cement_bag uses bag; plywood_*_sheet uses sheet).\n"
+        "For formwork or framing use lumber_* (e.g. lumber_2x4_m) and plywood_*_sheet."
     )
     user = (
         f"User request: {prompt}\n\n"
@@ -220,27 +430,35 @@ def propose_bom_with_ai(prompt: str, spec: dict) -> dict:
                 {"role": "system", "content": system},
                 {"role": "user", "content": user},
             ],
-            timeout=60.0,
             model_kind="text",
+            op="propose_bom_with_ai",
+            deadline=deadline,
         )
         content = (resp.choices[0].message.content or "").strip()
-        data = json.loads(content)  # should already be a JSON object due to response_format
+        repairs: List[str] = []
+        data = _load_json(content, "propose_bom_with_ai", repairs, list_key="lines")
 
-        cleaned = _validate_lines(data.get("lines"))
+        cleaned = _validate_lines(data.get("lines"), repairs)
+        _record_repairs("propose_bom_with_ai", repairs)
         return {"lines": cleaned, "notes": data.get("notes", "")}
     except Exception as e:
         log.exception("propose_bom_with_ai failed: %s", e)
         return {}
 
-def expand_steps_with_ai(prompt: str, spec: dict, estimate: dict, default_text: str) -> str:
-    """
-    Optional narrative to accompany the estimate.
-    Returns default_text if API call fails or key missing.
-    """
-    client = _make_client()
-    if not client:
-        return default_text
+def expand_steps_with_ai(prompt: str, spec: dict, estimate: dict, default_text: str,
+                         deadline: Optional[Deadline] = None) -> str:
+    """Cached, coalesced front for _expand_steps_with_ai, keyed on the priced estimate too."""
+    key = make_key("narrative", normalize_prompt(prompt), spec or {}, estimate,
+                   _get_model_sequence("text", "expand_steps_with_ai")[0], REGISTRY_VERSION)
+
+    def call():
+        return _coalesced(key, lambda: _expand_steps_with_ai(prompt, spec, estimate, default_text, deadline), deadline)
 
+    if RESPONSE_CACHE is None:
+        return call()
+    return RESPONSE_CACHE.get_or_call("narrative", key, call, keep=lambda t: bool(t) and t != default_text)
+
+def _steps_messages(prompt: str, spec: dict, estimate: dict) -> List[Dict[str, Any]]:
     sys_msg = (
         "You are a helpful building advisor in Trinidad & Tobago. "
         "Write a short, practical plan using clear bullet points. "
@@ -254,16 +472,28 @@ def expand_steps_with_ai(prompt: str, spec: dict, estimate: dict, default_text:
         f"Estimated total: {estimate.get('total', 0)}\n\n"
         "Give a brief step-by-step plan and a few tips. Avoid brand promotions; keep it neutral and practical."
     )
+    return [
+        {"role": "system", "content": sys_msg},
+        {"role": "user", "content": user_msg},
+    ]
+
+def _expand_steps_with_ai(prompt: str, spec: dict, estimate: dict, default_text: str,
+                          deadline: Optional[Deadline] = None) -> str:
+    """
+    Optional narrative to accompany the estimate.
+    Returns default_text if API call fails or key missing.
+    """
+    client = _make_client()
+    if not client:
+        return default_text
 
     try:
         resp = _chat_completion_with_fallback(
             client,
-            messages=[
-                {"role": "system", "content": sys_msg},
-                {"role": "user", "content": user_msg},
-            ],
-            timeout=60.0,
+            messages=_steps_messages(prompt, spec, estimate),
             model_kind="text",
+            op="expand_steps_with_ai",
+            deadline=deadline,
         )
         text = (resp.choices[0].message.content or "").strip()
         return text or default_text
@@ -271,62 +501,151 @@ def expand_steps_with_ai(prompt: str, spec: dict, estimate: dict, default_text:
         log.exception("expand_steps_with_ai failed: %s", e)
         return default_text
 
+def stream_steps_with_ai(prompt: str, spec: dict, estimate: dict, default_text: str,
+                         deadline: Optional[Deadline] = None) -> Iterator[str]:
+    """
+    expand_steps_with_ai, token by token. Yields text chunks; yields default_text
+    if the call fails before any text arrives, and re-raises a failure after
+    that (the caller has sent part of a narrative and must report it). A cached
+    narrative is yielded whole, and a completed stream is cached like
+    expand_steps_with_ai's result.
+    """
+    key = None
+    if RESPONSE_CACHE is not None:
+        key = make_key("narrative", normalize_prompt(prompt), spec or {}, estimate,
+                       _get_model_sequence("text", "stream_steps_with_ai")[0], REGISTRY_VERSION)
+        cached = RESPONSE_CACHE.get(key)
+        if cached:
+            yield cached
+            return
+
+    client = _make_client()
+    if not client:
+        yield default_text
+        return
+
+    t0 = time.perf_counter()
+    parts: List[str] = []
+    try:
+        stream = _chat_completion_with_fallback(
+            client,
+            messages=_steps_messages(prompt, spec, estimate),
+            model_kind="text",
+            op="stream_steps_with_ai",
+            stream=True,
+            deadline=deadline,
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        log.exception("stream_steps_with_ai failed: %s", e)
+        if parts:
+            raise
+        yield default_text
+        return
+
+    text = "".join(parts).strip()
+    if not text:
+        yield default_text
+    elif key is not None:
+        RESPONSE_CACHE.put(key, "narrative", text, (time.perf_counter() - t0) * 1000.0)
+
 
 # --------------------------
 # Vision (images/PDF → BOM)
 # --------------------------
-def _file_to_data_url(image_path: str) -> Optional[str]:
-    try:
-        with open(image_path, "rb") as f:
-            raw = f.read()
-        # Guess mime by extension; keep simple for v1
-        ext = os.path.splitext(image_path)[1].lower()
-        mime = "image/jpeg" if ext in {".jpg", ".jpeg"} else (
-            "image/png" if ext == ".png" else (
-                "image/webp" if ext == ".webp" else (
-                    "image/gif" if ext == ".gif" else "application/octet-stream"
-                )
-            )
-        )
-        b64 = base64.b64encode(raw).decode("ascii")
-        return f"data:{mime};base64,{b64}"
-    except Exception:
-        log.exception("_file_to_data_url failed for %s", image_path)
-        return None
+def _file_to_data_url(image: Union[str, bytes]) -> Optional[str]:
+    """
+    Preprocessed (rotated, downscaled, recompressed) image as a data: URL; see
+    image_prep. Accepts a file path or PNG bytes from _pdf_to_images.
+    """
+    if isinstance(image, bytes):
+        return image_prep.prepare_bytes(image, "page.png", document=True).data_url
+    prepared = image_prep.prepare(image, document=True)
+    return prepared.data_url if prepared else None
 
 
-def _pdf_to_images(pdf_path: str, max_pages: int = 3, scale: float = 2.0) -> List[str]:
-    """Render first N pages of a PDF to temporary PNG images; return file paths.
-    Requires pypdfium2 and Pillow. Returns [] on failure.
+def _pdf_to_images(pdf_path: str, max_pages: int = 3, scale: float = 2.0,
+                   pages: Optional[Sequence[int]] = None) -> List[bytes]:
+    """Render first N pages (or the given 0-based pages) of a PDF to PNG bytes (cached
+    by content; see pdf_raster). Requires pypdfium2 and Pillow. Returns [] on failure.
     """
     try:
-        import pypdfium2 as pdfium  # type: ignore
+        import pypdfium2  # type: ignore  # noqa: F401
     except Exception:
         log.warning("pypdfium2 not installed; cannot rasterize PDFs")
         return []
+    return pdf_raster.RASTERIZER.render(pdf_path, max_pages=max_pages, scale=scale, pages=pages)
 
-    from tempfile import mkdtemp
-    from pathlib import Path
 
-    out_dir = Path(mkdtemp(prefix="pdfimgs_"))
-    paths: List[str] = []
-    try:
-        pdf = pdfium.PdfDocument(pdf_path)
-        count = min(int(pdf.page_count), int(max_pages))
-        for i in range(count):
-            page = pdf[i]
-            bitmap = page.render(scale=scale)
-            pil_image = bitmap.to_pil()  # requires Pillow
-            out_path = out_dir / f"page_{i+1}.png"
-            pil_image.save(str(out_path), format="PNG")
-            paths.append(str(out_path))
-        return paths
-    except Exception:
-        log.exception("PDF rasterization failed for %s", pdf_path)
-        return []
+def _expand_documents(file_paths: List[str], max_pages: int = 3) -> Tuple[List[str], List[Union[str, bytes]]]:
+    """
+    (page texts, images) for uploaded documents. PDF pages with a usable text
+    layer come back as layout-preserving text; only scanned pages are
+    rasterized. Photos are passed through as paths.
+    """
+    texts: List[str] = []
+    images: List[Union[str, bytes]] = []
+    for p in (file_paths or []):
+        if os.path.splitext(p)[1].lower() != ".pdf":
+            images.append(p)
+            continue
+        page_texts = pdf_raster.RASTERIZER.extract_text(p, max_pages=max_pages) if PDF_TEXT_LAYER else []
+        for i, text in enumerate(page_texts):
+            if text is not None:
+                texts.append(f"--- page {i + 1} of {os.path.basename(p)} ---\n{text}")
+        scanned = [i for i, text in enumerate(page_texts) if text is None]
+        if not page_texts:
+            images.extend(_pdf_to_images(p, max_pages=max_pages))
+        elif scanned:
+            images.extend(_pdf_to_images(p, max_pages=max_pages, pages=scanned))
+    return texts, images
+
+
+def _document_request(instructions: str, file_paths: List[str], op: str) -> Dict[str, Any]:
+    """
+    Chat-completion arguments for extracting from documents: the vision model
+    with images (plus any text pages) when something was scanned, otherwise
+    the text model with the page texts only. op gets a "_pdf_text" variant
+    for the text route so both have their own model route (model_routes)
+    and show up separately in llm_metrics.
+    """
+    texts, images = _expand_documents(file_paths)
+    content: List[Dict[str, Any]] = [{"type": "text", "text": instructions}]
+    content.extend({"type": "text", "text": t} for t in texts)
+    for img in images:
+        data_url = _file_to_data_url(img)
+        if data_url:
+            content.append({"type": "image_url", "image_url": {"url": data_url}})
+    if texts and len(content) == 1 + len(texts):
+        return {"content": "\n\n".join([instructions, "Document text (layout preserved):", *texts]),
+                "model_kind": "text", "op": op.replace("_from_vision", "_from_pdf_text")}
+    return {"content": content, "model_kind": "vision", "op": op}
 
 
 def propose_bom_from_vision(file_paths: List[str], spec: dict) -> dict:
+    """
+    Coalesced front for _propose_bom_from_vision: concurrent requests for the
+    same upload contents and spec share one model call.
+    """
+    if SINGLE_FLIGHT is None:
+        return _propose_bom_from_vision(file_paths, spec)
+    try:
+        digests = []
+        for p in file_paths or []:
+            with open(p, "rb") as f:
+                digests.append(hashlib.sha256(f.read()).hexdigest())
+    except OSError:
+        return _propose_bom_from_vision(file_paths, spec)
+    key = make_key("bom_vision", digests, spec or {}, _get_model_sequence("vision", "propose_bom_from_vision")[0],
+                   REGISTRY_VERSION)
+    return SINGLE_FLIGHT.do(key, lambda: _propose_bom_from_vision(file_paths, spec))
+
+
+def _propose_bom_from_vision(file_paths: List[str], spec: dict) -> dict:
     """
     Build a strict JSON BOM from images/PDFs using a vision-capable model.
     Returns {"lines": [...], "notes": str} or {} on failure.
@@ -344,7 +663,7 @@ def propose_bom_from_vision(file_paths: List[str], spec: dict) -> dict:
     ]
 
     # Expand PDFs into images
-    expanded_images: List[str] = []
+    expanded_images: List[Union[str, bytes]] = []
     for p in (file_paths or []):
         ext = os.path.splitext(p)[1].lower()
         if ext == ".pdf":
@@ -393,12 +712,14 @@ def propose_bom_from_vision(file_paths: List[str], spec: dict) -> dict:
                     *content  # text + images
                 ]},
             ],
-            timeout=60.0,
             model_kind="vision",
+            op="propose_bom_from_vision",
         )
         content_text = (resp.choices[0].message.content or "").strip()
-        data = json.loads(content_text)
-        cleaned = _validate_lines(data.get("lines"))
+        repairs: List[str] = []
+        data = _load_json(content_text, "propose_bom_from_vision", repairs, list_key="lines")
+        cleaned = _validate_lines(data.get("lines"), repairs)
+        _record_repairs("propose_bom_from_vision", repairs)
         return {"lines": cleaned, "notes": data.get("notes", "")}
     except Exception as e:
         log.exception("propose_bom_from_vision failed: %s", e)
@@ -409,10 +730,11 @@ def propose_bom_from_vision(file_paths: List[str], spec: dict) -> dict:
 # Staff: Purchases (OCR + Text)
 # --------------------------
 
-def _validate_purchase_lines(raw: Any) -> List[Dict[str, Any]]:
+def _validate_purchase_lines(raw: Any, repairs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """Validate and clean purchase lines for invoices/receipts.
     Expected fields per line: description (str), unit (allowed), qty (float>0)
     Optional: unit_price (float>=0), line_total (float>=0). If line_total missing, compute.
+    Near-miss units ("cu yd") are mapped by llm_repair and noted in repairs.
     """
     out: List[Dict[str, Any]] = []
     if not isinstance(raw, list):
@@ -422,6 +744,12 @@ def _validate_purchase_lines(raw: Any) -> List[Dict[str, Any]]:
             continue
         description = (it.get("description") or "").strip()
         unit = _norm_unit_staff(it.get("unit", ""))
+        if unit not in _ALLOWED_UNITS_STAFF:
+            fixed = llm_repair.match_unit(it.get("unit"), staff=True)
+            if fixed in _ALLOWED_UNITS_STAFF:
+                if repairs is not None:
+                    repairs.append(f"unit: {it.get('unit')} -> {fixed}")
+                unit = fixed
         qty = it.get("qty")
         try:
             qty_f = float(qty)
@@ -482,12 +810,14 @@ def propose_purchase_from_text(text: str) -> dict:
                 )},
                 {"role": "user", "content": text.strip()},
             ],
-            timeout=60.0,
             model_kind="text",
+            op="propose_purchase_from_text",
         )
         content = (resp.choices[0].message.content or "").strip()
-        data = json.loads(content)
-        lines = _validate_purchase_lines(data.get("lines"))
+        repairs: List[str] = []
+        data = _load_json(content, "propose_purchase_from_text", repairs, list_key="lines")
+        lines = _validate_purchase_lines(data.get("lines"), repairs)
+        _record_repairs("propose_purchase_from_text", repairs)
         out = {
             "supplier_name": (data.get("supplier_name") or "").strip() or None,
             "invoice_date": (data.get("invoice_date") or "").strip() or None,
@@ -517,26 +847,13 @@ def propose_invoice_from_vision(file_paths: List[str]) -> dict:
     if not client:
         return {}
 
-    # Build content blocks with images (expand PDFs)
-    content: List[Dict[str, Any]] = [
-        {"type": "text", "text": (
-            "Extract supplier invoice data. "
-            "Return ONLY JSON with keys: supplier_name?, invoice_date?, invoice_number?, currency?, lines, tax?, total?. "
-            "Each line has: description, unit (yd3/m3/bag/kg/pcs/sheet/gal/lb), qty, unit_price?, line_total?."
-        )}
-    ]
-    expanded_images: List[str] = []
-    for p in (file_paths or []):
-        ext = os.path.splitext(p)[1].lower()
-        if ext == ".pdf":
-            expanded_images.extend(_pdf_to_images(p, max_pages=3))
-        else:
-            expanded_images.append(p)
-    for img_path in expanded_images:
-        data_url = _file_to_data_url(img_path)
-        if not data_url:
-            continue
-        content.append({"type": "image_url", "image_url": {"url": data_url}})
+    # Digital PDFs go as text; photos and scanned pages as images
+    req = _document_request(
+        "Extract supplier invoice data. "
+        "Return ONLY JSON with keys: supplier_name?, invoice_date?, invoice_number?, currency?, lines, tax?, total?. "
+        "Each line has: description, unit (yd3/m3/bag/kg/pcs/sheet/gal/lb), qty, unit_price?, line_total?.",
+        file_paths, "propose_invoice_from_vision",
+    )
 
     system = (
         "You read supplier invoices for building materials. "
@@ -550,14 +867,16 @@ def propose_invoice_from_vision(file_paths: List[str]) -> dict:
             response_format={"type": "json_object"},
             messages=[
                 {"role": "system", "content": system},
-                {"role": "user", "content": content},
+                {"role": "user", "content": req["content"]},
             ],
-            timeout=90.0,
-            model_kind="vision",
+            model_kind=req["model_kind"],
+            op=req["op"],
         )
         content_text = (resp.choices[0].message.content or "").strip()
-        data = json.loads(content_text)
-        lines = _validate_purchase_lines(data.get("lines"))
+        repairs: List[str] = []
+        data = _load_json(content_text, req["op"], repairs, list_key="lines")
+        lines = _validate_purchase_lines(data.get("lines"), repairs)
+        _record_repairs(req["op"], repairs)
         out = {
             "supplier_name": (data.get("supplier_name") or "").strip() or None,
             "invoice_date": (data.get("invoice_date") or "").strip() or None,
@@ -623,12 +942,14 @@ def propose_expenses_from_text(text: str) -> dict:
                 {"role": "system", "content": schema},
                 {"role": "user", "content": text.strip()},
             ],
-            timeout=60.0,
             model_kind="text",
+            op="propose_expenses_from_text",
         )
         content = (resp.choices[0].message.content or "").strip()
-        data = json.loads(content)
+        repairs: List[str] = []
+        data = _load_json(content, "propose_expenses_from_text", repairs, list_key="expenses")
         expenses = _validate_expenses(data.get("expenses"))
+        _record_repairs("propose_expenses_from_text", repairs)
         out = {"expenses": expenses}
         d = (data.get("date") or "").strip()
         if d:
@@ -644,37 +965,28 @@ def propose_expenses_from_vision(file_paths: List[str]) -> dict:
     client = _make_client()
     if not client:
         return {}
-    content: List[Dict[str, Any]] = [{"type": "text", "text": (
-        "Extract company operating expenses from the attached images. "
+    req = _document_request(
+        "Extract company operating expenses from the attached receipts. "
         "Return ONLY JSON with optional 'date' and 'expenses' list where each item has: "
-        "category (salaries|fuel|maintenance|other), description, amount (number>0)."
-    )}]
-    expanded_images: List[str] = []
-    for p in (file_paths or []):
-        ext = os.path.splitext(p)[1].lower()
-        if ext == ".pdf":
-            expanded_images.extend(_pdf_to_images(p, max_pages=3))
-        else:
-            expanded_images.append(p)
-    for img_path in expanded_images:
-        data_url = _file_to_data_url(img_path)
-        if not data_url:
-            continue
-        content.append({"type": "image_url", "image_url": {"url": data_url}})
+        "category (salaries|fuel|maintenance|other), description, amount (number>0).",
+        file_paths, "propose_expenses_from_vision",
+    )
     try:
         resp = _chat_completion_with_fallback(
             client,
             response_format={"type": "json_object"},
             messages=[
                 {"role": "system", "content": "You extract expenses into strict JSON."},
-                {"role": "user", "content": content},
+                {"role": "user", "content": req["content"]},
             ],
-            timeout=90.0,
-            model_kind="vision",
+            model_kind=req["model_kind"],
+            op=req["op"],
         )
         content_text = (resp.choices[0].message.content or "").strip()
-        data = json.loads(content_text)
+        repairs: List[str] = []
+        data = _load_json(content_text, req["op"], repairs, list_key="expenses")
         expenses = _validate_expenses(data.get("expenses"))
+        _record_repairs(req["op"], repairs)
         out = {"expenses": expenses}
         d = (data.get("date") or "").strip()
         if d:
@@ -2,18 +2,23 @@
 import os
 import re
 import json
+import hashlib
+import uuid
 import time as _time
 import logging
 import traceback
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from functools import wraps
 from urllib.parse import urlparse, urljoin
 
+import click
 import requests
 from dotenv import load_dotenv
 from flask import (
-    Flask, render_template, request, redirect, url_for, jsonify, flash, send_from_directory
+    Flask, render_template, request, redirect, url_for, jsonify, flash, send_from_directory,
+    Response, stream_with_context
 )
 from werkzeug.utils import secure_filename
 from flask_sqlalchemy import SQLAlchemy
@@ -24,6 +29,17 @@ from flask_login import (
 )
 from sqlalchemy.exc import IntegrityError
 
+from catalog import PriceCatalog
+from materials import ALLOWED_KEYS, MATERIALS
+from llm_client import pool_stats as llm_pool_stats
+import image_prep
+import llm_metrics
+import model_health
+import pdf_raster
+import jobs
+from jobs import JobError
+from model_health import Deadline
+
 # --------------------------
 # Load environment variables
 # --------------------------
@@ -210,6 +226,7 @@ class PurchaseInvoice(db.Model):
     uploaded_files  = db.Column(db.Text, nullable=True)  # JSON string list of file ids
     created_by      = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     created_at      = db.Column(db.DateTime, default=datetime.utcnow)
+    batch_key       = db.Column(db.String(80), nullable=True, unique=True)  # "<batch id>:<index>" for batch drafts
     lines           = db.relationship("PurchaseLineItem", backref="invoice", lazy=True)
 
 class PurchaseLineItem(db.Model):
@@ -303,6 +320,13 @@ def _ensure_db_initialized() -> None:
                     if "customer_lng" not in r_names:
                         db.session.execute(text("ALTER TABLE sales_receipt ADD COLUMN customer_lng FLOAT;"))
                     db.session.commit()
+                    # Batch drafts are saved once per (batch, invoice) even if the job is retried
+                    cols_p = db.session.execute(text("PRAGMA table_info(purchase_invoice); ")).fetchall()
+                    if "batch_key" not in {c[1] for c in cols_p}:
+                        db.session.execute(text("ALTER TABLE purchase_invoice ADD COLUMN batch_key VARCHAR(80);"))
+                        db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_purchase_invoice_batch_key "
+                                                "ON purchase_invoice (batch_key);"))
+                        db.session.commit()
             _DB_INIT_DONE = True
         except Exception:
             # Log but don't block requests; failures will surface on use
@@ -317,25 +341,43 @@ def _before_request_db_init():
 # --------------------------
 _BA_IMPORT_ERROR = None
 try:
-    from loaders import load_aggregates, load_steel, load_building, merge_prices
+    from snapshot import load_catalog, compile_snapshot
+    import estimator
 except Exception as e:
     _BA_IMPORT_ERROR = f"Import error in loaders: {e}"
     log.exception(_BA_IMPORT_ERROR)
 
+RESPONSE_CACHE = None
+SINGLE_FLIGHT = None
+MODEL_ROUTES = None
 try:
     from ai_text import (
+        RESPONSE_CACHE,
+        SINGLE_FLIGHT,
+        MODEL_ROUTES,
         propose_bom_with_ai,
         expand_steps_with_ai,
+        stream_steps_with_ai,
         propose_bom_from_vision,
         propose_invoice_from_vision,
         propose_purchase_from_text,
         propose_expenses_from_text,
         propose_expenses_from_vision,
     )
+    import staff_text
+    import llm_repair
 except Exception as e:
     _BA_IMPORT_ERROR = (_BA_IMPORT_ERROR + " | " if _BA_IMPORT_ERROR else "") + f"Import error in ai_text: {e}"
     log.exception("AI import error", exc_info=True)
 
+# Batch BOM pricing needs numpy; the rest of BuildAdvisor works without it
+_PRICING_IMPORT_ERROR = None
+try:
+    from pricing import BomPricer
+except Exception as e:
+    _PRICING_IMPORT_ERROR = f"Import error in pricing: {e}"
+    log.warning(_PRICING_IMPORT_ERROR)
+
 # --------------------------
 # CSV path resolution
 # --------------------------
@@ -354,6 +396,10 @@ BUILDING_CSV   = _resolve_csv("BUILDING_CSV",   "building materials.csv")
 STEEL_CSV      = _resolve_csv("STEEL_CSV",      "steel.csv")
 LUMBER_CSV     = _resolve_csv("LUMBER_CSV",     "lumber.csv")
 
+CATALOG_PATHS = {"aggregates": AGGREGATES_CSV, "steel": STEEL_CSV, "building": BUILDING_CSV, "lumber": LUMBER_CSV}
+# Precompiled catalog (`flask --app app build-catalog`); ignored when stale, "" disables
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", os.path.join(DATA_DIR, "catalog.snap"))
+
 # --------------------------
 # Price loading
 # --------------------------
@@ -361,17 +407,88 @@ def _safe_load_prices():
     if _BA_IMPORT_ERROR:
         return {}, {}, _BA_IMPORT_ERROR
     try:
-        agg = load_aggregates(AGGREGATES_CSV)
-        steel_prices, steel_rows = load_steel(STEEL_CSV)
-        building_prices, b_meta = load_building(BUILDING_CSV)
-        prices = merge_prices(agg, steel_prices, building_prices)
-        meta = {"steel_rows": steel_rows, "building_meta": b_meta, "aggregates": agg}
+        # price_bom_lines works off the cheapest-offer view of every supplier row;
+        # the binary snapshot is used when it matches the CSVs, else they are parsed
+        prices, meta = load_catalog(CATALOG_PATHS, CATALOG_SNAPSHOT)
         return prices, meta, None
     except Exception as e:
         log.exception("Failed to load price files")
         return {}, {}, f"Failed to load price files: {e}"
 
-PRICES, META, PRICES_ERROR = _safe_load_prices()
+# Hot-reloadable catalog: readers take PRICE_CATALOG.current() (no locks); a
+# watcher thread rebuilds on CSV mtime changes and swaps the snapshot in.
+PRICE_CATALOG = PriceCatalog(
+    _safe_load_prices,
+    CATALOG_PATHS,
+    poll_seconds=float(os.getenv("CATALOG_POLL_SECONDS", "5") or 0),
+)
+PRICE_CATALOG.start_watcher()
+
+@app.cli.command("build-catalog")
+def build_catalog_command():
+    """Compile the price CSVs into the binary catalog snapshot."""
+    if _BA_IMPORT_ERROR:
+        raise SystemExit(_BA_IMPORT_ERROR)
+    info = compile_snapshot(CATALOG_PATHS, CATALOG_SNAPSHOT)
+    print(json.dumps(info))
+
+GOLDEN_PROMPTS = os.getenv("GOLDEN_PROMPTS", os.path.join("fixtures", "golden_prompts.json"))
+
+def _golden_lines(lines):
+    return sorted((l["key"], l["unit"], round(float(l["qty"]), 3)) for l in lines or [])
+
+@app.cli.command("golden-check")
+@click.option("--update", is_flag=True, help="Rewrite the expected lines from the current output.")
+def golden_check_command(update):
+    """
+    Run the golden prompts and compare the unpriced BOM lines with the saved ones.
+    "template" prompts use estimator.py (an empty expected list means the
+    prompt must not match a template); "llm" prompts call the model (use
+    LLM_REPLAY=replay with recorded fixtures to run offline).
+    """
+    if _BA_IMPORT_ERROR:
+        raise SystemExit(_BA_IMPORT_ERROR)
+    from ai_text import _propose_bom_with_ai
+
+    with open(GOLDEN_PROMPTS, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    failed = skipped = 0
+    for case in golden["cases"]:
+        spec = case.get("spec") or {}
+        if case["path"] == "template":
+            tspec = estimator.match_request(case["prompt"], spec)
+            got = estimator.estimate(tspec)["lines"] if tspec is not None else []
+        else:
+            got = (_propose_bom_with_ai(case["prompt"], spec) or {}).get("lines") or []
+        if update:
+            if got or case["path"] == "template":
+                case["expected"] = [{"key": k, "unit": u, "qty": q} for k, u, q in _golden_lines(got)]
+            else:
+                print(f"SKIP  {case['prompt']!r}: model returned nothing, expected lines kept")
+            continue
+        if case.get("expected") is None:
+            skipped += 1
+            print(f"SKIP  {case['prompt']!r}: no expected lines yet (run with --update)")
+            continue
+        want, have = _golden_lines(case["expected"]), _golden_lines(got)
+        if want == have:
+            print(f"ok    {case['prompt']!r}")
+            continue
+        failed += 1
+        print(f"FAIL  {case['prompt']!r}")
+        for line in sorted(set(want) - set(have)):
+            print(f"      - {line}")
+        for line in sorted(set(have) - set(want)):
+            print(f"      + {line}")
+    if update:
+        with open(GOLDEN_PROMPTS, "w", encoding="utf-8") as f:
+            json.dump(golden, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"updated {len(golden['cases'])} cases in {GOLDEN_PROMPTS}")
+        return
+    print(f"{len(golden['cases']) - failed - skipped} ok, {failed} failed, {skipped} skipped")
+    if failed:
+        raise SystemExit(1)
 
 # --------------------------
 # WiPay helper
@@ -408,24 +525,7 @@ def create_wipay_payment(amount: float, order_id: int) -> str:
 # --------------------------
 # Pricing helpers
 # --------------------------
-ALLOWED_KEYS = {
-    "sand_m3","sharp_sand_m3","gravel_m3","red_sand_m3","backfill_m3","soakaway_boulders_m3",
-    "cement_bag","cement_bag_eco","cement_bag_premium","cement_loose_lb",
-    "block_4in","block_6in","block_8in","block_clay_4in",
-    "rebar_corr_3_8_m","rebar_corr_1_2_m","rebar_corr_5_8_m",
-    "rebar_mild_3_8_m","rebar_mild_1_2_m","rebar_mild_5_8_m",
-    "mesh_A142_sheet","tie_wire_kg","purlin_z_m","purlin_c_m","paint_gal"
-}
-
-def pretty_name(key: str) -> str:
-    if key.endswith("_m3"):    return key.replace("_m3"," (m³)").replace("_"," ")
-    if key.endswith("_m"):     return key.replace("_m"," (m)").replace("_"," ")
-    if key.endswith("_gal"):   return key.replace("_gal"," (gal)").replace("_"," ")
-    if key.endswith("_bag"):   return key.replace("_bag"," (bag)").replace("_"," ")
-    if key.endswith("_sheet"): return key.replace("_sheet"," (sheet)").replace("_"," ")
-    if key.endswith("_kg"):    return key.replace("_kg"," (kg)").replace("_"," ")
-    return key.replace("_"," ")
-
+# Material keys, units and display names live in materials.py (MATERIALS)
 def price_bom_lines(lines, prices):
     out_lines = []
     total = 0.0
@@ -440,17 +540,40 @@ def price_bom_lines(lines, prices):
 
     for it in (lines or []):
         key = it.get("key"); qty = float(it.get("qty", 0) or 0); unit = it.get("unit")
-        if key not in ALLOWED_KEYS:
+        m = MATERIALS.get(key) if isinstance(key, str) else None
+        if m is None:
             continue
         up = _lookup_price(key)
         if up is None:
-            out_lines.append({"name": pretty_name(key) + " — UNPRICED", "qty": qty, "unit": unit, "unit_price": 0, "total": 0})
+            out_lines.append({"name": m.display + " — UNPRICED", "qty": qty, "unit": unit, "unit_price": 0, "total": 0})
             continue
         line_total = qty * float(up)
         total += line_total
-        out_lines.append({"name": pretty_name(key), "qty": round(qty,2), "unit": unit, "unit_price": round(float(up),2), "total": round(line_total,2)})
+        out_lines.append({"name": m.display, "qty": round(qty,2), "unit": unit, "unit_price": round(float(up),2), "total": round(line_total,2)})
     return {"lines": out_lines, "total": round(total,2)}
 
+# Answer routine /api/chat jobs with estimator.py instead of the model ("0" disables)
+LOCAL_ESTIMATOR = os.getenv("LOCAL_ESTIMATOR", "1") != "0"
+
+# Total model time one /api/chat request may spend (BOM + narrative, incl. fallbacks)
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "45"))
+
+# Staff purchase/expense notes parsed locally with at least this confidence skip the model
+# (staff_text.py); above 1 always asks the model
+STAFF_TEXT_MIN_CONFIDENCE = float(os.getenv("STAFF_TEXT_MIN_CONFIDENCE", "0.9"))
+
+BOM_BATCH_MAX_BOMS = int(os.getenv("BOM_BATCH_MAX_BOMS", "1000"))
+BOM_BATCH_MAX_LINES = int(os.getenv("BOM_BATCH_MAX_LINES", "200000"))
+
+_BOM_PRICER = None  # (catalog version, BomPricer) — rebuilt when the catalog swaps
+
+def _bom_pricer(catalog):
+    global _BOM_PRICER
+    cached = _BOM_PRICER
+    if cached is None or cached[0] != catalog.version:
+        cached = _BOM_PRICER = (catalog.version, BomPricer(catalog.prices))
+    return cached[1]
+
 # --------------------------
 # API-only headers & errors
 # --------------------------
@@ -611,6 +734,101 @@ def serve_upload(filename: str):
     # Note: do not list directories; only serve files inside UPLOAD_FOLDER
     return send_from_directory(app.config["UPLOAD_FOLDER"], filename, as_attachment=False)
 
+def _resolve_uploads(file_ids):
+    """file ids -> paths inside UPLOAD_FOLDER. Returns (paths, None) or (None, error response)."""
+    if not isinstance(file_ids, list) or not file_ids:
+        return None, (jsonify({"ok": False, "error": "file_ids must be a non-empty list"}), 400)
+    paths = []
+    for fid in file_ids:
+        # Prevent escaping upload dir
+        fname = secure_filename(str(fid))
+        path = os.path.join(app.config["UPLOAD_FOLDER"], fname)
+        if not os.path.isfile(path):
+            return None, (jsonify({"ok": False, "error": f"File not found: {fid}"}), 400)
+        paths.append(path)
+    return paths, None
+
+# --------------------------
+# Background jobs (vision extraction)
+# --------------------------
+# Vision calls take up to 90 s; run as jobs they don't hold a request thread.
+# Handlers are registered next to their endpoints.
+JOBS = jobs.from_env()
+JOB_EVENTS_MAX_SECONDS = float(os.getenv("JOB_EVENTS_MAX_SECONDS", "300"))
+
+def _wants_async(body: dict) -> bool:
+    """?async=1 or {"async": true} queues the request as a job instead of waiting."""
+    return request.args.get("async") == "1" or body.get("async") is True
+
+def _submit_job(kind: str, payload: dict, owner=None):
+    job_id = JOBS.submit(kind, payload, owner=str(owner) if owner is not None else None)
+    return jsonify({
+        "ok": True, "job_id": job_id, "status": "queued",
+        "poll": url_for("api_job_get", job_id=job_id),
+        "events": url_for("api_job_events", job_id=job_id),
+    }), 202
+
+def _job_view(job: dict) -> dict:
+    return {k: job.get(k) for k in ("id", "kind", "status", "result", "progress", "error",
+                                     "created_at", "started_at", "finished_at")}
+
+def _find_job(job_id: str):
+    """The job if it exists and the caller may see it (staff jobs belong to their submitter)."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return None
+    if job.get("owner") is not None:
+        if not current_user.is_authenticated or str(current_user.id) != job["owner"]:
+            return None
+    return job
+
+@app.get("/api/jobs/<job_id>")
+def api_job_get(job_id: str):
+    """Poll a job: status is queued | running | done | failed; result/error once finished."""
+    job = _find_job(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Job not found"}), 404
+    return jsonify({"ok": True, "job": _job_view(job)})
+
+@app.get("/api/jobs/<job_id>/events")
+def api_job_events(job_id: str):
+    """
+    SSE: a "status" event on every change, "progress" events for jobs that
+    report it, then "done" with the finished job. List fields of a progress
+    event hold only the items appended since the previous event.
+    """
+    job = _find_job(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Job not found"}), 404
+
+    def gen():
+        last, sent, last_scalars = None, {}, None
+        end = _time.monotonic() + JOB_EVENTS_MAX_SECONDS
+        current = job
+        while current is not None:
+            if current["status"] != last:
+                last = current["status"]
+                if last in jobs.TERMINAL:
+                    yield _sse("done", {"ok": True, "job": _job_view(current)})
+                    return
+                yield _sse("status", {"ok": True, "status": last})
+            progress = current.get("progress")
+            if isinstance(progress, dict):
+                delta = {k: v[sent.get(k, 0):] for k, v in progress.items() if isinstance(v, list)}
+                scalars = {k: v for k, v in progress.items() if not isinstance(v, list)}
+                if any(delta.values()) or scalars != last_scalars:
+                    sent.update({k: len(progress[k]) for k in delta})
+                    last_scalars = scalars
+                    yield _sse("progress", {"ok": True, **scalars, **delta})
+            if _time.monotonic() >= end:
+                yield _sse("error", {"ok": False, "error": "Still running; poll the job instead"})
+                return
+            yield ": keepalive\n\n"
+            current = JOBS.wait(job_id, timeout=0.5 if progress is not None else 15.0)
+
+    return Response(stream_with_context(gen()), mimetype="text/event-stream",
+                    headers={"X-Accel-Buffering": "no"})
+
 # --------------------------
 # Auth helpers & routes
 # --------------------------
@@ -1049,30 +1267,34 @@ def api_staff_expenses_save():
     return jsonify({"ok": True})
 
 
+def _job_expenses_extract(payload: dict) -> dict:
+    data = propose_expenses_from_vision(payload["paths"])
+    if not data:
+        raise JobError("AI extraction failed")
+    return {"data": data}
+
+JOBS.register("expenses_extract", _job_expenses_extract)
+
 @app.post("/api/staff/expenses/extract")
 @staff_required
 def api_staff_expenses_extract():
+    """Body: { file_ids: [string], async?: bool } -> AI parsed expenses (or a job id)"""
     try:
         body = request.get_json(force=True) or {}
     except Exception as ex:
         return jsonify({"ok": False, "error": f"Invalid JSON: {ex}"}), 400
-    file_ids = body.get("file_ids") or []
-    if not isinstance(file_ids, list) or not file_ids:
-        return jsonify({"ok": False, "error": "file_ids must be a non-empty list"}), 400
+    paths, err = _resolve_uploads(body.get("file_ids") or [])
+    if err:
+        return err
     if not OPENAI_API_KEY:
         return jsonify({"ok": False, "error": "OPENAI_API_KEY is not set"}), 500
-    # Resolve paths
-    paths = []
-    for fid in file_ids:
-        fname = secure_filename(str(fid))
-        path = os.path.join(app.config["UPLOAD_FOLDER"], fname)
-        if not os.path.isfile(path):
-            return jsonify({"ok": False, "error": f"File not found: {fid}"}), 400
-        paths.append(path)
-    data = propose_expenses_from_vision(paths)
-    if not data:
-        return jsonify({"ok": False, "error": "AI extraction failed"}), 502
-    return jsonify({"ok": True, "data": data})
+    payload = {"paths": paths}
+    if _wants_async(body):
+        return _submit_job("expenses_extract", payload, owner=current_user.id)
+    try:
+        return jsonify({"ok": True, **_job_expenses_extract(payload)})
+    except JobError as ex:
+        return jsonify({"ok": False, "error": str(ex)}), 502
 
 
 @app.post("/api/staff/expenses/ai-parse-text")
@@ -1085,12 +1307,17 @@ def api_staff_expenses_parse_text():
     text = (body.get("text") or "").strip()
     if not text:
         return jsonify({"ok": False, "error": "text is required"}), 400
+    local, confidence = staff_text.parse_expenses(text)
+    if confidence >= STAFF_TEXT_MIN_CONFIDENCE:
+        staff_text.HITS.record("expenses", local=True)
+        return jsonify({"ok": True, "data": local, "source": "local"})
     if not OPENAI_API_KEY:
         return jsonify({"ok": False, "error": "OPENAI_API_KEY is not set"}), 500
+    staff_text.HITS.record("expenses", local=False)
     data = propose_expenses_from_text(text)
     if not data:
         return jsonify({"ok": False, "error": "AI parse failed"}), 502
-    return jsonify({"ok": True, "data": data})
+    return jsonify({"ok": True, "data": data, "source": "model"})
 
 
 @app.get("/staff/reports/sales")
@@ -1343,33 +1570,37 @@ def api_uploads():
 # Staff Purchases APIs
 # --------------------------
 
+def _job_purchases_extract(payload: dict) -> dict:
+    data = propose_invoice_from_vision(payload["paths"])
+    if not data or not isinstance(data, dict):
+        raise JobError("AI extraction failed")
+    return {"data": data}
+
+JOBS.register("purchases_extract", _job_purchases_extract)
+
 @app.post("/api/staff/purchases/extract")
 @staff_required
 def api_staff_extract_invoice():
-    """Body: { file_ids: [string] } -> AI parsed invoice details"""
+    """Body: { file_ids: [string], async?: bool } -> AI parsed invoice details (or a job id)"""
     try:
         body = request.get_json(force=True) or {}
     except Exception as ex:
         return jsonify({"ok": False, "error": f"Invalid JSON: {ex}"}), 400
-    file_ids = body.get("file_ids") or []
-    if not isinstance(file_ids, list) or not file_ids:
-        return jsonify({"ok": False, "error": "file_ids must be a non-empty list"}), 400
     # Validate and map to paths under uploads
-    paths = []
-    for fid in file_ids:
-        fname = secure_filename(str(fid))
-        path = os.path.join(app.config["UPLOAD_FOLDER"], fname)
-        if not os.path.isfile(path):
-            return jsonify({"ok": False, "error": f"File not found: {fid}"}), 400
-        paths.append(path)
+    paths, err = _resolve_uploads(body.get("file_ids") or [])
+    if err:
+        return err
 
     if not OPENAI_API_KEY:
         return jsonify({"ok": False, "error": "OPENAI_API_KEY is not set"}), 500
 
-    data = propose_invoice_from_vision(paths)
-    if not data or not isinstance(data, dict):
-        return jsonify({"ok": False, "error": "AI extraction failed"}), 502
-    return jsonify({"ok": True, "data": data})
+    payload = {"paths": paths}
+    if _wants_async(body):
+        return _submit_job("purchases_extract", payload, owner=current_user.id)
+    try:
+        return jsonify({"ok": True, **_job_purchases_extract(payload)})
+    except JobError as ex:
+        return jsonify({"ok": False, "error": str(ex)}), 502
 
 
 @app.post("/api/staff/purchases/ai-parse-text")
@@ -1382,12 +1613,17 @@ def api_staff_parse_text():
     text = (body.get("text") or "").strip()
     if not text:
         return jsonify({"ok": False, "error": "text is required"}), 400
+    local, confidence = staff_text.parse_purchase(text)
+    if confidence >= STAFF_TEXT_MIN_CONFIDENCE:
+        staff_text.HITS.record("purchase", local=True)
+        return jsonify({"ok": True, "data": local, "source": "local"})
     if not OPENAI_API_KEY:
         return jsonify({"ok": False, "error": "OPENAI_API_KEY is not set"}), 500
+    staff_text.HITS.record("purchase", local=False)
     data = propose_purchase_from_text(text)
     if not data or not isinstance(data, dict):
         return jsonify({"ok": False, "error": "AI parse failed"}), 502
-    return jsonify({"ok": True, "data": data})
+    return jsonify({"ok": True, "data": data, "source": "model"})
 
 
 @app.post("/api/staff/purchases")
@@ -1536,6 +1772,228 @@ def api_staff_save_purchase():
     db.session.commit()
     return jsonify({"ok": True, "id": inv.id})
 
+
+# --------------------------
+# Batch invoice extraction
+# --------------------------
+# Many invoices in one job: identical uploads are extracted once, up to
+# PURCHASE_BATCH_CONCURRENCY model calls run at a time, and drafts are saved
+# in chunks of PURCHASE_BATCH_SAVE_EVERY as results come in. Each draft is
+# keyed by (batch id, index), so a retried job skips what it already saved.
+PURCHASE_BATCH_MAX = int(os.getenv("PURCHASE_BATCH_MAX", "200"))
+PURCHASE_BATCH_CONCURRENCY = int(os.getenv("PURCHASE_BATCH_CONCURRENCY", "4"))
+PURCHASE_BATCH_SAVE_EVERY = int(os.getenv("PURCHASE_BATCH_SAVE_EVERY", "10"))
+
+def _invoice_digest(paths) -> str:
+    """sha256 over an invoice's file contents, in order."""
+    h = hashlib.sha256()
+    for p in paths:
+        with open(p, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _batch_key(batch_id: str, index: int) -> str:
+    return f"{batch_id}:{index}"
+
+def _saved_batch_drafts(batch_id: str) -> dict:
+    """{index: invoice id} of the drafts a batch has already saved (by an earlier attempt of its job)."""
+    with app.app_context():
+        rows = (db.session.query(PurchaseInvoice.batch_key, PurchaseInvoice.id)
+                .filter(PurchaseInvoice.batch_key.like(f"{batch_id}:%")).all())
+    return {int(key.rsplit(":", 1)[1]): inv_id for key, inv_id in rows}
+
+def _draft_invoice(data: dict, file_ids, created_by, suppliers: dict, batch_key=None) -> PurchaseInvoice:
+    """An unsaved draft PurchaseInvoice with its lines, from extracted invoice data."""
+    supplier_name = data.get("supplier_name")
+    sup = suppliers.get((supplier_name or "").lower())
+    inv_date_dt = None
+    if data.get("invoice_date"):
+        try:
+            inv_date_dt = datetime.strptime(data["invoice_date"], "%Y-%m-%d").date()
+        except ValueError:
+            inv_date_dt = None
+    inv = PurchaseInvoice(
+        supplier_id=sup.id if sup else None,
+        supplier_name=None if sup else supplier_name,
+        invoice_date=data.get("invoice_date"),
+        invoice_date_dt=inv_date_dt,
+        invoice_number=data.get("invoice_number"),
+        currency=data.get("currency") or "TTD",
+        status="draft",
+        uploaded_files=json.dumps(file_ids),
+        created_by=created_by,
+        batch_key=batch_key,
+    )
+    subtotal = 0.0
+    for li in data.get("lines") or []:
+        line_total = li.get("line_total")
+        if line_total is not None:
+            subtotal += float(line_total)
+        inv.lines.append(PurchaseLineItem(
+            description=li["description"],
+            category=li.get("category"),
+            material_key=li.get("material_key"),
+            unit=li["unit"],
+            quantity=li["qty"],
+            unit_price=li.get("unit_price"),
+            line_total=line_total,
+        ))
+    tax = data.get("tax") or 0.0
+    inv.subtotal = round(subtotal, 2)
+    inv.tax = round(tax, 2)
+    inv.total = round(data["total"] if data.get("total") is not None else subtotal + tax, 2)
+    return inv
+
+def _save_drafts(pending, created_by, batch_id: str) -> list:
+    """
+    Bulk-insert [(index, data, file_ids)] as drafts in one transaction -> [{index, invoice_id}].
+    Indexes the batch already saved are not inserted again; their existing ids are returned.
+    """
+    with app.app_context():
+        names = {(d.get("supplier_name") or "").lower() for _, d, _ in pending} - {""}
+        suppliers = {}
+        if names:
+            for sup in Supplier.query.filter(db.func.lower(Supplier.name).in_(names)).all():
+                suppliers.setdefault(sup.name.lower(), sup)
+        for attempt in range(2):
+            keys = {_batch_key(batch_id, i): i for i, _, _ in pending}
+            existing = {key: inv_id for key, inv_id in db.session.query(PurchaseInvoice.batch_key, PurchaseInvoice.id)
+                        .filter(PurchaseInvoice.batch_key.in_(list(keys))).all()}
+            rows = [(i, _draft_invoice(d, fids, created_by, suppliers, _batch_key(batch_id, i)))
+                    for i, d, fids in pending if _batch_key(batch_id, i) not in existing]
+            db.session.add_all([inv for _, inv in rows])
+            try:
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()  # another attempt of this job saved some of them meanwhile
+                if attempt:
+                    raise
+            except Exception:
+                db.session.rollback()
+                raise
+        saved = [{"index": keys[key], "invoice_id": inv_id} for key, inv_id in existing.items()]
+        return saved + [{"index": i, "invoice_id": inv.id} for i, inv in rows]
+
+def _job_purchases_batch(payload: dict, report) -> dict:
+    invoices = payload["invoices"]
+    batch_id = payload["batch_id"]
+    # done counts every invoice handled: extracted + failed + duplicates
+    progress = {"total": len(invoices), "done": 0, "extracted": 0, "failed": 0, "duplicates": 0,
+                "results": [], "saved": []}
+    entries = {}  # index -> its entry in results
+    already = _saved_batch_drafts(batch_id)
+    first_of, todo = {}, []
+    for i, item in enumerate(invoices):
+        try:
+            digest = _invoice_digest(item["paths"])
+        except OSError as e:
+            progress["results"].append({"index": i, "file_ids": item["file_ids"], "status": "failed", "error": str(e)})
+            progress["failed"] += 1
+            continue
+        if i in already:  # saved by an earlier attempt of this job
+            first_of.setdefault(digest, i)
+            progress["results"].append({"index": i, "file_ids": item["file_ids"], "status": "extracted"})
+            progress["extracted"] += 1
+            progress["saved"].append({"index": i, "invoice_id": already[i]})
+        elif digest in first_of:
+            progress["results"].append({"index": i, "file_ids": item["file_ids"], "status": "duplicate",
+                                        "duplicate_of": first_of[digest]})
+            progress["duplicates"] += 1
+        else:
+            first_of[digest] = i
+            todo.append(i)
+    progress["done"] = len(progress["results"])
+    report(progress)
+
+    pending = []
+
+    def flush():
+        try:
+            progress["saved"].extend(_save_drafts(pending, payload.get("created_by"), batch_id))
+        except Exception as e:
+            log.exception("Saving %d batch drafts failed", len(pending))
+            for i, _, _ in pending:
+                # the invoice was reported as extracted; it now failed instead
+                entry = entries[i]
+                for field in ("supplier_name", "invoice_number", "total", "lines"):
+                    entry.pop(field, None)
+                entry.update(status="failed", error=f"Save failed: {type(e).__name__}")
+            progress["extracted"] -= len(pending)
+            progress["failed"] += len(pending)
+        pending.clear()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(PURCHASE_BATCH_CONCURRENCY, len(todo) or 1)),
+                            thread_name_prefix="invoice-batch") as pool:
+        futures = {pool.submit(propose_invoice_from_vision, invoices[i]["paths"]): i for i in todo}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            entry = {"index": i, "file_ids": invoices[i]["file_ids"]}
+            try:
+                data = fut.result()
+            except Exception as e:
+                log.warning("Batch invoice %d failed: %s", i, e)
+                data = None
+            if data and isinstance(data, dict) and data.get("lines"):
+                entry.update(status="extracted", supplier_name=data.get("supplier_name"),
+                             invoice_number=data.get("invoice_number"), total=data.get("total"),
+                             lines=len(data["lines"]))
+                progress["extracted"] += 1
+                entries[i] = entry
+                pending.append((i, data, invoices[i]["file_ids"]))
+            else:
+                entry.update(status="failed", error="AI extraction failed" if not data else "No invoice lines found")
+                progress["failed"] += 1
+            progress["results"].append(entry)
+            progress["done"] += 1
+            if len(pending) >= PURCHASE_BATCH_SAVE_EVERY:
+                flush()
+            report(progress)
+    if pending:
+        flush()
+        report(progress)
+    return progress
+
+JOBS.register("purchases_batch", _job_purchases_batch, progress=True)
+
+@app.get("/staff/purchases/batch")
+@staff_required
+def staff_purchases_batch():
+    return render_template("staff/purchases_batch.html")
+
+@app.post("/api/staff/purchases/extract-batch")
+@staff_required
+def api_staff_extract_invoice_batch():
+    """
+    Body: { file_ids: [string] } (one invoice per file) or { invoices: [[string]] }
+    -> 202 with a job id; its events stream per-invoice results as drafts are saved.
+    """
+    try:
+        body = request.get_json(force=True) or {}
+    except Exception as ex:
+        return jsonify({"ok": False, "error": f"Invalid JSON: {ex}"}), 400
+    groups = body.get("invoices")
+    if groups is None:
+        groups = [[fid] for fid in (body.get("file_ids") or [])]
+    if not isinstance(groups, list) or not groups:
+        return jsonify({"ok": False, "error": "file_ids or invoices must be a non-empty list"}), 400
+    if len(groups) > PURCHASE_BATCH_MAX:
+        return jsonify({"ok": False, "error": f"At most {PURCHASE_BATCH_MAX} invoices per batch"}), 400
+    invoices = []
+    for file_ids in groups:
+        paths, err = _resolve_uploads(file_ids)
+        if err:
+            return err
+        invoices.append({"file_ids": [str(f) for f in file_ids], "paths": paths})
+
+    if not OPENAI_API_KEY:
+        return jsonify({"ok": False, "error": "OPENAI_API_KEY is not set"}), 500
+
+    return _submit_job("purchases_batch", {"invoices": invoices, "created_by": current_user.id,
+                                           "batch_id": uuid.uuid4().hex}, owner=current_user.id)
+
 # Optional legacy address verification page
 @app.route("/verify-address", methods=["GET", "POST"])
 def verify_address():
@@ -1755,24 +2213,77 @@ def health():
         "steel":      os.path.abspath(STEEL_CSV),
     }
     exists = {k: os.path.exists(v) for k, v in files.items()}
+    catalog = PRICE_CATALOG.current()
     return jsonify({
         "ok": True,
         "has_openai": bool(OPENAI_API_KEY),
         "data_files": files,
         "exists": exists,
-        "price_keys": len(PRICES),
+        "price_keys": len(catalog.prices),
         "import_error": _BA_IMPORT_ERROR,
-        "prices_error": PRICES_ERROR,
+        "prices_error": catalog.error,
+        "catalog": PRICE_CATALOG.info(),
+        "llm_pool": llm_pool_stats(),
+        "llm_models": model_health.snapshot(),
+        "image_prep": image_prep.stats(),
+        "pdf_raster": pdf_raster.RASTERIZER.stats(),
+        "jobs": JOBS.stats(),
+        "staff_text": staff_text.HITS.stats() if _BA_IMPORT_ERROR is None else None,
+        "response_cache": RESPONSE_CACHE.stats() if RESPONSE_CACHE is not None else {"enabled": False},
+        "single_flight": SINGLE_FLIGHT.stats() if SINGLE_FLIGHT is not None else {"enabled": False},
+        "llm_repair": llm_repair.REPORT.stats() if _BA_IMPORT_ERROR is None else None,
+        "llm_routes": MODEL_ROUTES.stats() if MODEL_ROUTES is not None else None,
         "staff": bool(getattr(current_user, "is_staff", False)) if current_user.is_authenticated else False,
         "endpoints": {
             "purchases_extract": "/api/staff/purchases/extract",
+            "purchases_batch": "/api/staff/purchases/extract-batch",
             "purchases_text": "/api/staff/purchases/ai-parse-text",
             "purchases_save": "/api/staff/purchases",
             "receipts_create": "/api/staff/receipts",
             "receipt_print": "/staff/receipts/<id>/print",
+            "catalog_reload": "/api/staff/catalog/reload",
+            "catalog_offers": "/api/staff/catalog/offers?key=<key>",
+            "bom_price_batch": "/api/bom/price-batch",
+            "job_status": "/api/jobs/<id>",
+            "llm_metrics": "/api/staff/metrics/llm",
         }
     })
 
+# --------------------------
+# Server-Sent Events (streaming estimates)
+# --------------------------
+def _wants_stream() -> bool:
+    """?stream=1 or Accept: text/event-stream selects the SSE variant of an endpoint."""
+    return request.args.get("stream") == "1" or "text/event-stream" in (request.headers.get("Accept") or "")
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _stream_estimate(head: dict, chunks) -> Response:
+    """
+    SSE response: "estimate" (head: spec, estimate, ai_notes, ...) right away,
+    then one "token" event per narrative chunk from chunks(), then "done" with
+    the same body the JSON variant returns. A failure mid-narrative sends
+    "error" instead of "done": the narrative the client has is incomplete.
+    """
+    def gen():
+        t0 = _time.perf_counter()
+        yield _sse("estimate", {"ok": True, **head})
+        parts = []
+        try:
+            for chunk in chunks():
+                parts.append(chunk)
+                yield _sse("token", {"text": chunk})
+        except Exception as ex:
+            log.exception("Narrative stream failed")
+            yield _sse("error", {"ok": False, "error": f"{type(ex).__name__}: {ex}"})
+            return
+        yield _sse("done", {"ok": True, "assistant": "".join(parts).strip(), **head,
+                            "stream_ms": round((_time.perf_counter() - t0) * 1000.0, 1)})
+
+    return Response(stream_with_context(gen()), mimetype="text/event-stream",
+                    headers={"X-Accel-Buffering": "no"})
+
 @app.route("/api/chat", methods=["POST"])
 def api_chat():
     # Always return JSON—even on errors
@@ -1789,27 +2300,50 @@ def api_chat():
 
         if _BA_IMPORT_ERROR:
             return jsonify({"ok": False, "error": _BA_IMPORT_ERROR}), 500
-        if PRICES_ERROR:
-            return jsonify({"ok": False, "error": PRICES_ERROR}), 500
+        catalog = PRICE_CATALOG.current()
+        if catalog.error:
+            return jsonify({"ok": False, "error": catalog.error}), 500
+
+        # Routine jobs (slab, wall, driveway, ...) are closed-form: no model calls
+        tspec = estimator.match_request(msg, spec) if LOCAL_ESTIMATOR else None
+        if tspec is not None:
+            ai_bom = estimator.estimate(tspec)
+            priced = price_bom_lines(ai_bom["lines"], catalog.prices)
+            log.info("api_chat path=template job=%s", tspec["job"])
+            head = {"spec": tspec, "estimate": priced, "ai_notes": ai_bom["notes"],
+                    "path": "template", "template": tspec["job"]}
+            if _wants_stream():
+                return _stream_estimate(head, lambda: iter([estimator.narrative(tspec, priced)]))
+            return jsonify({"ok": True, "assistant": estimator.narrative(tspec, priced), **head})
+
         if not OPENAI_API_KEY:
             return jsonify({"ok": False, "error": "OPENAI_API_KEY is not set"}), 500
 
-        ai_bom = propose_bom_with_ai(msg, spec)
+        deadline = Deadline(CHAT_DEADLINE_SECONDS)
+        ai_bom = propose_bom_with_ai(msg, spec, deadline=deadline)
+        if not ai_bom and deadline.expired():
+            return jsonify({"ok": False, "error": f"Timed out after {CHAT_DEADLINE_SECONDS:g}s waiting for the model"}), 504
         if not isinstance(ai_bom, dict) or not isinstance(ai_bom.get("lines"), list):
             raise TypeError("propose_bom_with_ai must return a dict with 'lines' list")
 
-        priced = price_bom_lines(ai_bom["lines"], PRICES)
+        priced = price_bom_lines(ai_bom["lines"], catalog.prices)
         default_text = "Here’s the step-by-step plan and a materials summary."
-        narrative = expand_steps_with_ai(msg, spec, priced, default_text)
+        if _wants_stream():
+            log.info("api_chat path=llm stream=1")
+            head = {"spec": spec, "estimate": priced, "ai_notes": ai_bom.get("notes", ""), "path": "llm"}
+            return _stream_estimate(head, lambda: stream_steps_with_ai(msg, spec, priced, default_text, deadline=deadline))
+        narrative = expand_steps_with_ai(msg, spec, priced, default_text, deadline=deadline)
         if not isinstance(narrative, str):
             narrative = default_text
 
+        log.info("api_chat path=llm")
         return jsonify({
             "ok": True,
             "assistant": narrative,
             "spec": spec,
             "estimate": priced,
-            "ai_notes": ai_bom.get("notes", "")
+            "ai_notes": ai_bom.get("notes", ""),
+            "path": "llm",
         })
     except Exception as ex:
         log.exception("api_chat failed")
@@ -1819,6 +2353,52 @@ def api_chat():
             "trace": traceback.format_exc(limit=2)
         }), 500
 
+@app.post("/api/staff/catalog/reload")
+@staff_required
+def api_staff_catalog_reload():
+    """Force a rebuild of the price catalog from the CSVs; readers keep the old one until swap."""
+    snap = PRICE_CATALOG.reload(force=True)
+    info = PRICE_CATALOG.info()
+    if info.get("last_reload_error"):
+        return jsonify({"ok": False, "error": info["last_reload_error"], "catalog": info}), 500
+    return jsonify({"ok": True, "catalog": snap.info()})
+
+@app.get("/api/staff/catalog/offers")
+@staff_required
+def api_staff_catalog_offers():
+    """?key=block_6in&n=3&exclude=SupplierA,SupplierB -> cheapest offers and best alternative."""
+    key = (request.args.get("key") or "").strip()
+    if key not in ALLOWED_KEYS:
+        return jsonify({"ok": False, "error": "key must be one of ALLOWED_KEYS"}), 400
+    try:
+        n = max(1, min(int(request.args.get("n") or 3), 50))
+    except ValueError:
+        n = 3
+    exclude = [s.strip() for s in (request.args.get("exclude") or "").split(",") if s.strip()]
+    offers = PRICE_CATALOG.current().meta.get("offers")
+    if offers is None:
+        return jsonify({"ok": False, "error": "Price catalog not loaded"}), 500
+    return jsonify({"ok": True, "key": key, "top": offers.top(key, n), "best": offers.best(key, exclude)})
+
+@app.get("/api/staff/metrics/llm")
+@staff_required
+def api_staff_metrics_llm():
+    """
+    ?days=30 -> model call metrics: "live" is this worker since start, per
+    (function, model), with a wall-time histogram; "daily" is per-day totals
+    across all workers.
+    """
+    try:
+        days = max(1, min(int(request.args.get("days") or 30), 366))
+    except ValueError:
+        days = 30
+    return jsonify({
+        "ok": True,
+        "live": llm_metrics.METRICS.snapshot(),
+        "daily": llm_metrics.METRICS.daily(days),
+        "models": model_health.snapshot(),
+    })
+
 @app.route("/buildadvisor")
 def buildadvisor():
     # Note: Template filename has a capital 'A' on disk; Linux/Docker is case-sensitive
@@ -1827,6 +2407,26 @@ def buildadvisor():
 # --------------------------
 # BOM extraction from uploads (Vision)
 # --------------------------
+def _job_bom_extract(payload: dict) -> dict:
+    spec = payload["spec"]
+    catalog = PRICE_CATALOG.current()
+    ai_bom = propose_bom_from_vision(payload["paths"], spec)
+    if not isinstance(ai_bom, dict) or not isinstance(ai_bom.get("lines"), list):
+        raise JobError("Vision extraction failed")
+    priced = price_bom_lines(ai_bom["lines"], catalog.prices)
+    default_text = "Here’s the step-by-step plan and a materials summary."
+    narrative = expand_steps_with_ai("Document analysis", spec, priced, default_text)
+    if not isinstance(narrative, str):
+        narrative = default_text
+    return {
+        "assistant": narrative,
+        "spec": spec,
+        "estimate": priced,
+        "ai_notes": ai_bom.get("notes", "")
+    }
+
+JOBS.register("bom_extract", _job_bom_extract)
+
 @app.post("/api/bom/extract")
 def api_bom_extract():
     try:
@@ -1834,45 +2434,84 @@ def api_bom_extract():
     except Exception as ex:
         return jsonify({"ok": False, "error": f"Invalid JSON: {ex}"}), 400
 
-    file_ids = body.get("file_ids") or []
     spec = body.get("spec") or {}
-    if not isinstance(file_ids, list) or not file_ids:
-        return jsonify({"ok": False, "error": "file_ids must be a non-empty list"}), 400
-
     if _BA_IMPORT_ERROR:
         return jsonify({"ok": False, "error": _BA_IMPORT_ERROR}), 500
-    if PRICES_ERROR:
-        return jsonify({"ok": False, "error": PRICES_ERROR}), 500
+    catalog = PRICE_CATALOG.current()
+    if catalog.error:
+        return jsonify({"ok": False, "error": catalog.error}), 500
     if not OPENAI_API_KEY:
         return jsonify({"ok": False, "error": "OPENAI_API_KEY is not set"}), 500
 
     # Resolve paths inside UPLOAD_FOLDER and ensure files exist
-    paths = []
-    for fid in file_ids:
-        # Prevent escaping upload dir
-        fname = secure_filename(str(fid))
-        path = os.path.join(app.config["UPLOAD_FOLDER"], fname)
-        if not os.path.isfile(path):
-            return jsonify({"ok": False, "error": f"File not found: {fid}"}), 400
-        paths.append(path)
+    paths, err = _resolve_uploads(body.get("file_ids") or [])
+    if err:
+        return err
+
+    payload = {"paths": paths, "spec": spec}
+    if _wants_async(body):
+        return _submit_job("bom_extract", payload)
+    if not _wants_stream():
+        try:
+            return jsonify({"ok": True, **_job_bom_extract(payload)})
+        except JobError as ex:
+            return jsonify({"ok": False, "error": str(ex)}), 502
 
     ai_bom = propose_bom_from_vision(paths, spec)
     if not isinstance(ai_bom, dict) or not isinstance(ai_bom.get("lines"), list):
         return jsonify({"ok": False, "error": "Vision extraction failed"}), 502
 
-    priced = price_bom_lines(ai_bom["lines"], PRICES)
+    priced = price_bom_lines(ai_bom["lines"], catalog.prices)
     default_text = "Here’s the step-by-step plan and a materials summary."
-    narrative = expand_steps_with_ai("Document analysis", spec, priced, default_text)
-    if not isinstance(narrative, str):
-        narrative = default_text
+    head = {"spec": spec, "estimate": priced, "ai_notes": ai_bom.get("notes", "")}
+    return _stream_estimate(head, lambda: stream_steps_with_ai("Document analysis", spec, priced, default_text))
 
-    return jsonify({
-        "ok": True,
-        "assistant": narrative,
-        "spec": spec,
-        "estimate": priced,
-        "ai_notes": ai_bom.get("notes", "")
-    })
+@app.post("/api/bom/price-batch")
+def api_bom_price_batch():
+    """
+    Price many candidate BOMs in one request (e.g. block sizes or cement grades).
+    Body: {"boms": [[{key, qty, unit}, ...] | {"id": ..., "lines": [...]}, ...],
+           "include_lines": true}
+    Each result has the same shape as "estimate" from /api/chat, plus "id" if given.
+    """
+    try:
+        body = request.get_json(force=True, silent=False) or {}
+    except Exception as ex:
+        return jsonify({"ok": False, "error": f"Invalid JSON: {ex}"}), 400
+    if not isinstance(body, dict):
+        return jsonify({"ok": False, "error": "Body must be a JSON object"}), 400
+
+    boms = body.get("boms")
+    if not isinstance(boms, list) or not boms:
+        return jsonify({"ok": False, "error": "boms must be a non-empty list"}), 400
+    if len(boms) > BOM_BATCH_MAX_BOMS:
+        return jsonify({"ok": False, "error": f"At most {BOM_BATCH_MAX_BOMS} boms per request"}), 400
+
+    ids, line_lists, n_lines = [], [], 0
+    for i, bom in enumerate(boms):
+        bom_id, lines = (bom.get("id"), bom.get("lines")) if isinstance(bom, dict) else (None, bom)
+        if not isinstance(lines, list) or not all(isinstance(it, dict) for it in lines):
+            return jsonify({"ok": False, "error": f"boms[{i}] must be a list of line objects"}), 400
+        n_lines += len(lines)
+        ids.append(bom_id)
+        line_lists.append(lines)
+    if n_lines > BOM_BATCH_MAX_LINES:
+        return jsonify({"ok": False, "error": f"At most {BOM_BATCH_MAX_LINES} lines per request"}), 400
+
+    if _BA_IMPORT_ERROR or _PRICING_IMPORT_ERROR:
+        return jsonify({"ok": False, "error": _BA_IMPORT_ERROR or _PRICING_IMPORT_ERROR}), 500
+    catalog = PRICE_CATALOG.current()
+    if catalog.error:
+        return jsonify({"ok": False, "error": catalog.error}), 500
+
+    try:
+        results = _bom_pricer(catalog).price_many(line_lists, with_lines=body.get("include_lines", True) is not False)
+    except (TypeError, ValueError) as ex:
+        return jsonify({"ok": False, "error": f"Bad qty: {ex}"}), 400
+    for bom_id, res in zip(ids, results):
+        if bom_id is not None:
+            res["id"] = bom_id
+    return jsonify({"ok": True, "count": len(results), "catalog_version": catalog.version, "results": results})
 
 @app.post("/api/me/recompute")
 @login_required
@@ -2220,7 +2859,11 @@ def me_debug():
         "delivery_fee": u.delivery_fee
     })
     
-    
+
+# Every job handler is registered by now; start claiming queued and stale jobs
+JOBS.start()
+
+
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()  # creates any missing tables
@@ -0,0 +1,136 @@
+# benchmarks/bench_ai_endpoints.py
+"""
+Throughput and tail latency of the AI endpoints, fully offline.
+
+    python benchmarks/bench_ai_endpoints.py --requests 200 --concurrency 16 \
+        --latency-ms 800 --tail-sigma 0.5 --fail-rate 0.02
+
+Model calls go to an in-process llm_stub (or, with --replay DIR, to recorded
+fixtures via LLM_REPLAY=replay). Requests are made through Flask's test client
+from worker threads. The staff extraction endpoints need a login, so their
+job handlers are timed directly.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from llm_stub import StubConfig, StubServer  # noqa: E402
+
+PROMPTS = [
+    "concrete water tank base 8x8 ft and walls 5 ft high",
+    "timber deck 12x16 ft with plywood sheathing",
+    "formwork and concrete for a roof slab 20x24 ft",
+    "small retaining wall with steel for a garden bed",
+]
+
+
+def percentile(sorted_ms, q):
+    if not sorted_ms:
+        return float("nan")
+    return sorted_ms[min(len(sorted_ms) - 1, int(q * len(sorted_ms)))]
+
+
+def run(label, fn, n, concurrency):
+    lat, errors = [], 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        t0 = time.perf_counter()
+        ok = fn(i)
+        ms = (time.perf_counter() - t0) * 1000.0
+        with lock:
+            lat.append(ms)
+            errors += int(not ok)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    print(f"  {label:<22} {n / wall:>8.1f} req/s  p50 {percentile(lat, 0.5):>7.0f}  "
+          f"p95 {percentile(lat, 0.95):>7.0f}  p99 {percentile(lat, 0.99):>7.0f} ms  errors {errors}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=200.0)
+    ap.add_argument("--tail-sigma", type=float, default=0.5)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--replay", metavar="DIR", help="serve model calls from recorded fixtures instead")
+    ap.add_argument("--only", choices=["chat", "bom_extract", "purchases", "expenses"], action="append")
+    args = ap.parse_args()
+
+    stub = None
+    if args.replay:
+        os.environ.update(LLM_REPLAY="replay", LLM_FIXTURES_DIR=args.replay)
+        os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1:9/v1")  # never reached
+    else:
+        stub = StubServer(StubConfig(args.latency_ms, args.tail_sigma, args.fail_rate, seed=1))
+        os.environ["OPENAI_BASE_URL"] = stub.start()
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    # measure the model path itself: no local templates, no response cache
+    os.environ.update(LOCAL_ESTIMATOR="0", RESPONSE_CACHE="0", LLM_METRICS_DB="",
+                      JOB_QUEUE="memory", CATALOG_POLL_SECONDS="0")
+
+    import app
+
+    uploads = sorted(f for f in os.listdir(app.app.config["UPLOAD_FOLDER"])
+                     if f.lower().endswith((".jpg", ".jpeg", ".png", ".webp", ".pdf")))
+    local = threading.local()
+
+    def client():
+        c = getattr(local, "client", None)
+        if c is None:
+            c = local.client = app.app.test_client()
+        return c
+
+    def chat(i):
+        r = client().post("/api/chat", json={"message": PROMPTS[i % len(PROMPTS)]})
+        return r.status_code == 200
+
+    def bom_extract(i):
+        r = client().post("/api/bom/extract", json={"file_ids": [uploads[i % len(uploads)]]})
+        return r.status_code == 200
+
+    def handler(fn):
+        def call(i):
+            try:
+                fn({"paths": [os.path.join(app.app.config["UPLOAD_FOLDER"], uploads[i % len(uploads)])]})
+                return True
+            except app.JobError:
+                return False
+        return call
+
+    cases = {
+        "chat": chat,
+        "bom_extract": bom_extract,
+        "purchases": handler(app._job_purchases_extract),
+        "expenses": handler(app._job_expenses_extract),
+    }
+    if not uploads:
+        for k in ("bom_extract", "purchases", "expenses"):
+            cases.pop(k)
+    source = f"fixtures in {args.replay}" if args.replay else (
+        f"stub {args.latency_ms:g} ms, sigma {args.tail_sigma:g}, fail {args.fail_rate:g}")
+    print(f"{args.requests} requests x {args.concurrency} threads; model: {source}")
+    for label, fn in cases.items():
+        if args.only and label not in args.only:
+            continue
+        run(label, fn, args.requests, args.concurrency)
+    if stub is not None:
+        print(f"  stub saw {stub.config.requests} model requests, {stub.config.failures} injected failures")
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
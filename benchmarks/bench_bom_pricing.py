@@ -0,0 +1,63 @@
+# benchmarks/bench_bom_pricing.py
+"""
+Pricing N candidate BOMs: a price_bom_lines loop vs one BomPricer.price_many call.
+
+    python benchmarks/bench_bom_pricing.py --boms 1000 --lines 25
+
+BOMs are random mixes of ALLOWED_KEYS (plus a few unknown keys) priced against
+the catalog built from data/. Results are checked for equality before timing.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("CATALOG_POLL_SECONDS", "0")
+
+import app  # noqa: E402
+from pricing import BomPricer  # noqa: E402
+
+
+def synth_boms(n, lines, seed=7):
+    rnd = random.Random(seed)
+    keys = sorted(app.ALLOWED_KEYS) + ["not_a_key"]
+    return [[{"key": rnd.choice(keys), "qty": round(rnd.uniform(0, 200), 3), "unit": "ea"}
+             for _ in range(lines)] for _ in range(n)]
+
+
+def best_of(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--boms", type=int, default=1000)
+    ap.add_argument("--lines", type=int, default=25)
+    args = ap.parse_args()
+
+    prices = app.PRICE_CATALOG.current().prices
+    boms = synth_boms(args.boms, args.lines)
+    pricer = BomPricer(prices)
+    assert pricer.price_many(boms) == [app.price_bom_lines(b, prices) for b in boms]
+
+    runs = {
+        "price_bom_lines": lambda: [app.price_bom_lines(b, prices) for b in boms],
+        "price_many": lambda: pricer.price_many(boms),
+        "price_many/totals": lambda: pricer.price_many(boms, with_lines=False),
+    }
+    print(f"{args.boms} boms x {args.lines} lines")
+    for label, fn in runs.items():
+        print(f"  {label:<18} {args.boms / best_of(fn):>12,.0f} boms/s")
+
+
+if __name__ == "__main__":
+    main()
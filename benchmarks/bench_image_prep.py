@@ -0,0 +1,74 @@
+# benchmarks/bench_image_prep.py
+"""
+Vision payloads before/after image_prep on the images in uploads/.
+
+    python benchmarks/bench_image_prep.py [--format webp] [--e2e]
+
+For each image: bytes sent (raw vs prepared), encode time (cold, then from the
+disk cache) and the high-detail tile count the model bills. --e2e also times
+propose_bom_from_vision with preprocessing off and on (needs OPENAI_API_KEY;
+OPENAI_BASE_URL may point at a local stub).
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import image_prep  # noqa: E402
+
+
+def billed_tiles(w, h):
+    """Tiles the API bills for a w x h image after its own downscaling."""
+    s = min(1.0, image_prep.MAX_SIDE / max(w, h), image_prep.SHORT_SIDE / min(w, h))
+    return image_prep.tiles(round(w * s), round(h * s))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--glob", default="uploads/*")
+    ap.add_argument("--format", choices=["jpeg", "webp"], default=image_prep.FORMAT)
+    ap.add_argument("--quality", type=int, default=image_prep.QUALITY)
+    ap.add_argument("--e2e", action="store_true")
+    args = ap.parse_args()
+
+    from PIL import Image
+
+    image_prep.FORMAT, image_prep.QUALITY = args.format, args.quality
+    image_prep.CACHE_DIR = tempfile.mkdtemp(prefix="bench_image_prep_")
+    paths = sorted(p for p in glob.glob(args.glob) if os.path.splitext(p)[1].lower() in image_prep._MIME)
+    if not paths:
+        sys.exit(f"no images match {args.glob}")
+
+    print(f"{'image':<40} {'raw KB':>8} {'prep KB':>8} {'cold ms':>8} {'warm ms':>8} {'size':>11} {'tiles':>9}")
+    tot_raw = tot_out = 0
+    for p in paths:
+        with Image.open(p) as im:
+            w, h = im.size
+        cold = image_prep.prepare(p)
+        warm = image_prep.prepare(p)
+        tot_raw += cold.bytes_in
+        tot_out += cold.bytes_out
+        size = "x".join(map(str, cold.size)) if cold.size else "-"
+        tiles = f"{billed_tiles(w, h)}->{billed_tiles(*cold.size)}" if cold.size else "-"
+        print(f"{os.path.basename(p)[:40]:<40} {cold.bytes_in / 1024:>8.1f} {cold.bytes_out / 1024:>8.1f} "
+              f"{cold.encode_ms:>8.1f} {warm.encode_ms:>8.1f} {size:>11} {tiles:>9}")
+    print(f"total {tot_raw / 1024:.1f} KB -> {tot_out / 1024:.1f} KB ({tot_out / tot_raw:.0%})")
+
+    if args.e2e:
+        import ai_text
+        for enabled in (False, True):
+            image_prep.ENABLED = enabled
+            t0 = time.perf_counter()
+            out = ai_text.propose_bom_from_vision(paths, {})
+            print(f"e2e prep={'on' if enabled else 'off'}: {(time.perf_counter() - t0) * 1000.0:.0f} ms, "
+                  f"{len(out.get('lines', []))} lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/bench_jobs.py
+"""
+Cross-process job pickup on the SQLite queue: this process submits jobs
+and never starts workers; a second process (started like a gunicorn worker
+that never takes a request) runs them.
+
+    python benchmarks/bench_jobs.py [--jobs 20] [--workers 2]
+
+Reports how many jobs were run by the other process and the time from
+submit to finish. Exits non-zero if any job was not run there.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import jobs  # noqa: E402
+
+
+def _whoami(payload):
+    return {"pid": os.getpid(), "n": payload["n"]}
+
+
+def _runner(db_path, workers, stop):
+    queue = jobs.SqliteJobQueue(db_path, workers=workers, poll_seconds=0.05)
+    queue.register("whoami", _whoami)
+    queue.start()
+    stop.wait()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=20)
+    ap.add_argument("--workers", type=int, default=2)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "jobs.db")
+        queue = jobs.SqliteJobQueue(db_path, workers=args.workers, poll_seconds=0.05)
+        queue.register("whoami", _whoami)  # needed to submit; start() is never called here
+
+        ctx = multiprocessing.get_context("spawn")
+        stop = ctx.Event()
+        runner = ctx.Process(target=_runner, args=(db_path, args.workers, stop), daemon=True)
+        runner.start()
+
+        t0 = time.perf_counter()
+        ids = [queue.submit("whoami", {"n": n}) for n in range(args.jobs)]
+        results = [queue.wait(job_id, timeout=30.0) for job_id in ids]
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        runner.join(5)
+
+    elsewhere = sum(1 for job in results
+                    if job and job["status"] == "done" and job["result"]["pid"] == runner.pid)
+    print(f"jobs   {elsewhere}/{args.jobs} run by the other process")
+    print(f"time   {elapsed * 1000.0 / max(1, args.jobs):.0f} ms per job submit-to-finish "
+          f"({args.workers} worker threads there)")
+    if elsewhere != args.jobs:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_llm_repair.py
+"""
+What llm_repair recovers from typical model slips, and how long it takes.
+
+    python benchmarks/bench_llm_repair.py [--repeat 2000] [-v]
+
+Reports key/unit matches against the expected registry entries (a wrong
+match is worse than none), JSON outputs recovered, and lookup time of the
+deletion index against a linear edit-distance scan over every key.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import llm_repair  # noqa: E402
+from materials import KEYS  # noqa: E402
+
+# (what the model wrote, key it meant or None when it should not be guessed)
+KEY_SAMPLE = [
+    ("rebar_corrugated_1_2_m", "rebar_corr_1_2_m"), ("cement_bags", "cement_bag"),
+    ("Sharp Sand m3", "sharp_sand_m3"), ("sharp_sand", "sharp_sand_m3"), ("gravl_m3", "gravel_m3"),
+    ("mesh_a142_sheet", "mesh_A142_sheet"), ("rebar_corr_1/2_m", "rebar_corr_1_2_m"),
+    ("plywood_3/4_sheet", "plywood_3_4_sheet"), ("tie_wire", "tie_wire_kg"), ("block_6_in", "block_6in"),
+    ("blocks_8in", "block_8in"), ("cement_bag_premum", "cement_bag_premium"), ("paint_gallon", "paint_gal"),
+    ("soakaway_boulder_m3", "soakaway_boulders_m3"), ("lumber_2x4", "lumber_2x4_m"),
+    ("purlin_z", "purlin_z_m"), ("backfill", "backfill_m3"),
+    ("lumber_2x5_m", None), ("rebar_3_8_m", None), ("plywood_sheet", None), ("steel_beam_m", None),
+    # sizes the registry does not have must not become a neighbouring size
+    ("lumber_2x10_m", None), ("lumber_3x3_m", None), ("mesh_A193_sheet", None), ("mesh_A252_sheet", None),
+    ("cement_board_5_8_sheet", None), ("rebar_corr_1_m", None),
+]
+UNIT_SAMPLE = [
+    ("cu m", "m3"), ("cu. m", "m3"), ("cubic metres", "m3"), ("lbs", "lb"), ("each", "pcs"), ("nos", "pcs"),
+    ("galons", "gal"), ("bgs", "bag"), ("shts", "sheet"), ("xyz", None), ("sq m", None),
+]
+# Model output that should be recovered, then output that must be rejected
+JSON_SAMPLE = [
+    '```json\n{"lines": [{"key": "sand_m3", "qty": 2, "unit": "m3"}]}\n```',
+    'Here you go: {"lines": [{"key": "sand_m3", "qty": 2, "unit": "m3"}], "notes": ""}',
+    '{"lines": [{"key": "sand_m3", "qty": 2, "unit": "m3"},], "notes": "",}',
+    "{'lines': [{'key': 'sand_m3', 'qty': 2, 'unit': 'm3'}], 'notes': None}",
+    '{lines: [{key: "sand_m3", qty: 2, unit: "m3"}]}',
+    '{"lines": [{"key": "sand_m3", "qty": 2, "unit": "m3"} // sand for the slab\n]}',
+]
+NOT_JSON_SAMPLE = [
+    '{"lines": [{"key": "sand_m3", "qty": 2, "unit": "m3"}, {"key": "gravel_m3", "qty": 1',
+    '{"lines": [{"key": "sand_m3", "qty": 2, "unit": "m3"}], "notes": "cut off',
+    "I could not work out the quantities.",
+]
+
+
+def _linear(query: str):
+    norm = llm_repair._norm_key(query)
+    best = min(KEYS, key=lambda k: llm_repair._distance(norm, k.lower(), 99))
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=2000)
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    for name, sample, fn in (("keys", KEY_SAMPLE, llm_repair.match_key),
+                             ("units", UNIT_SAMPLE, llm_repair.match_unit)):
+        right = wrong = missed = 0
+        for raw, want in sample:
+            got = fn(raw)
+            right += got == want
+            wrong += got is not None and got != want
+            missed += got is None and want is not None
+            if args.verbose:
+                print(f"  {raw!r:<26} -> {got!r}" + ("" if got == want else f"  (expected {want!r})"))
+        print(f"{name:<6} {right}/{len(sample)} right, {wrong} wrong, {missed} missed")
+
+    recovered = rejected = 0
+    for text in JSON_SAMPLE + NOT_JSON_SAMPLE:
+        try:
+            _, repairs = llm_repair.loads(text)
+            recovered += text in JSON_SAMPLE
+            if args.verbose:
+                print(f"  {repairs}")
+        except ValueError as e:
+            rejected += text in NOT_JSON_SAMPLE
+            if args.verbose:
+                print(f"  {type(e).__name__}: {text[:40]!r}")
+    print(f"json   {recovered}/{len(JSON_SAMPLE)} recovered, {rejected}/{len(NOT_JSON_SAMPLE)} cut-off or prose rejected")
+
+    queries = [raw for raw, _ in KEY_SAMPLE]
+    for label, fn in (("deletion index", llm_repair.match_key), ("linear scan", _linear)):
+        t0 = time.perf_counter()
+        for _ in range(args.repeat // 10 if fn is _linear else args.repeat):
+            for q in queries:
+                fn(q)
+        n = (args.repeat // 10 if fn is _linear else args.repeat) * len(queries)
+        print(f"{label:<15} {(time.perf_counter() - t0) / n * 1e6:.0f} us per key")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_loaders.py
+"""
+Throughput of the CSV price loaders on a synthetic supplier list.
+
+    python benchmarks/bench_loaders.py --rows 100000
+    git show <rev>:loaders.py > /tmp/loaders_old.py
+    python benchmarks/bench_loaders.py --rows 100000 --baseline /tmp/loaders_old.py
+    python benchmarks/bench_loaders.py --rows 500000 --memory   # tracemalloc peak instead
+
+Rows are cycled from the real files in data/ so the keyword mix matches production.
+"""
+import argparse
+import csv
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def load_module(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def synth_csv(src, dst, n):
+    """Write n data rows to dst by cycling the non-empty rows of src."""
+    with open(src, "r", encoding="utf-8", errors="ignore") as f:
+        rows = list(csv.reader(f))
+    header, body = rows[0], [r for r in rows[1:] if r and r[0].strip()]
+    with open(dst, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        for i in range(n):
+            w.writerow(body[i % len(body)])
+    return dst
+
+
+def rows_per_sec(fn, path, n, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(path)
+        best = min(best, time.perf_counter() - t0)
+    return n / best
+
+
+def peak_mb(fn, path):
+    tracemalloc.start()
+    try:
+        fn(path)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--baseline", help="path to another loaders.py to compare against")
+    ap.add_argument("--memory", action="store_true", help="report peak traced memory, not rows/s")
+    args = ap.parse_args()
+
+    mods = [("current", load_module(os.path.join(ROOT, "loaders.py"), "loaders_current"))]
+    if args.baseline:
+        mods.insert(0, ("baseline", load_module(args.baseline, "loaders_baseline")))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = {
+            "load_steel": synth_csv(os.path.join(ROOT, "data", "steel.csv"),
+                                    os.path.join(tmp, "steel.csv"), args.rows),
+            "load_building": synth_csv(os.path.join(ROOT, "data", "building materials.csv"),
+                                       os.path.join(tmp, "building.csv"), args.rows),
+            "load_aggregates": synth_csv(os.path.join(ROOT, "data", "buildadvisor_aggregates.csv"),
+                                         os.path.join(tmp, "aggregates.csv"), args.rows),
+        }
+        print(f"{args.rows} rows per file")
+        for fn_name, path in files.items():
+            for label, mod in mods:
+                fn = getattr(mod, fn_name)
+                if args.memory:
+                    print(f"  {fn_name:<15} {label:<9} {peak_mb(fn, path):>10,.1f} MB peak")
+                else:
+                    rps = rows_per_sec(fn, path, args.rows)
+                    print(f"  {fn_name:<15} {label:<9} {rps:>12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_model_routes.py
+"""
+SLO downgrades in model_routes, and what they cost per call.
+
+    python benchmarks/bench_model_routes.py [--repeat 20000]
+
+Feeds every route calls slower than its SLO and reports which routes moved
+down a tier. Routes that send images must stay on their tier and never list
+a lower tier's model (OPENAI_MODEL_FAST may be text-only); exits non-zero if
+one does. Also times RouteTable.models() and observe().
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+os.environ["OPENAI_MODEL_FAST"] = "text-only-fast"  # a distinct fast model, so downgrades happen
+os.environ.pop("OPENAI_MODEL_FALLBACKS", None)
+
+import model_routes  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=20000)
+    args = ap.parse_args()
+
+    table = model_routes.RouteTable(model_routes.DEFAULT_ROUTES, window=20, min_samples=5)
+    fast = model_routes.tier_models()["fast"]
+    bad = 0
+    for op, route in table.routes.items():
+        for _ in range(table.min_samples):
+            table.observe(op, route.slo * 2)
+        models = table.models(op)
+        moved = table.stats()[op]["current_tier"] != route.tier
+        wrong = route.images and (moved or fast in models)
+        bad += wrong
+        print(f"  {op:<32} {'images' if route.images else 'text':<6} {route.tier:>8} -> "
+              f"{table.stats()[op]['current_tier']:<8} {models}" + ("  WRONG" if wrong else ""))
+    print(f"routes {len(table.routes) - bad}/{len(table.routes)} right, {bad} image routes sent to {fast}")
+
+    ops = list(table.routes)
+    t0 = time.perf_counter()
+    for n in range(args.repeat):
+        table.models(ops[n % len(ops)])
+    models_us = (time.perf_counter() - t0) / args.repeat * 1e6
+    t0 = time.perf_counter()
+    for n in range(args.repeat):
+        table.observe(ops[n % len(ops)], 0.5)
+    observe_us = (time.perf_counter() - t0) / args.repeat * 1e6
+    print(f"models() {models_us:.1f} us, observe() {observe_us:.1f} us per call")
+    if bad:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
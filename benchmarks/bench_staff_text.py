@@ -0,0 +1,87 @@
+# benchmarks/bench_staff_text.py
+"""
+Local hit rate and parse time of staff_text on typical staff notes.
+
+    python benchmarks/bench_staff_text.py [--min-confidence 0.9] [--file notes.txt] [-v]
+
+--file reads one note per line ("purchase: ..." or "expense: ..."); the
+built-in sample is used otherwise. Notes below --min-confidence would go to
+the model.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import staff_text  # noqa: E402
+
+SAMPLE = [
+    ("purchase", "10 yd3 sand @ 350 from XYZ"),
+    ("purchase", "Bought 3 yd sand from ABC at 210/yd"),
+    ("purchase", "20 bags cement @ 72 each; 3 yd3 gravel at 400; from ABC Hardware; tax 150"),
+    ("purchase", "sand 5 yd3 for 1,750"),
+    ("purchase", "40 pcs 6in blocks @ 7.50 from ABC and 2 bags cement @ 75"),
+    ("purchase", "2 cubic yards of gravel @ 380 from Rock Co on 2025-02-01"),
+    ("purchase", "5 sheets plywood 3/4 @ 210"),
+    ("purchase", "got some blocks from joe yesterday, will send the bill"),
+    ("purchase", "10 yd3 sand 350"),
+    ("purchase", "invoice 4471 from Caribbean Steel: 30 lengths 1/2 rebar, 2 rolls tie wire"),
+    ("expense", "fuel 250, salaries 4000"),
+    ("expense", "diesel for truck $450; wages 4,000 on 2025-01-15"),
+    ("expense", "tyre repair 600"),
+    ("expense", "paid 300 for stuff"),
+    ("expense", "fuel 250 yesterday"),
+    ("expense", "payroll 12,500\nfuel 900\nservicing 450"),
+    # must go to the model: a quantity, a loan repayment, money coming back
+    ("expense", "diesel 40 gallons"),
+    ("expense", "pay back loan 500"),
+    ("expense", "refund fuel 250"),
+    ("expense", "fuel -250"),
+    ("expense", "diesel -$450"),
+    ("expense", "fuel (250)"),
+]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--min-confidence", type=float, default=0.9)
+    ap.add_argument("--file")
+    ap.add_argument("--repeat", type=int, default=200)
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    notes = SAMPLE
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            notes = [tuple(s.strip() for s in line.split(":", 1)) for line in f if ":" in line]
+    parsers = {"purchase": staff_text.parse_purchase, "expense": staff_text.parse_expenses}
+
+    hits = {k: [0, 0] for k in parsers}
+    for kind, text in notes:
+        data, conf = parsers[kind](text)
+        local = conf >= args.min_confidence
+        hits[kind][0] += int(local)
+        hits[kind][1] += 1
+        if args.verbose:
+            print(f"  {'local' if local else 'model'} {conf:.1f}  {text!r}")
+            if local:
+                print(f"        {data}")
+
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for kind, text in notes:
+            parsers[kind](text)
+    us = (time.perf_counter() - t0) / (args.repeat * len(notes)) * 1e6
+
+    for kind, (local, n) in hits.items():
+        if n:
+            print(f"{kind:<9} {local}/{n} answered locally ({local / n:.0%})")
+    print(f"mean parse time {us:.0f} us per note (a model call is ~1-5 s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/bench_to_float.py
+"""
+Cost of loaders.to_float over a 100k-cell price column.
+
+    git show <rev>:loaders.py > /tmp/loaders_old.py
+    python benchmarks/bench_to_float.py --baseline /tmp/loaders_old.py
+
+Two columns are timed: 'repeated' cycles the real price cells from data/ (plus a
+few formulas), which is what supplier lists look like; 'unique' has no repeats,
+so the memo cache never hits.
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_loaders import load_module  # noqa: E402
+
+
+def price_cells():
+    cells = []
+    for fname in ("buildadvisor_aggregates.csv", "building materials.csv", "steel.csv", "lumber.csv"):
+        with open(os.path.join(ROOT, "data", fname), "r", encoding="utf-8", errors="ignore") as f:
+            cells.extend(r[-1] for r in list(csv.reader(f))[1:] if r and r[-1].strip())
+    return cells + ["390*1.308", "$1,093.50", "TTD 95", "(120+15)/2"]
+
+
+def columns(n):
+    base = price_cells()
+    rnd = random.Random(7)
+    repeated = [base[i % len(base)] for i in range(n)]
+    unique = [f"${rnd.randint(1, 9999):,}.{i % 100:02d}" if i % 10 else f"{i}*1.308" for i in range(n)]
+    return {"repeated": repeated, "unique": unique}
+
+
+def cells_per_sec(fn, cells, reset=None, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        if reset:
+            reset()  # time a cold cache each round
+        t0 = time.perf_counter()
+        for c in cells:
+            fn(c)
+        best = min(best, time.perf_counter() - t0)
+    return len(cells) / best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cells", type=int, default=100_000)
+    ap.add_argument("--baseline", help="path to another loaders.py to compare against")
+    args = ap.parse_args()
+
+    mods = [("current", load_module(os.path.join(ROOT, "loaders.py"), "loaders_current"))]
+    if args.baseline:
+        mods.insert(0, ("baseline", load_module(args.baseline, "loaders_baseline")))
+
+    print(f"{args.cells} cells")
+    for col_name, cells in columns(args.cells).items():
+        for label, mod in mods:
+            cache = getattr(mod, "_parse_price", None)
+            reset = getattr(cache, "cache_clear", None)
+            cps = cells_per_sec(mod.to_float, cells, reset)
+            print(f"  {col_name:<9} {label:<9} {cps:>12,.0f} cells/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# catalog.py
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# loader() -> (prices, meta, error) — same contract as app._safe_load_prices
+LoaderFn = Callable[[], Tuple[Dict[str, float], Dict[str, Any], Optional[str]]]
+
+
+class CatalogSnapshot:
+    """Immutable view of one catalog build. Never mutated after construction."""
+    __slots__ = ("prices", "meta", "error", "version", "loaded_at", "load_ms", "stamps")
+
+    def __init__(self, prices, meta, error, version, loaded_at, load_ms, stamps):
+        self.prices: Mapping[str, float] = MappingProxyType(dict(prices or {}))
+        self.meta: Dict[str, Any] = meta or {}
+        self.error: Optional[str] = error
+        self.version: int = version
+        self.loaded_at: str = loaded_at
+        self.load_ms: float = load_ms
+        self.stamps: Dict[str, Tuple[float, int]] = stamps
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "load_ms": round(self.load_ms, 2),
+            "price_keys": len(self.prices),
+            "origin": self.meta.get("origin"),
+            "error": self.error,
+        }
+
+
+def _file_stamp(path: str) -> Tuple[float, int]:
+    """(mtime, size) of a file, or (0, -1) if it is missing."""
+    try:
+        st = os.stat(path)
+        return st.st_mtime, st.st_size
+    except OSError:
+        return 0.0, -1
+
+
+class PriceCatalog:
+    """
+    Read-copy-update holder for the price catalog.
+    - Readers call current() and use the returned snapshot; no locks on the read path.
+    - reload() builds a complete new snapshot off to the side, then swaps a single
+      reference, so readers only ever see the old or the new catalog, never a mix.
+    - A failed reload keeps serving the last good snapshot, and is not retried
+      (or logged again) until the files change once more.
+    """
+
+    def __init__(self, loader: LoaderFn, paths: Dict[str, str], poll_seconds: float = 5.0):
+        self._loader = loader
+        self._paths = dict(paths)
+        self._poll_seconds = float(poll_seconds or 0)
+        self._write_lock = threading.Lock()  # serializes writers only
+        self._watcher: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self._failed_stamps: Optional[Dict[str, Tuple[float, int]]] = None  # files a reload gave up on
+        self._snapshot: CatalogSnapshot = self._build(version=1)
+
+    def current(self) -> CatalogSnapshot:
+        return self._snapshot
+
+    def _stamps(self) -> Dict[str, Tuple[float, int]]:
+        return {name: _file_stamp(p) for name, p in self._paths.items()}
+
+    def _build(self, version: int) -> CatalogSnapshot:
+        stamps = self._stamps()
+        t0 = time.perf_counter()
+        prices, meta, error = self._loader()
+        load_ms = (time.perf_counter() - t0) * 1000.0
+        return CatalogSnapshot(
+            prices, meta, error, version,
+            datetime.utcnow().isoformat(timespec="seconds") + "Z", load_ms, stamps,
+        )
+
+    def is_stale(self) -> bool:
+        """Files differ from the served snapshot and from the last version that failed to load."""
+        stamps = self._stamps()
+        return stamps != self._snapshot.stamps and stamps != self._failed_stamps
+
+    def reload(self, force: bool = False) -> CatalogSnapshot:
+        """Rebuild and swap in a new snapshot if files changed (or force=True)."""
+        with self._write_lock:
+            old = self._snapshot
+            if not force and not self.is_stale():
+                return old
+            stamps = self._stamps()
+            try:
+                new = self._build(version=old.version + 1)
+            except Exception as e:
+                log.exception("Price catalog reload failed")
+                self.last_error = f"Reload failed: {e}"
+                self._failed_stamps = stamps
+                return old
+            if new.error and not old.error:
+                # Keep serving the last good catalog rather than an empty one
+                log.warning("Price catalog reload error, keeping v%s: %s", old.version, new.error)
+                self.last_error = new.error
+                self._failed_stamps = new.stamps
+                return old
+            self._snapshot = new  # single reference swap (atomic for readers)
+            self._failed_stamps = None
+            self.last_error = None
+            log.info("Price catalog v%s loaded: %s keys in %.1f ms",
+                     new.version, len(new.prices), new.load_ms)
+            return new
+
+    def start_watcher(self) -> None:
+        """Poll file mtimes in a daemon thread and reload on change. No-op if poll_seconds <= 0."""
+        if self._poll_seconds <= 0 or self._watcher is not None:
+            return
+
+        def _run():
+            while True:
+                time.sleep(self._poll_seconds)
+                try:
+                    if self.is_stale():
+                        self.reload()
+                except Exception:
+                    log.exception("Price catalog watcher error")
+
+        self._watcher = threading.Thread(target=_run, name="price-catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def info(self) -> dict:
+        out = self._snapshot.info()
+        out["last_reload_error"] = self.last_error
+        out["watching"] = self._watcher is not None
+        return out
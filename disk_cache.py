@@ -0,0 +1,35 @@
+# disk_cache.py
+import os
+from typing import List, Tuple
+
+
+def trim_lru(cache_dir: str, max_bytes: int) -> int:
+    """
+    Delete files under cache_dir, oldest mtime first, until the rest fit in
+    max_bytes. Callers refresh a file's mtime on every hit, so this is least
+    recently used. Returns the number of files removed.
+    """
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return 0
+    files: List[Tuple[float, int, str]] = []
+    total = 0
+    for root, _dirs, names in os.walk(cache_dir):
+        for name in names:
+            p = os.path.join(root, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+    removed = 0
+    for _mtime, size, p in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(p)
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,317 @@
+# estimator.py
+"""
+Closed-form material estimates for the jobs people ask about most
+(slab, driveway, block wall, footing, column), so /api/chat can answer them
+without a model round trip.
+
+    spec = match_request("4 inch slab 20x30 ft", {})   # None if no template fits
+    bom = estimate(spec)   # {"lines": [{"key", "qty", "unit"}], "notes": "..."}
+
+Lines use the same keys/units as propose_bom_with_ai, so they go straight into
+price_bom_lines. Dimensions in the spec are feet/inches, like the requests.
+"""
+import math
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from materials import MATERIALS
+
+FT = 0.3048
+IN = 0.0254
+
+# Concrete: nominal 1:2:4 (cement:sharp sand:gravel), dry volume = wet * 1.54
+CONCRETE_MIX = (1, 2, 4)
+# Mortar for blockwork: 1:4 (cement:sand), dry volume = wet * 1.33
+MORTAR_MIX = (1, 4)
+CONCRETE_DRY_FACTOR = 1.54
+MORTAR_DRY_FACTOR = 1.33
+CEMENT_KG_PER_M3 = 1440.0
+CEMENT_BAG_KG = 42.5
+WASTE = 0.05
+
+MESH_SHEET_M2 = 4.8 * 2.4      # A142 sheet
+MESH_LAP = 1.10                # 10% for laps
+REBAR_LAP = 1.10
+BLOCKS_PER_M2 = 12.5           # 400 x 200 face incl. joints
+MORTAR_M3_PER_M2 = {4: 0.012, 6: 0.018, 8: 0.024}  # by block thickness (in)
+WALL_VERTICAL_BAR_M = 0.8      # 1/2" bars in the cores
+WALL_HORIZONTAL_BAR_M = 0.6    # 3/8" bar every third course
+
+DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "slab":     {"thickness_in": 4, "reinforcement": "mesh"},
+    "driveway": {"thickness_in": 5, "reinforcement": "mesh"},
+    "wall":     {"block_in": 6},
+    "footing":  {"width_ft": 2, "depth_in": 12},
+    "column":   {"size_in": 12, "count": 1},
+}
+
+# Job keywords, checked in order; a request naming two different jobs is left to the model
+_JOB_WORDS = (
+    ("driveway", re.compile(r"\bdrive\s?ways?\b")),
+    ("footing", re.compile(r"\b(?:footings?|foundations?|strip\s+foot)")),
+    ("column", re.compile(r"\b(?:columns?|pillars?|posts?)\b")),
+    ("wall", re.compile(r"\b(?:block\s*)?walls?\b|\bblockwork\b")),
+    ("slab", re.compile(r"\b(?:slabs?|pads?|floors?|patios?)\b")),
+)
+
+_NUM = r"(\d+(?:\.\d+)?)"
+_LEN_UNIT = r"\s*(ft|feet|foot|'|m|metres?|meters?)?"
+_DIMS_RE = re.compile(_NUM + _LEN_UNIT + r"\s*(?:x|by|×|\*)\s*" + _NUM + _LEN_UNIT)
+_INCH_RE = re.compile(_NUM + r"\s*(?:inches|inch|in\b(?!\s+(?:the|a|an|my|our|front|back)\b)|\")")
+_MM_RE = re.compile(_NUM + r"\s*mm\b")
+_LONG_RE = re.compile(_NUM + _LEN_UNIT + r"\s*(?:long|length)")
+_HIGH_RE = re.compile(_NUM + _LEN_UNIT + r"\s*(?:high|tall|height)")
+_WIDE_RE = re.compile(_NUM + _LEN_UNIT + r"\s*(?:wide|width)")
+_COUNT_RE = re.compile(r"\b(\d+)\s*(?:columns?|pillars?|posts?)\b")
+
+
+def _ft(value: str, unit: Optional[str]) -> float:
+    v = float(value)
+    return v / FT if unit and unit.startswith("m") else v
+
+
+# Words that mean the job is not one our templates model (other materials,
+# other structures, whole buildings, demolition, extra reinforcement layers,
+# or a question about a material price); left to the model
+_NOT_TEMPLATED_RE = re.compile(
+    r"\b(?:paint\w*|plywood|wood(?:en)?|timber|lumber|sheds?|tiles?|tiling|roof\w*|decks?|decking|"
+    r"fences?|fencing|drywall|gypsum|formwork|tanks?|retaining|stairs?|steps|"
+    r"houses?|homes?|bedrooms?|storeys?|stor(?:y|ies)|apartments?|"
+    r"remov\w*|demoli\w*|(?:break|tear|dig)\w*\s+(?:up|out|down)|layers?|double\s+mesh)\b"
+    r"|\b(?:price|cost)\s+of\s+\d|\b\d+\s*(?:bags?|sheets?|lengths?|pcs|pieces)\b"
+)
+
+
+def _job(text: str) -> Optional[str]:
+    jobs = [job for job, rx in _JOB_WORDS if rx.search(text)]
+    # "slab" words also show up in driveway/footing requests ("driveway pad",
+    # "footing slab"); any other pair of jobs is left to the model
+    if len(jobs) == 2 and "slab" in jobs and jobs[0] in ("driveway", "footing"):
+        jobs.remove("slab")
+    return jobs[0] if len(jobs) == 1 else None
+
+
+def parse_request(message: str) -> Dict[str, Any]:
+    """Pull job type and dimensions out of free text; only the fields found are returned."""
+    text = (message or "").lower()
+    out: Dict[str, Any] = {}
+    job = _job(text)
+    if job:
+        out["job"] = job
+
+    dims = _DIMS_RE.search(text)
+    if dims:
+        a = _ft(dims.group(1), dims.group(2) or dims.group(4))
+        b = _ft(dims.group(3), dims.group(4) or dims.group(2))
+        if job == "wall":
+            out["length_ft"], out["height_ft"] = a, b
+        elif job == "column":
+            out["size_in"] = float(dims.group(1))  # "12x12 column"
+        elif job == "footing":
+            pass  # "30x40" is a building plan, not a strip footing's length x width
+        else:
+            out["length_ft"], out["width_ft"] = max(a, b), min(a, b)
+    m = _LONG_RE.search(text)
+    if m:
+        out["length_ft"] = _ft(m.group(1), m.group(2))
+    m = _HIGH_RE.search(text)
+    if m:
+        out["height_ft"] = _ft(m.group(1), m.group(2))
+    m = _WIDE_RE.search(text)
+    if m:
+        out["width_ft"] = _ft(m.group(1), m.group(2))
+    m = _COUNT_RE.search(text)
+    if m:
+        out["count"] = int(m.group(1))
+
+    rest = text[:dims.start()] + " " + text[dims.end():] if dims else text
+    inches = [float(x) for x in _INCH_RE.findall(rest)] + [float(x) * 0.001 / IN for x in _MM_RE.findall(rest)]
+    if inches:
+        field = {"wall": "block_in", "footing": "depth_in", "column": "size_in"}.get(job, "thickness_in")
+        out.setdefault(field, inches[0])
+    if "rebar" in text or "steel" in text:
+        out["reinforcement"] = "rebar"
+    elif "mesh" in text:
+        out["reinforcement"] = "mesh"
+    return out
+
+
+# Plausible ranges; anything outside is left to the model
+_BOUNDS = {
+    "length_ft": (1, 1000), "width_ft": (0.5, 500), "height_ft": (1, 40),
+    "thickness_in": (2, 12), "block_in": (4, 8), "depth_in": (6, 48),
+    "size_in": (6, 36), "count": (1, 200),
+}
+# Tighter ranges per job: a strip footing wider than 6 ft is a raft or a pad
+_JOB_BOUNDS = {"footing": {"width_ft": (1, 6)}}
+
+_REQUIRED = {
+    "slab": ("length_ft", "width_ft"),
+    "driveway": ("length_ft", "width_ft"),
+    "wall": ("length_ft", "height_ft"),
+    "footing": ("length_ft",),
+    "column": ("height_ft",),
+}
+
+
+def match_request(message: str, spec: Optional[dict]) -> Optional[Dict[str, Any]]:
+    """
+    Full spec for a templated job, or None if the request does not fit one.
+    The message itself must name the job; its values win over the client's
+    spec, which fills the gaps ("6 inch slab" after a 20x30 slab). Follow-ups
+    without a job noun ("make it 6 inch", "with steel") go to the model.
+    """
+    text = (message or "").lower()
+    if _NOT_TEMPLATED_RE.search(text):
+        return None
+    parsed = parse_request(message)
+    if not parsed.get("job"):
+        return None  # a size or "steel" alone, merged with a stale spec, would re-run the old job
+    merged = {**(spec if isinstance(spec, dict) else {}), **parsed}
+    job = merged.get("job")
+    if job not in TEMPLATES:
+        return None
+    merged = {**DEFAULTS[job], **merged}
+    if any(merged.get(field) is None for field in _REQUIRED[job]):
+        return None
+    try:
+        for field, (lo, hi) in {**_BOUNDS, **_JOB_BOUNDS.get(job, {})}.items():
+            if field in merged:
+                merged[field] = float(merged[field])
+                if not lo <= merged[field] <= hi:
+                    return None
+    except (TypeError, ValueError):
+        return None
+    if job == "wall" and int(float(merged["block_in"])) not in MORTAR_M3_PER_M2:
+        return None
+    return merged
+
+
+def _concrete(volume_m3: float) -> List[Dict[str, Any]]:
+    dry = volume_m3 * (1 + WASTE) * CONCRETE_DRY_FACTOR
+    parts = sum(CONCRETE_MIX)
+    cement_m3 = dry * CONCRETE_MIX[0] / parts
+    return [
+        _line("cement_bag", math.ceil(cement_m3 * CEMENT_KG_PER_M3 / CEMENT_BAG_KG)),
+        _line("sharp_sand_m3", round(dry * CONCRETE_MIX[1] / parts, 2)),
+        _line("gravel_m3", round(dry * CONCRETE_MIX[2] / parts, 2)),
+    ]
+
+
+def _fmt(v: float) -> str:
+    return f"{round(v, 1):g}"
+
+
+def _line(key: str, qty: float) -> Dict[str, Any]:
+    return {"key": key, "qty": float(qty), "unit": MATERIALS[key].unit}
+
+
+def _rebar_grid(length_m: float, width_m: float, spacing_m: float = 0.3) -> float:
+    bars_along = math.floor(width_m / spacing_m) + 1
+    bars_across = math.floor(length_m / spacing_m) + 1
+    return (bars_along * length_m + bars_across * width_m) * REBAR_LAP
+
+
+def _slab(spec: Dict[str, Any]) -> Dict[str, Any]:
+    length, width = float(spec["length_ft"]) * FT, float(spec["width_ft"]) * FT
+    thick = float(spec["thickness_in"]) * IN
+    lines = _concrete(length * width * thick)
+    if spec.get("reinforcement") == "rebar":
+        lines.append(_line("rebar_corr_3_8_m", round(_rebar_grid(length, width), 1)))
+        reo = "3/8 rebar grid at 300 mm both ways"
+    else:
+        lines.append(_line("mesh_A142_sheet", math.ceil(length * width * MESH_LAP / MESH_SHEET_M2)))
+        reo = "one layer of A142 mesh"
+    notes = (f"{spec['job'].title()} {_fmt(spec['length_ft'])} x {_fmt(spec['width_ft'])} ft, "
+             f"{_fmt(spec['thickness_in'])} in thick ({length * width * thick:.2f} m³ concrete, 1:2:4 mix, "
+             f"{WASTE:.0%} waste), {reo}.")
+    return {"lines": lines, "notes": notes}
+
+
+def _wall(spec: Dict[str, Any]) -> Dict[str, Any]:
+    length, height = float(spec["length_ft"]) * FT, float(spec["height_ft"]) * FT
+    block_in = int(float(spec["block_in"]))
+    area = length * height
+    dry = area * MORTAR_M3_PER_M2[block_in] * (1 + WASTE) * MORTAR_DRY_FACTOR
+    parts = sum(MORTAR_MIX)
+    verticals = math.floor(length / WALL_VERTICAL_BAR_M) + 1
+    courses = math.floor(height / WALL_HORIZONTAL_BAR_M)
+    lines = [
+        _line(f"block_{block_in}in", math.ceil(area * BLOCKS_PER_M2 * (1 + WASTE))),
+        _line("cement_bag", math.ceil(dry * MORTAR_MIX[0] / parts * CEMENT_KG_PER_M3 / CEMENT_BAG_KG)),
+        _line("sand_m3", round(dry * MORTAR_MIX[1] / parts, 2)),
+        _line("rebar_corr_1_2_m", round(verticals * height * REBAR_LAP, 1)),
+        _line("rebar_corr_3_8_m", round(courses * length * REBAR_LAP, 1)),
+    ]
+    notes = (f"{block_in} in block wall {_fmt(spec['length_ft'])} ft long x {_fmt(spec['height_ft'])} ft high "
+             f"({area:.1f} m², {BLOCKS_PER_M2:g} blocks/m², 1:4 mortar), 1/2 verticals at "
+             f"{WALL_VERTICAL_BAR_M * 1000:.0f} mm, 3/8 horizontal every third course.")
+    return {"lines": lines, "notes": notes}
+
+
+def _footing(spec: Dict[str, Any]) -> Dict[str, Any]:
+    length, width = float(spec["length_ft"]) * FT, float(spec["width_ft"]) * FT
+    depth = float(spec["depth_in"]) * IN
+    lines = _concrete(length * width * depth)
+    links = math.floor(length / 0.3) + 1
+    lines += [
+        _line("rebar_corr_1_2_m", round(4 * length * REBAR_LAP, 1)),
+        _line("rebar_corr_3_8_m", round(links * max(width - 0.1, 0.1) * REBAR_LAP, 1)),
+    ]
+    notes = (f"Strip footing {_fmt(spec['length_ft'])} ft x {_fmt(spec['width_ft'])} ft "
+             f"x {_fmt(spec['depth_in'])} in "
+             f"({length * width * depth:.2f} m³ concrete), 4 no. 1/2 bars with 3/8 bars across at 300 mm.")
+    return {"lines": lines, "notes": notes}
+
+
+def _column(spec: Dict[str, Any]) -> Dict[str, Any]:
+    size = float(spec["size_in"]) * IN
+    height = float(spec["height_ft"]) * FT
+    count = max(1, int(float(spec.get("count") or 1)))
+    lines = _concrete(size * size * height * count)
+    ties = (math.floor(height / 0.2) + 1) * count
+    tie_len = 4 * max(size - 0.08, 0.05) + 0.1  # 40 mm cover each side + hooks
+    lines += [
+        _line("rebar_corr_1_2_m", round(4 * (height + 0.6) * count * REBAR_LAP, 1)),
+        _line("rebar_mild_3_8_m", round(ties * tie_len, 1)),
+    ]
+    notes = (f"{count} column(s) {_fmt(spec['size_in'])} x {_fmt(spec['size_in'])} in, "
+             f"{_fmt(spec['height_ft'])} ft high, 4 no. 1/2 bars with 3/8 ties at 200 mm.")
+    return {"lines": lines, "notes": notes}
+
+
+TEMPLATES: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "slab": _slab,
+    "driveway": _slab,
+    "wall": _wall,
+    "footing": _footing,
+    "column": _column,
+}
+
+_STEPS = {
+    "slab": "Clear and level the area, compact the base, set formwork, place the {reo}, "
+            "pour and screed the concrete, then keep it damp for 7 days.",
+    "driveway": "Excavate and compact the sub-base, set edge forms with a fall for drainage, "
+                "place the {reo}, pour and broom-finish the concrete, and keep traffic off for 7 days.",
+    "wall": "Set out the line on the footing, lay the first course level, build up in courses "
+            "with the vertical bars in the cores, fill reinforced cores, and cure the mortar damp.",
+    "footing": "Excavate to firm ground, blind the trench, place the steel cage on spacers, "
+               "pour the concrete and leave starter bars for the wall or columns.",
+    "column": "Fix the cage to the starter bars, box it with plumb formwork, pour in lifts while "
+              "rodding the concrete, and strip the forms after 2-3 days.",
+}
+
+
+def estimate(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Lines and notes for a spec returned by match_request."""
+    return TEMPLATES[spec["job"]](spec)
+
+
+def narrative(spec: Dict[str, Any], estimate_: Dict[str, Any]) -> str:
+    """Short plan to go with a templated estimate (what expand_steps_with_ai writes for the LLM path)."""
+    reo = "rebar grid" if spec.get("reinforcement") == "rebar" else "A142 mesh"
+    steps = _STEPS[spec["job"]].format(reo=reo)
+    total = estimate_.get("total", 0)
+    return (f"Here’s the step-by-step plan and a materials summary.\n"
+            f"- {steps}\n"
+            f"- Quantities include {WASTE:.0%} waste; estimated materials total {total:,.2f}.")
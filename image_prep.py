@@ -0,0 +1,217 @@
+# image_prep.py
+import os
+import io
+import math
+import time
+import base64
+import hashlib
+import logging
+import threading
+from typing import NamedTuple, Optional, Tuple
+
+import disk_cache
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("IMAGE_PREP", "1") != "0"
+FORMAT = os.getenv("IMAGE_PREP_FORMAT", "jpeg").strip().lower()       # jpeg | webp
+QUALITY = int(os.getenv("IMAGE_PREP_QUALITY", "80"))
+GRAYSCALE = os.getenv("IMAGE_PREP_GRAYSCALE", "1") != "0"             # documents only
+MAX_SIDE = int(os.getenv("IMAGE_PREP_MAX_SIDE", "2048"))
+SHORT_SIDE = int(os.getenv("IMAGE_PREP_SHORT_SIDE", "768"))
+CACHE_DIR = os.getenv("IMAGE_PREP_CACHE_DIR", os.path.join("instance", "image_cache"))
+CACHE_MAX_BYTES = int(float(os.getenv("IMAGE_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+# High-detail vision input is billed per 512px tile after the API scales the
+# image to fit MAX_SIDE x MAX_SIDE and then to SHORT_SIDE on the short side;
+# anything larger is thrown away server-side.
+TILE = 512
+TILE_SLACK = 0.9  # shrink up to 10% further if that saves a row/column of tiles
+_PREP_VERSION = 1  # bump when the pipeline changes so cached outputs are rebuilt
+
+_MIME = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png",
+         ".webp": "image/webp", ".gif": "image/gif"}
+
+
+class Prepared(NamedTuple):
+    data_url: str
+    bytes_in: int
+    bytes_out: int
+    size: Optional[Tuple[int, int]]  # None when not re-encoded here
+    encode_ms: float
+    cached: bool
+
+
+def tiles(w: int, h: int) -> int:
+    return math.ceil(w / TILE) * math.ceil(h / TILE)
+
+
+def target_size(w: int, h: int) -> Tuple[int, int]:
+    """Largest size the model will actually see, trimmed to a tile boundary when cheap."""
+    s = min(1.0, MAX_SIDE / max(w, h), SHORT_SIDE / min(w, h))
+    best = (tiles(round(w * s), round(h * s)), -s)
+    for d in (w, h):
+        k = math.floor(d * s / TILE)
+        if k >= 1:
+            cand = k * TILE / d
+            if cand >= s * TILE_SLACK:
+                best = min(best, (tiles(round(w * cand), round(h * cand)), -cand))
+    s = -best[1]
+    return max(1, round(w * s)), max(1, round(h * s))
+
+
+def raw_data_url(path: str, raw: bytes) -> str:
+    mime = _MIME.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+    return f"data:{mime};base64,{base64.b64encode(raw).decode('ascii')}"
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.images = 0
+        self.cache_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.encode_ms = 0.0
+        self.errors = 0
+        self.evicted = 0
+        self.writes = 0  # since the last cache sweep
+
+    def add(self, p: Prepared) -> None:
+        with self.lock:
+            self.images += 1
+            self.cache_hits += int(p.cached)
+            self.bytes_in += p.bytes_in
+            self.bytes_out += p.bytes_out
+            self.encode_ms += p.encode_ms
+
+
+_stats = _Stats()
+
+
+def evict(max_bytes: int = CACHE_MAX_BYTES) -> int:
+    """Trim CACHE_DIR to max_bytes, oldest mtime (last use) first. Returns files removed."""
+    if not CACHE_DIR:
+        return 0
+    removed = disk_cache.trim_lru(CACHE_DIR, max_bytes)
+    with _stats.lock:
+        _stats.evicted += removed
+    return removed
+
+
+def _encode(raw: bytes, document: bool) -> Tuple[bytes, Tuple[int, int]]:
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(raw)) as im:
+        im = ImageOps.exif_transpose(im)  # phone photos are often stored sideways
+        if document and GRAYSCALE:
+            im = im.convert("L")
+        elif im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        size = target_size(*im.size)
+        if size != im.size:
+            im = im.resize(size, Image.LANCZOS)
+        buf = io.BytesIO()
+        if FORMAT == "webp":
+            im.save(buf, format="WEBP", quality=QUALITY, method=4)
+        else:
+            im.save(buf, format="JPEG", quality=QUALITY, optimize=True)
+        return buf.getvalue(), im.size
+
+
+def prepare(path: str, document: bool = True) -> Optional[Prepared]:
+    """
+    data: URL for an image sent to a vision model. EXIF-rotated, downscaled to
+    what the model will see, grey for documents, recompressed; cached on disk
+    under CACHE_DIR by content hash, trimmed to CACHE_MAX_BYTES least recently
+    used first. Falls back to the raw bytes if Pillow is missing or the image
+    cannot be decoded. Returns None if the file is unreadable.
+    """
+    t0 = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        log.exception("Cannot read image %s", path)
+        return None
+    return prepare_bytes(raw, path, document, t0)
+
+
+def prepare_bytes(raw: bytes, name: str, document: bool = True,
+                  t0: Optional[float] = None) -> Prepared:
+    """prepare() for an in-memory image; name only supplies the extension."""
+    t0 = time.perf_counter() if t0 is None else t0
+    if not ENABLED:
+        url = raw_data_url(name, raw)
+        return Prepared(url, len(raw), len(raw), None, (time.perf_counter() - t0) * 1000.0, False)
+
+    fmt = "webp" if FORMAT == "webp" else "jpeg"
+    params = f"v{_PREP_VERSION}|{fmt}|q{QUALITY}|g{int(document and GRAYSCALE)}|{MAX_SIDE}x{SHORT_SIDE}"
+    digest = hashlib.sha256(raw + params.encode("ascii")).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, digest[:2], f"{digest}.{fmt}") if CACHE_DIR else None
+    mime = f"image/{fmt}"
+
+    out = None
+    if cache_path:
+        try:
+            with open(cache_path, "rb") as f:
+                out = f.read()
+            os.utime(cache_path)  # LRU: mtime is last use
+        except OSError:
+            out = None
+    if out is not None:
+        p = Prepared(f"data:{mime};base64,{base64.b64encode(out).decode('ascii')}", len(raw), len(out),
+                     None, (time.perf_counter() - t0) * 1000.0, True)
+        _stats.add(p)
+        return p
+
+    try:
+        out, size = _encode(raw, document)
+    except Exception as e:
+        log.warning("Image preprocessing failed for %s (%s); sending it as-is", name, e)
+        with _stats.lock:
+            _stats.errors += 1
+        url = raw_data_url(name, raw)
+        return Prepared(url, len(raw), len(raw), None, (time.perf_counter() - t0) * 1000.0, False)
+    if cache_path:
+        tmp = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(out)
+            os.replace(tmp, cache_path)
+        except OSError as e:
+            log.warning("Image cache write failed (%s): %s", cache_path, e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        with _stats.lock:
+            _stats.writes += 1
+            sweep = _stats.writes >= 20
+            if sweep:
+                _stats.writes = 0
+        if sweep:  # amortized: walk the cache every ~20 new images
+            evict()
+    p = Prepared(f"data:{mime};base64,{base64.b64encode(out).decode('ascii')}", len(raw), len(out),
+                 size, (time.perf_counter() - t0) * 1000.0, False)
+    _stats.add(p)
+    return p
+
+
+def stats() -> dict:
+    with _stats.lock:
+        s = _stats
+        return {
+            "enabled": ENABLED,
+            "format": FORMAT,
+            "images": s.images,
+            "cache_hits": s.cache_hits,
+            "bytes_in": s.bytes_in,
+            "bytes_out": s.bytes_out,
+            "ratio": round(s.bytes_out / s.bytes_in, 4) if s.bytes_in else None,
+            "encode_ms": round(s.encode_ms, 1),
+            "errors": s.errors,
+            "evicted": s.evicted,
+            "max_mb": round(CACHE_MAX_BYTES / 1024 / 1024, 1),
+        }
@@ -0,0 +1,383 @@
+# jobs.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+TERMINAL = ("done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    owner        TEXT,
+    payload      TEXT NOT NULL,
+    result       TEXT,
+    progress     TEXT,
+    error        TEXT,
+    heartbeat_at REAL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    started_at   REAL,
+    finished_at  REAL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, created_at);
+"""
+
+
+class JobError(Exception):
+    """Raised by a handler for an expected failure; the message is shown to the client."""
+
+
+class JobQueue(ABC):
+    """
+    Background jobs run by a bounded pool of worker threads in this process.
+    Handlers are registered per kind and take the JSON payload, returning a
+    JSON-serializable result (or raising JobError). A handler registered with
+    progress=True also gets a report(data) callback whose latest data is
+    visible to pollers while the job runs. Storage is left to the
+    subclasses: MemoryJobQueue (one process) and SqliteJobQueue (shared by
+    every worker process, survives restarts). While jobs run, a heartbeat
+    thread calls _beat() every heartbeat_seconds (None: no heartbeat) so a
+    long job is not mistaken for one whose worker died.
+    """
+
+    heartbeat_seconds: Optional[float] = None
+
+    def __init__(self, workers: int = 2, result_ttl: float = 86400.0, poll_seconds: float = 1.0):
+        self.workers = max(1, int(workers))
+        self.result_ttl = float(result_ttl)
+        self.poll_seconds = float(poll_seconds)
+        self.handlers: Dict[str, Callable[..., Any]] = {}
+        self._with_progress: set = set()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._heart: Optional[threading.Thread] = None
+        self._running: set = set()
+        self._busy = 0
+        self.completed = 0
+        self.failed = 0
+
+    # -- storage (subclasses) --
+    @abstractmethod
+    def _insert(self, job_id: str, kind: str, payload: dict, owner: Optional[str], now: float) -> None:
+        ...
+
+    @abstractmethod
+    def _claim(self) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def _finish(self, job_id: str, status: str, result: Any, error: Optional[str]) -> None:
+        ...
+
+    @abstractmethod
+    def _set_progress(self, job_id: str, data: Any) -> None:
+        ...
+
+    def _beat(self, job_ids: List[str]) -> None:
+        """Mark these running jobs as alive; storage without stale reclaim needs nothing."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        ...
+
+    # -- queue --
+    def register(self, kind: str, fn: Callable[..., Any], progress: bool = False) -> None:
+        self.handlers[kind] = fn
+        if progress:
+            self._with_progress.add(kind)
+
+    def submit(self, kind: str, payload: dict, owner: Optional[str] = None) -> str:
+        if kind not in self.handlers:
+            raise KeyError(f"No handler for job kind {kind!r}")
+        job_id = uuid.uuid4().hex
+        self._insert(job_id, kind, payload, owner, time.time())
+        with self._cond:
+            self._cond.notify()
+        return job_id
+
+    def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """The job once it is finished, or as it stands after timeout seconds."""
+        end = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            left = end - time.monotonic()
+            if job is None or job["status"] in TERMINAL or left <= 0:
+                return job
+            with self._cond:
+                self._cond.wait(min(left, self.poll_seconds))
+
+    def start(self) -> None:
+        """
+        Start this process's worker threads (idempotent). Call once every
+        handler is registered: workers claim any queued job, including ones
+        submitted or left stale by another process, so a process that never
+        submits still runs its share.
+        """
+        self._ensure_workers()
+
+    def _ensure_workers(self) -> None:
+        with self._cond:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            if self.heartbeat_seconds and (self._heart is None or not self._heart.is_alive()):
+                self._heart = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+                self._heart.start()
+
+    def _heartbeat(self) -> None:
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            with self._cond:
+                running = list(self._running)
+            if running:
+                try:
+                    self._beat(running)
+                except Exception:
+                    log.exception("Job heartbeat failed")
+
+    def _work(self) -> None:
+        while True:
+            try:
+                job = self._claim()
+            except Exception:
+                log.exception("Job claim failed")
+                job = None
+            if job is None:
+                with self._cond:
+                    self._cond.wait(self.poll_seconds)
+                continue
+            self._run(job)
+
+    def _run(self, job: dict) -> None:
+        handler = self.handlers.get(job["kind"])
+        t0 = time.perf_counter()
+        with self._cond:
+            self._busy += 1
+            self._running.add(job["id"])
+        status, result, error = "failed", None, None
+        try:
+            if handler is None:
+                raise JobError(f"No handler for job kind {job['kind']!r}")
+            if job["kind"] in self._with_progress:
+                result = handler(job["payload"], lambda data: self._set_progress(job["id"], data))
+            else:
+                result = handler(job["payload"])
+            status = "done"
+        except JobError as e:
+            error = str(e)
+        except Exception as e:
+            log.exception("Job %s (%s) failed", job["id"], job["kind"])
+            error = f"{type(e).__name__}: {e}"
+        try:
+            self._finish(job["id"], status, result, error)
+        except Exception:
+            log.exception("Storing job %s failed", job["id"])
+        log.info("Job %s %s %s in %.0f ms", job["id"], job["kind"], status, (time.perf_counter() - t0) * 1000.0)
+        with self._cond:
+            self._busy -= 1
+            self._running.discard(job["id"])
+            if status == "done":
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._cond.notify_all()  # wake wait()ers
+
+    def stats(self) -> dict:
+        with self._cond:
+            out = {"backend": type(self).__name__, "workers": self.workers, "busy": self._busy,
+                   "completed": self.completed, "failed": self.failed}
+        out["jobs"] = self.counts()
+        return out
+
+
+class MemoryJobQueue(JobQueue):
+    """Jobs kept in this process only; finished ones are dropped after result_ttl."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._jobs: Dict[str, dict] = {}
+        self._queue: deque = deque()
+        self._lock = threading.Lock()
+
+    def _insert(self, job_id, kind, payload, owner, now):
+        job = {"id": job_id, "kind": kind, "status": "queued", "owner": owner, "payload": payload,
+               "result": None, "progress": None, "error": None, "attempts": 0,
+               "created_at": now, "started_at": None, "finished_at": None}
+        with self._lock:
+            cutoff = now - self.result_ttl
+            for jid in [j["id"] for j in self._jobs.values()
+                        if j["status"] in TERMINAL and j["finished_at"] < cutoff]:
+                del self._jobs[jid]
+            self._jobs[job_id] = job
+            self._queue.append(job_id)
+
+    def _claim(self):
+        with self._lock:
+            while self._queue:
+                job = self._jobs.get(self._queue.popleft())
+                if job is not None and job["status"] == "queued":
+                    job.update(status="running", started_at=time.time(), attempts=job["attempts"] + 1)
+                    return dict(job)
+        return None
+
+    def _finish(self, job_id, status, result, error):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(status=status, result=result, error=error, finished_at=time.time())
+
+    def _set_progress(self, job_id, data):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["progress"] = json.loads(json.dumps(data))  # a snapshot, as the SQLite backend stores
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def counts(self):
+        out: Dict[str, int] = {}
+        with self._lock:
+            for j in self._jobs.values():
+                out[j["status"]] = out.get(j["status"], 0) + 1
+        return out
+
+
+class SqliteJobQueue(JobQueue):
+    """
+    Jobs in a SQLite file shared by all worker processes: any process can run
+    a job and any process can answer a poll for it. Running jobs get a
+    heartbeat (and every progress report counts as one); a job with no
+    heartbeat for stale_seconds (its process died) is retried up to
+    max_attempts times.
+    """
+
+    def __init__(self, db_path: str, stale_seconds: float = 600.0, max_attempts: int = 2, **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = db_path
+        self.stale_seconds = float(stale_seconds)
+        self.max_attempts = int(max_attempts)
+        self.heartbeat_seconds = max(1.0, min(60.0, self.stale_seconds / 4))
+        self._local = threading.local()
+        self._claims = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        db = self._db()
+        db.executescript(_SCHEMA)
+        cols = {r[1] for r in db.execute("PRAGMA table_info(jobs)")}
+        if "progress" not in cols:  # jobs.db created before progress reporting
+            db.execute("ALTER TABLE jobs ADD COLUMN progress TEXT")
+        if "heartbeat_at" not in cols:
+            db.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, job_id, kind, payload, owner, now):
+        self._db().execute(
+            "INSERT INTO jobs (id, kind, status, owner, payload, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, owner, json.dumps(payload), now),
+        )
+
+    def _claim(self):
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            stale = now - self.stale_seconds
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Worker lost', finished_at = ? "
+                "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < ? AND attempts >= ?",
+                (now, stale, self.max_attempts),
+            )
+            row = db.execute(
+                "SELECT id, kind, payload FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND COALESCE(heartbeat_at, started_at) < ?) ORDER BY created_at LIMIT 1",
+                (stale,),
+            ).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, "
+                           "attempts = attempts + 1 WHERE id = ?", (now, now, row[0]))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        self._claims += 1
+        if self._claims % 200 == 0:  # amortized cleanup of old results
+            db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                       (now - self.result_ttl,))
+        if row is None:
+            return None
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2])}
+
+    def _finish(self, job_id, status, result, error):
+        self._db().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+        )
+
+    def _set_progress(self, job_id, data):
+        self._db().execute("UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ?",
+                           (json.dumps(data), time.time(), job_id))
+
+    def _beat(self, job_ids):
+        self._db().execute(
+            f"UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND id IN ({','.join('?' * len(job_ids))})",
+            (time.time(), *job_ids),
+        )
+
+    def get(self, job_id):
+        row = self._db().execute(
+            "SELECT id, kind, status, owner, result, progress, error, attempts, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?", (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "kind": row[1], "status": row[2], "owner": row[3],
+                "result": json.loads(row[4]) if row[4] else None,
+                "progress": json.loads(row[5]) if row[5] else None, "error": row[6], "attempts": row[7],
+                "created_at": row[8], "started_at": row[9], "finished_at": row[10]}
+
+    def counts(self):
+        rows = self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+
+def from_env() -> JobQueue:
+    """JOB_QUEUE=sqlite (default, JOB_DB) or memory; JOB_WORKERS threads per process."""
+    kwargs = {
+        "workers": int(os.getenv("JOB_WORKERS", "2")),
+        "result_ttl": float(os.getenv("JOB_RESULT_TTL_SECONDS", "86400")),
+    }
+    if os.getenv("JOB_QUEUE", "sqlite").strip().lower() == "memory":
+        return MemoryJobQueue(**kwargs)
+    db_path = os.getenv("JOB_DB", os.path.join("instance", "jobs.db"))
+    try:
+        return SqliteJobQueue(db_path, stale_seconds=float(os.getenv("JOB_STALE_SECONDS", "600")), **kwargs)
+    except Exception as e:
+        log.warning("SQLite job queue unavailable (%s): %s; using the in-process queue", db_path, e)
+        return MemoryJobQueue(**kwargs)
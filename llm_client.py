@@ -0,0 +1,185 @@
+# llm_client.py
+import os
+import atexit
+import logging
+import threading
+import weakref
+import urllib.request
+from datetime import datetime
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+from openai import OpenAI
+
+import llm_replay
+
+log = logging.getLogger(__name__)
+
+# Pool settings (per worker process)
+POOL_MAX_CONNECTIONS = int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", "20"))
+POOL_MAX_KEEPALIVE = int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", "10"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_POOL_KEEPALIVE_SECONDS", "30"))
+HTTP_TIMEOUT = float(os.getenv("OPENAI_HTTP_TIMEOUT", "60"))
+HTTP2 = os.getenv("OPENAI_HTTP2", "0").strip().lower() in {"1", "true", "yes"}
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """HTTPTransport that counts requests and newly opened pool connections."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._stats_lock = threading.Lock()
+        self._seen = weakref.WeakSet()  # pool connections already counted
+        self.requests = 0
+        self.errors = 0
+        self.connections_opened = 0
+
+    def _connections(self):
+        return list(getattr(getattr(self, "_pool", None), "connections", ()) or ())
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            return super().handle_request(request)
+        except Exception:
+            with self._stats_lock:
+                self.errors += 1
+            raise
+        finally:
+            conns = self._connections()
+            with self._stats_lock:
+                self.requests += 1
+                for c in conns:
+                    if c not in self._seen:
+                        self._seen.add(c)
+                        self.connections_opened += 1
+
+    def stats(self) -> dict:
+        conns = self._connections()
+        idle = sum(1 for c in conns if getattr(c, "is_idle", lambda: False)())
+        with self._stats_lock:
+            requests, opened, errors = self.requests, self.connections_opened, self.errors
+        return {
+            "requests": requests,
+            "errors": errors,
+            "connections_opened": opened,
+            # share of requests that rode an already-open connection
+            "reuse_rate": round(1.0 - opened / requests, 4) if requests else None,
+            "open_connections": len(conns),
+            "idle_connections": idle,
+        }
+
+
+def _env_proxy() -> Optional[str]:
+    """
+    Proxy for the API host, chosen as httpx's trust_env would: HTTPS_PROXY /
+    HTTP_PROXY by scheme, then ALL_PROXY, and none when NO_PROXY covers the
+    host. The transport is built by hand (for its counters), so httpx does
+    not read these itself.
+    """
+    url = urlsplit(os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1")
+    host = url.hostname or ""
+    if host and urllib.request.proxy_bypass(host):
+        return None
+    proxies = urllib.request.getproxies()  # lower-cased scheme -> url, from the environment
+    return proxies.get(url.scheme or "https") or proxies.get("all") or None
+
+
+class _Shared:
+    """The worker's one OpenAI client and the transport under it."""
+
+    def __init__(self, api_key: str):
+        proxy = _env_proxy()
+        http2 = HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                log.warning("OPENAI_HTTP2 is set but the h2 package is missing; using HTTP/1.1")
+                http2 = False
+        self.transport = CountingTransport(
+            http2=http2,
+            proxy=httpx.Proxy(proxy) if proxy else None,
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+            ),
+        )
+        # LLM_REPLAY=record|replay|auto captures/serves responses as fixtures (llm_replay)
+        self.replay = llm_replay.from_env(self.transport)
+        self.http = httpx.Client(transport=self.replay or self.transport, timeout=HTTP_TIMEOUT)
+        self.client = OpenAI(api_key=api_key, http_client=self.http)
+        self.api_key = api_key
+        self.http2 = http2
+        self.proxy = bool(proxy)
+        self.created_at = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+    def close(self) -> None:
+        try:
+            self.http.close()
+        except Exception:
+            log.exception("Closing the OpenAI HTTP client failed")
+
+
+_lock = threading.Lock()
+_shared: Optional[_Shared] = None
+
+
+def get_client() -> Optional[OpenAI]:
+    """
+    The process-wide OpenAI client, created on first use. Returns None if no API
+    key is configured. Thread-safe; rebuilt only if OPENAI_API_KEY changes.
+    """
+    global _shared
+    key = os.getenv("OPENAI_API_KEY")
+    if not key:
+        log.warning("OPENAI_API_KEY is not set")
+        return None
+    shared = _shared
+    if shared is not None and shared.api_key == key:
+        return shared.client
+    with _lock:
+        if _shared is None or _shared.api_key != key:
+            old, _shared = _shared, _Shared(key)
+            if old is not None:
+                old.close()
+        return _shared.client
+
+
+def close_client() -> None:
+    """Close the shared client's connections (worker exit)."""
+    global _shared
+    with _lock:
+        old, _shared = _shared, None
+    if old is not None:
+        old.close()
+
+
+def pool_stats() -> dict:
+    shared = _shared
+    if shared is None:
+        return {"created": False}
+    return {
+        "created": True,
+        "created_at": shared.created_at,
+        "http2": shared.http2,
+        "proxy": shared.proxy,
+        "max_connections": POOL_MAX_CONNECTIONS,
+        "max_keepalive": POOL_MAX_KEEPALIVE,
+        **shared.transport.stats(),
+        "replay": shared.replay.stats() if shared.replay is not None else None,
+    }
+
+
+def _forget_after_fork() -> None:
+    # The parent's sockets must not be shared with a forked worker; drop the
+    # reference without closing them and let the child build its own.
+    global _shared, _lock
+    _shared = None
+    _lock = threading.Lock()
+
+
+atexit.register(close_client)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_after_fork)
@@ -0,0 +1,285 @@
+# llm_metrics.py
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# Wall-time histogram bucket upper bounds (ms); the last bucket is open-ended
+BUCKETS_MS = (100, 250, 500, 1000, 2000, 5000, 10000, 20000, 45000, 90000)
+
+# USD per 1M tokens (input, output); LLM_PRICES='{"model": [in, out]}' adds or overrides
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+try:
+    PRICES.update({k: (float(v[0]), float(v[1])) for k, v in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+except (ValueError, TypeError, IndexError, AttributeError):
+    log.warning("Ignoring malformed LLM_PRICES")
+
+_DAILY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_usage_daily (
+    day                TEXT NOT NULL,
+    function           TEXT NOT NULL,
+    model              TEXT NOT NULL,
+    calls              INTEGER NOT NULL DEFAULT 0,
+    failures           INTEGER NOT NULL DEFAULT 0,
+    attempts           INTEGER NOT NULL DEFAULT 0,
+    fallbacks          INTEGER NOT NULL DEFAULT 0,
+    hedges             INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens      INTEGER NOT NULL DEFAULT 0,
+    completion_tokens  INTEGER NOT NULL DEFAULT 0,
+    images             INTEGER NOT NULL DEFAULT 0,
+    payload_bytes      INTEGER NOT NULL DEFAULT 0,
+    wall_ms            REAL NOT NULL DEFAULT 0,
+    cost_usd           REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, function, model)
+);
+"""
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Estimated cost; None for a model missing from PRICES (dated snapshots match their base name)."""
+    price = PRICES.get(model)
+    if price is None:
+        base = next((k for k in sorted(PRICES, key=len, reverse=True) if model.startswith(k + "-")), None)
+        price = PRICES.get(base) if base else None
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000.0
+
+
+def payload_size(messages: Iterable[Dict[str, Any]]) -> Tuple[int, int]:
+    """(image count, bytes of text and image URLs) in a chat messages list."""
+    images = size = 0
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, str):
+            size += len(content)
+            continue
+        for part in content or ():
+            if part.get("type") == "image_url":
+                images += 1
+                size += len((part.get("image_url") or {}).get("url") or "")
+            else:
+                size += len(part.get("text") or "")
+    return images, size
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "n")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def add(self, ms: float) -> None:
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += ms
+        self.n += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None past the last bound)."""
+        if not self.n:
+            return None
+        rank, seen = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else None
+        return None
+
+    def info(self) -> dict:
+        return {
+            "buckets_ms": {str(b): c for b, c in zip(list(BUCKETS_MS) + ["inf"], self.counts)},
+            "mean_ms": round(self.total / self.n, 1) if self.n else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+        }
+
+
+class _Series:
+    __slots__ = ("calls", "failures", "attempts", "fallbacks", "hedges", "prompt_tokens",
+                 "completion_tokens", "images", "payload_bytes", "cost_usd", "wall", "last_error")
+
+    def __init__(self):
+        self.calls = self.failures = self.attempts = self.fallbacks = self.hedges = 0
+        self.prompt_tokens = self.completion_tokens = self.images = self.payload_bytes = 0
+        self.cost_usd = 0.0
+        self.wall = Histogram()
+        self.last_error: Optional[str] = None
+
+
+class LlmMetrics:
+    """
+    Per-call model metrics, keyed by (function, model). Counters and a
+    wall-time histogram live in memory for this process; each call is also
+    added to a per-day row in SQLite (db_path) shared by all workers, for
+    capacity planning. Pass db_path=None to keep it in memory only.
+    """
+
+    def __init__(self, db_path: Optional[str]):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self.started_at = time.time()
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db().executescript(_DAILY_SCHEMA)
+            except Exception as e:
+                log.warning("LLM daily metrics disabled (%s): %s", db_path, e)
+                self.db_path = None
+
+    @classmethod
+    def from_env(cls) -> "LlmMetrics":
+        """LLM_METRICS_DB="" keeps the metrics in memory only."""
+        return cls(os.getenv("LLM_METRICS_DB", os.path.join("instance", "llm_metrics.db")) or None)
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, function: str, model: str, *, ok: bool, wall_ms: float, attempts: int = 1,
+               fallback: bool = False, hedged: bool = False, usage: Any = None,
+               images: int = 0, payload_bytes: int = 0, error: Optional[BaseException] = None) -> None:
+        pt = int(getattr(usage, "prompt_tokens", 0) or 0)
+        ct = int(getattr(usage, "completion_tokens", 0) or 0)
+        cost = cost_usd(model, pt, ct) or 0.0
+        with self._lock:
+            s = self._series.get((function, model))
+            if s is None:
+                s = self._series[(function, model)] = _Series()
+            s.calls += 1
+            s.failures += int(not ok)
+            s.attempts += attempts
+            s.fallbacks += int(fallback)
+            s.hedges += int(hedged)
+            s.prompt_tokens += pt
+            s.completion_tokens += ct
+            s.images += images
+            s.payload_bytes += payload_bytes
+            s.cost_usd += cost
+            s.wall.add(wall_ms)
+            if error is not None:
+                s.last_error = f"{type(error).__name__}: {error}"
+        if not self.db_path:
+            return
+        try:
+            self._db().execute(
+                "INSERT INTO llm_usage_daily (day, function, model, calls, failures, attempts, fallbacks, hedges, "
+                "prompt_tokens, completion_tokens, images, payload_bytes, wall_ms, cost_usd) "
+                "VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (day, function, model) DO UPDATE SET "
+                "calls = calls + 1, failures = failures + excluded.failures, "
+                "attempts = attempts + excluded.attempts, fallbacks = fallbacks + excluded.fallbacks, "
+                "hedges = hedges + excluded.hedges, prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens, "
+                "images = images + excluded.images, payload_bytes = payload_bytes + excluded.payload_bytes, "
+                "wall_ms = wall_ms + excluded.wall_ms, cost_usd = cost_usd + excluded.cost_usd",
+                (datetime.now(timezone.utc).date().isoformat(), function, model, int(not ok), attempts, int(fallback), int(hedged),
+                 pt, ct, images, payload_bytes, float(wall_ms), cost),
+            )
+        except sqlite3.Error as e:
+            log.warning("LLM daily metrics write failed: %s", e)
+
+    def record_usage(self, function: str, model: str, usage: Any) -> None:
+        """Tokens and cost of an attempt whose answer was not used (a hedge loser); not counted as a call."""
+        pt = int(getattr(usage, "prompt_tokens", 0) or 0)
+        ct = int(getattr(usage, "completion_tokens", 0) or 0)
+        if not pt and not ct:
+            return
+        cost = cost_usd(model, pt, ct) or 0.0
+        with self._lock:
+            s = self._series.get((function, model))
+            if s is None:
+                s = self._series[(function, model)] = _Series()
+            s.prompt_tokens += pt
+            s.completion_tokens += ct
+            s.cost_usd += cost
+        if not self.db_path:
+            return
+        try:
+            self._db().execute(
+                "INSERT INTO llm_usage_daily (day, function, model, calls, failures, attempts, fallbacks, hedges, "
+                "prompt_tokens, completion_tokens, images, payload_bytes, wall_ms, cost_usd) "
+                "VALUES (?, ?, ?, 0, 0, 0, 0, 0, ?, ?, 0, 0, 0, ?) "
+                "ON CONFLICT (day, function, model) DO UPDATE SET "
+                "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens, "
+                "cost_usd = cost_usd + excluded.cost_usd",
+                (datetime.now(timezone.utc).date().isoformat(), function, model, pt, ct, cost),
+            )
+        except sqlite3.Error as e:
+            log.warning("LLM daily metrics write failed: %s", e)
+
+    def snapshot(self) -> List[dict]:
+        """This process's series since start, one entry per (function, model)."""
+        with self._lock:
+            items = sorted(self._series.items())
+            out = []
+            for (function, model), s in items:
+                out.append({
+                    "function": function, "model": model, "calls": s.calls, "failures": s.failures,
+                    "attempts": s.attempts, "fallbacks": s.fallbacks, "hedges": s.hedges,
+                    "prompt_tokens": s.prompt_tokens, "completion_tokens": s.completion_tokens,
+                    "images": s.images, "payload_bytes": s.payload_bytes,
+                    "cost_usd": round(s.cost_usd, 6), "wall": s.wall.info(), "last_error": s.last_error,
+                })
+        return out
+
+    def daily(self, days: int = 30) -> List[dict]:
+        """Per-day (UTC) totals from all workers, newest first."""
+        if not self.db_path:
+            return []
+        cols = ("day", "function", "model", "calls", "failures", "attempts", "fallbacks", "hedges",
+                "prompt_tokens", "completion_tokens", "images", "payload_bytes", "wall_ms", "cost_usd")
+        try:
+            rows = self._db().execute(
+                f"SELECT {', '.join(cols)} FROM llm_usage_daily WHERE day >= date('now', ?) "
+                "ORDER BY day DESC, function, model", (f"-{int(days)} days",),
+            ).fetchall()
+        except sqlite3.Error as e:
+            log.warning("LLM daily metrics read failed: %s", e)
+            return []
+        out = []
+        for row in rows:
+            d = dict(zip(cols, row))
+            d["mean_ms"] = round(d["wall_ms"] / d["calls"], 1) if d["calls"] else None
+            d["wall_ms"] = round(d["wall_ms"], 1)
+            d["cost_usd"] = round(d["cost_usd"], 6)
+            out.append(d)
+        return out
+
+
+def track_stream(stream: Any, on_close) -> Iterator[Any]:
+    """Yield from a chat completion stream, then call on_close(usage, error) once."""
+    usage, error = None, None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            yield chunk
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        on_close(usage, error)
+
+
+METRICS = LlmMetrics.from_env()
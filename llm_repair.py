@@ -0,0 +1,344 @@
+# llm_repair.py
+"""
+Local clean-up of model output, so a near miss does not cost a second call.
+
+    data, repairs = loads(text)          # tolerant json.loads
+    match_key("rebar_corrugated_1_2_m")  # -> "rebar_corr_1_2_m"
+    match_unit("cu m")                   # -> "m3"
+
+loads() fixes code fences, prose around the object, comments, single quotes,
+Python literals, unquoted keys and trailing commas. Output cut off mid-way
+raises TruncatedOutput: it is never closed up and passed off as complete.
+match_key() maps a near-miss material key onto the registry: case and
+separators, typos (a precomputed deletion index, edit distance <= 2),
+abbreviated or plural words, or a missing unit suffix, but only when exactly
+one key fits and every number in it matches. Every repair is described in the returned list; REPORT keeps
+counts for /health.
+"""
+import json
+import re
+import threading
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from materials import BOM_UNITS, KEYS, STAFF_UNIT_ALIASES, UNIT_ALIASES
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*\n?(.*?)\n?\s*```\s*$", re.S)
+_SMART = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_LITERALS = {"True": "true", "False": "false", "None": "null", "NaN": "null", "undefined": "null"}
+_WORD_RE = re.compile(r"([A-Za-z_][\w-]*)(\s*:)?")
+
+
+# --------------------------
+# JSON
+# --------------------------
+class TruncatedOutput(ValueError):
+    """The model output was cut off (unclosed brackets or string); it is never passed off as whole."""
+
+
+def _scan(text: str, repairs: List[str]) -> Tuple[str, bool]:
+    """
+    One pass over text outside/inside strings: drops comments, converts
+    single-quoted strings, quotes bare keys, maps Python literals and drops
+    trailing commas. Returns (output, True if the text ends cut off: inside
+    a string or with brackets left open).
+    """
+    out: List[str] = []
+    depth = 0
+    cut_string = False
+    done = set()
+    i, n = 0, len(text)
+
+    def note(what: str) -> None:
+        if what not in done:
+            done.add(what)
+            repairs.append(what)
+
+    while i < n:
+        c = text[i]
+        if c in "\"'":
+            j, buf = i + 1, ['"']
+            while j < n and text[j] != c:
+                if text[j] == "\\" and j + 1 < n:
+                    buf.append(text[j:j + 2] if text[j + 1] != "'" else "'")
+                    j += 2
+                    continue
+                buf.append('\\"' if text[j] == '"' else text[j])
+                j += 1
+            if c == "'":
+                note("json: single quotes")
+            cut_string = cut_string or j >= n
+            buf.append('"')
+            out.append("".join(buf))
+            i = j + 1
+            continue
+        if text.startswith("//", i) or text.startswith("/*", i):
+            end = text.find("\n", i) if text[i + 1] == "/" else text.find("*/", i)
+            i = n if end < 0 else end + (0 if text[i + 1] == "/" else 2)
+            note("json: comments")
+            continue
+        if c in "{[":
+            depth += 1
+        elif c in "}]":
+            # trailing comma before the closer
+            k = len(out) - 1
+            while k >= 0 and out[k].isspace():
+                k -= 1
+            if k >= 0 and out[k] == ",":
+                del out[k]
+                note("json: trailing comma")
+            depth -= 1
+        elif c.isalpha() or c == "_":
+            m = _WORD_RE.match(text, i)
+            word = m.group(1)
+            if m.group(2) and depth > 0:
+                out.append(f'"{word}"')
+                note("json: unquoted keys")
+            elif word in _LITERALS:
+                out.append(_LITERALS[word])
+                note("json: Python/JS literals")
+            else:
+                out.append(word)
+            i += len(word)
+            continue
+        out.append(c)
+        i += 1
+    return "".join(out), cut_string or depth > 0
+
+
+def loads(text: str) -> Tuple[Any, List[str]]:
+    """
+    json.loads that repairs common model output faults. Returns (value,
+    repairs); raises TruncatedOutput if the output was cut off (a BOM or
+    invoice missing its last lines must not pass as complete) and
+    ValueError if it is not JSON at all.
+    """
+    repairs: List[str] = []
+    try:
+        return json.loads(text), repairs
+    except (TypeError, ValueError):
+        pass
+    s = str(text or "").strip().lstrip("\ufeff")
+    m = _FENCE_RE.match(s)
+    if m:
+        s = m.group(1).strip()
+        repairs.append("json: code fence")
+    if s[:1] not in ("{", "["):
+        start = min((p for p in (s.find("{"), s.find("[")) if p >= 0), default=-1)
+        if start < 0:
+            raise ValueError("No JSON object in model output")
+        s = s[start:]
+        repairs.append("json: text before the object")
+    if s.translate(_SMART) != s:
+        s = s.translate(_SMART)
+        repairs.append("json: curly quotes")
+    try:
+        return json.loads(s), repairs
+    except ValueError:
+        pass
+    # Text after the object ("... } Hope this helps")
+    try:
+        value, end = json.JSONDecoder().raw_decode(s)
+        repairs.append("json: text after the object")
+        return value, repairs
+    except ValueError:
+        pass
+    scanned, cut_off = _scan(s, repairs)
+    if cut_off:
+        raise TruncatedOutput("Model output was cut off")
+    try:
+        return json.loads(scanned), repairs
+    except ValueError:
+        raise ValueError("Model output is not repairable JSON") from None
+
+
+# --------------------------
+# Keys and units
+# --------------------------
+def _distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein (optimal string alignment) distance, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _deletes(word: str, depth: int) -> set:
+    out, frontier = {word}, {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+class EditIndex:
+    """
+    Symmetric-delete index over a fixed vocabulary: every word's deletions up
+    to max_distance are precomputed, so a lookup only verifies the few words
+    that share a deletion with the query instead of scanning the vocabulary.
+    """
+
+    def __init__(self, words: Iterable[str], max_distance: int = 2):
+        self.max_distance = max_distance
+        self.words = tuple(dict.fromkeys(words))
+        self._index: Dict[str, List[str]] = {}
+        for w in self.words:
+            for d in _deletes(w, max_distance):
+                self._index.setdefault(d, []).append(w)
+
+    def lookup(self, query: str, max_distance: Optional[int] = None) -> Optional[Tuple[str, int]]:
+        """(word, distance) of the single closest word within max_distance; None if none or a tie."""
+        limit = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        seen, best, tie = set(), None, False
+        for d in _deletes(query, limit):
+            for w in self._index.get(d, ()):
+                if w in seen:
+                    continue
+                seen.add(w)
+                dist = _distance(query, w, limit)
+                if dist > limit:
+                    continue
+                if best is None or dist < best[1]:
+                    best, tie = (w, dist), False
+                elif dist == best[1]:
+                    tie = True
+        return None if best is None or tie else best
+
+
+def _norm_key(k: str) -> str:
+    k = k.strip().lower().replace("³", "3").replace("/", "_").replace("-", "_").replace(" ", "_").replace(".", "_")
+    return re.sub(r"_+", "_", k).strip("_")
+
+
+_KEY_BY_NORM = {_norm_key(k): k for k in KEYS}
+_KEY_INDEX = EditIndex(_KEY_BY_NORM, max_distance=2)
+_KEYS_BY_TOKENS: Dict[int, List[Tuple[str, List[str]]]] = {}
+for _n, _k in _KEY_BY_NORM.items():
+    _KEYS_BY_TOKENS.setdefault(_n.count("_") + 1, []).append((_k, _n.split("_")))
+
+
+def _token_fits(got: str, want: str) -> bool:
+    """"corrugated" for "corr", "bags" for "bag", "guage" for "gauge"; numbers must match exactly."""
+    if got == want:
+        return True
+    if got.isdigit() or want.isdigit():
+        return False
+    short, long_ = sorted((got, want), key=len)
+    if len(short) >= 3 and long_.startswith(short):
+        return True
+    return len(short) >= 4 and _distance(got, want, 1) <= 1
+
+
+def _numbers(s: str) -> List[str]:
+    return re.findall(r"\d+", s)
+
+
+def match_key(key: Any) -> Optional[str]:
+    """
+    The registry key a near-miss key means, or None if none (or more than one)
+    fits. Sizes must match exactly: lumber_2x10_m or mesh_A193_sheet are not
+    in the registry and must not become lumber_1x10_m or mesh_A142_sheet.
+    """
+    if not isinstance(key, str) or not key.strip():
+        return None
+    norm = _norm_key(key)
+    if norm in _KEY_BY_NORM:
+        return _KEY_BY_NORM[norm]
+    numbers = _numbers(norm)
+    hit = _KEY_INDEX.lookup(norm, max_distance=1 if len(norm) < 8 else 2)
+    if hit is not None and _numbers(hit[0]) == numbers:
+        return _KEY_BY_NORM[hit[0]]
+    tokens = norm.split("_")
+    fits = [k for k, want in _KEYS_BY_TOKENS.get(len(tokens), ())
+            if _numbers("_".join(want)) == numbers and all(_token_fits(g, w) for g, w in zip(tokens, want))]
+    if len(fits) == 1:
+        return fits[0]
+    # Unit suffix left off ("sharp_sand", "tie_wire")
+    fits = [k for n, k in _KEY_BY_NORM.items() if n.startswith(norm + "_") and n.count("_") == norm.count("_") + 1]
+    return fits[0] if len(fits) == 1 else None
+
+
+# Unit spellings the models use that materials.UNIT_ALIASES does not list
+_UNIT_EXTRA = {
+    **{u: "m3" for u in ("cum", "cu m", "cu. m", "cu.m", "cubic m", "cbm", "m 3", "cu mtr")},
+    **{u: "m" for u in ("mtr", "mtrs", "lm", "lin m", "linear m", "linear meter", "linear meters", "metre run")},
+    **{u: "pcs" for u in ("pc", "pce", "nos", "no", "no.", "ea", "each", "unit", "units", "blocks", "lengths")},
+    **{u: "lb" for u in ("lbs", "lb.", "lbs.")},
+    **{u: "kg" for u in ("kg.", "kilo", "kilos")},
+    **{u: "bag" for u in ("bg", "bgs", "sack", "sacks")},
+    **{u: "sheet" for u in ("sht", "shts")},
+    **{u: "gal" for u in ("gals", "gal.")},
+}
+_STAFF_UNIT_EXTRA = {u: "yd3" for u in ("cu yd", "cu yds", "cu. yd", "cuyd", "cubic yd", "cubic yds", "yd 3", "yds3")}
+# Units materials.to_canonical converts from, besides BOM_UNITS
+_CONVERTIBLE = ("ft", "yd", "in", "ft3", "yd3", "l")
+_UNIT_BY_SPELLING = {**{u: u for u in BOM_UNITS | set(_CONVERTIBLE)}, **UNIT_ALIASES, **_UNIT_EXTRA}
+_STAFF_UNIT_BY_SPELLING = {**_UNIT_BY_SPELLING, **STAFF_UNIT_ALIASES, **_STAFF_UNIT_EXTRA}
+_UNIT_INDEX = EditIndex([u for u in _STAFF_UNIT_BY_SPELLING if len(u) >= 5], max_distance=1)
+
+
+def match_unit(unit: Any, staff: bool = False) -> Optional[str]:
+    """The unit token a near-miss spelling means ("cu m" -> "m3"), or None."""
+    if not isinstance(unit, str):
+        return None
+    table = _STAFF_UNIT_BY_SPELLING if staff else _UNIT_BY_SPELLING
+    u = re.sub(r"\s+", " ", unit.strip().lower())
+    for form in (u, u.rstrip("."), u.replace(" ", ""), u.replace(".", "")):
+        if form in table:
+            return table[form]
+    if len(u) >= 5:
+        hit = _UNIT_INDEX.lookup(u)
+        if hit is not None and hit[0] in table:
+            return table[hit[0]]
+    return None
+
+
+class RepairReport:
+    """Counts of repaired (and unrepairable) model outputs by kind and function, plus the last few, for /health."""
+
+    def __init__(self, keep: int = 20):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.repaired_calls = 0
+        self.unrepairable = 0
+        self.truncated = 0
+        self.by_kind: Counter = Counter()
+        self.by_op: Counter = Counter()
+        self.recent: deque = deque(maxlen=keep)
+
+    def record(self, op: str, repairs: List[str], ok: bool = True, truncated: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            if not ok:
+                self.unrepairable += 1
+                self.truncated += int(truncated)
+                self.by_op[op] += 1
+                return
+            if not repairs:
+                return
+            self.repaired_calls += 1
+            self.by_op[op] += 1
+            for r in repairs:
+                self.by_kind[r.split(":", 1)[0]] += 1
+            self.recent.append({"op": op, "repairs": list(repairs)})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "repaired_calls": self.repaired_calls, "unrepairable": self.unrepairable,
+                    "truncated": self.truncated,
+                    "by_kind": dict(self.by_kind),
+                    "by_function": dict(self.by_op), "recent": list(self.recent)}
+
+
+REPORT = RepairReport()
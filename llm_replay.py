@@ -0,0 +1,120 @@
+# llm_replay.py
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+MODES = ("record", "replay", "auto")
+
+# Request fields that do not change the answer; left out of the fixture key
+_VOLATILE = ("stream_options", "user", "metadata")
+
+
+class FixtureMissing(httpx.TransportError):
+    """Replay mode and no fixture recorded for this request."""
+
+
+def request_key(request: httpx.Request) -> str:
+    """Stable hash of a model request: method, path and canonical JSON body."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        body = request.content.decode("utf-8", "replace")
+    if isinstance(body, dict):
+        body = {k: v for k, v in body.items() if k not in _VOLATILE}
+    canon = json.dumps([request.method, request.url.path, body], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """
+    Wraps the OpenAI client's transport to capture and replay responses.
+    - record: forward every request and save the response to fixtures_dir
+    - replay: answer only from fixtures; a miss raises FixtureMissing
+    - auto:   replay when a fixture exists, otherwise forward and record
+    Fixtures are one JSON file per request key holding the status, content
+    type and body (streams are stored as their raw SSE text).
+    """
+
+    def __init__(self, inner: httpx.BaseTransport, mode: str, fixtures_dir: str):
+        if mode not in MODES:
+            raise ValueError(f"LLM_REPLAY must be one of {MODES}, not {mode!r}")
+        self.inner = inner
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        os.makedirs(fixtures_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.fixtures_dir, f"{key}.json")
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+        path = self._path(key)
+        if self.mode != "record" and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                fx = json.load(f)
+            with self._lock:
+                self.hits += 1
+            return httpx.Response(fx["status"], headers={"content-type": fx["content_type"]},
+                                  content=fx["body"].encode("utf-8"), request=request)
+        if self.mode == "replay":
+            with self._lock:
+                self.misses += 1
+            raise FixtureMissing(f"No LLM fixture {key[:12]} for {request.url.path}", request=request)
+
+        response = self.inner.handle_request(request)
+        body = response.read()
+        fx = {
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type", "application/json"),
+            "request": _summary(request),
+            "body": body.decode("utf-8", "replace"),
+        }
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(fx, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+        with self._lock:
+            self.recorded += 1
+        return httpx.Response(response.status_code, headers=response.headers, content=body, request=request)
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"mode": self.mode, "fixtures_dir": self.fixtures_dir,
+                    "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+
+def _summary(request: httpx.Request) -> dict:
+    """Human-readable note of what was asked (image data URLs elided)."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        return {"path": request.url.path}
+    msgs = []
+    for m in body.get("messages") or []:
+        content = m.get("content")
+        if isinstance(content, list):
+            content = " ".join(p.get("text") or "[image]" for p in content)
+        msgs.append(f"{m.get('role')}: {str(content)[:200]}")
+    return {"path": request.url.path, "model": body.get("model"), "messages": msgs}
+
+
+def from_env(inner: httpx.BaseTransport) -> Optional[ReplayTransport]:
+    """LLM_REPLAY=record|replay|auto wraps inner; unset or off returns None."""
+    mode = os.getenv("LLM_REPLAY", "").strip().lower()
+    if not mode or mode in ("0", "off"):
+        return None
+    return ReplayTransport(inner, mode, os.getenv("LLM_FIXTURES_DIR", os.path.join("fixtures", "llm")))
@@ -0,0 +1,246 @@
+# llm_stub.py
+"""
+Local stand-in for the OpenAI chat-completions API, for load tests and
+offline development. Point the app at it with OPENAI_BASE_URL:
+
+    python llm_stub.py --port 8765 --latency-ms 800 --tail-sigma 0.5 --fail-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub flask --app app run
+
+JSON requests (response_format set) get a canned body picked from the system
+prompt: BOM, invoice/purchase or expenses. Plain requests get a short
+narrative. Streaming and usage are supported. --canned DIR overrides the
+bodies with bom.json, invoice.json, expenses.json and/or narrative.txt.
+GET /stats returns request and failure counts.
+"""
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+CANNED: Dict[str, str] = {
+    "bom": json.dumps({
+        "lines": [
+            {"key": "sharp_sand_m3", "qty": 2.4, "unit": "m3"},
+            {"key": "gravel_m3", "qty": 4.8, "unit": "m3"},
+            {"key": "cement_bag", "qty": 18, "unit": "bag"},
+            {"key": "mesh_A142_sheet", "qty": 3, "unit": "sheet"},
+        ],
+        "notes": "Stub estimate.",
+    }),
+    "invoice": json.dumps({
+        "supplier_name": "Stub Supplies Ltd", "invoice_date": "2025-01-15", "invoice_number": "INV-001",
+        "currency": "TTD",
+        "lines": [
+            {"description": "Sharp sand", "unit": "yd3", "qty": 3, "unit_price": 350, "line_total": 1050},
+            {"description": "Cement 42.5kg", "unit": "bag", "qty": 20, "unit_price": 72, "line_total": 1440},
+        ],
+        "tax": 311.25, "total": 2801.25,
+    }),
+    "expenses": json.dumps({
+        "date": "2025-01-15",
+        "expenses": [{"category": "fuel", "description": "Diesel for truck", "amount": 450}],
+    }),
+    "narrative": "- Prepare and level the base.\n- Set out forms and reinforcement.\n"
+                 "- Pour, compact and cure for 7 days.",
+}
+
+
+def _kind(body: dict) -> str:
+    system = " ".join(str(m.get("content")) for m in body.get("messages") or [] if m.get("role") == "system").lower()
+    if "expense" in system:
+        return "expenses"
+    if "invoice" in system or "purchase" in system:
+        return "invoice"
+    return "bom"
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 0.0, tail_sigma: float = 0.0, fail_rate: float = 0.0,
+                 fail_status: int = 500, model_latency_ms: Optional[Dict[str, float]] = None,
+                 fail_models=(), stream_chunk_ms: float = 10.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.tail_sigma = tail_sigma            # lognormal spread; 0 = fixed latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.model_latency_ms = dict(model_latency_ms or {})
+        self.fail_models = set(fail_models)
+        self.stream_chunk_ms = stream_chunk_ms
+        self.canned = dict(CANNED)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+
+    def load_canned(self, directory: str) -> None:
+        for name in ("bom", "invoice", "expenses"):
+            p = os.path.join(directory, f"{name}.json")
+            if os.path.exists(p):
+                with open(p, "r", encoding="utf-8") as f:
+                    self.canned[name] = json.dumps(json.load(f))
+        p = os.path.join(directory, "narrative.txt")
+        if os.path.exists(p):
+            with open(p, "r", encoding="utf-8") as f:
+                self.canned["narrative"] = f.read()
+
+    def draw(self, model: str):
+        """(delay seconds, fail?) for one request."""
+        with self.lock:
+            self.requests += 1
+            base = self.model_latency_ms.get(model, self.latency_ms)
+            delay = base * (self.rng.lognormvariate(0.0, self.tail_sigma) if self.tail_sigma else 1.0)
+            fail = model in self.fail_models or self.rng.random() < self.fail_rate
+            if fail:
+                self.failures += 1
+        return delay / 1000.0, fail
+
+
+def _usage(prompt: str, completion: str) -> dict:
+    p, c = max(1, len(prompt) // 4), max(1, len(completion) // 4)
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: StubConfig = None  # set per server class
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            c = self.config
+            self._send(200, json.dumps({"requests": c.requests, "failures": c.failures}).encode())
+        else:
+            self._send(404, b'{"error":{"message":"not found"}}')
+
+    def do_POST(self):
+        n = int(self.headers.get("content-length") or 0)
+        try:
+            body = json.loads(self.rfile.read(n) or b"{}")
+        except ValueError:
+            self._send(400, b'{"error":{"message":"invalid JSON","type":"invalid_request_error"}}')
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, b'{"error":{"message":"not found"}}')
+            return
+        model = body.get("model") or "stub"
+        delay, fail = self.config.draw(model)
+        time.sleep(delay)
+        if fail:
+            status = self.config.fail_status
+            self._send(status, json.dumps({"error": {"message": "injected failure", "type": "server_error",
+                                                     "code": status}}).encode())
+            return
+
+        json_mode = bool(body.get("response_format"))
+        text = self.config.canned[_kind(body) if json_mode else "narrative"]
+        prompt = json.dumps(body.get("messages") or [])
+        usage = _usage(prompt, text)
+        if body.get("stream"):
+            self._stream(model, text, usage if (body.get("stream_options") or {}).get("include_usage") else None)
+            return
+        self._send(200, json.dumps({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            "usage": usage,
+        }).encode())
+
+    def _stream(self, model: str, text: str, usage: Optional[dict]) -> None:
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+
+        def write(payload: str) -> None:
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        words = text.split(" ")
+        for i, w in enumerate(words):
+            delta = w if i == len(words) - 1 else w + " "
+            write(json.dumps({"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0,
+                              "model": model, "choices": [{"index": 0, "delta": {"content": delta},
+                                                           "finish_reason": None}]}))
+            time.sleep(self.config.stream_chunk_ms / 1000.0)
+        if usage is not None:
+            write(json.dumps({"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0,
+                              "model": model, "choices": [], "usage": usage}))
+        write("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class StubServer:
+    """The stub on a background thread: StubServer(config).start() -> base URL."""
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StubConfig()
+        handler = type("Handler", (_Handler,), {"config": self.config})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="llm-stub", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _model_ms(items) -> Dict[str, float]:
+    out = {}
+    for it in items or ():
+        name, _, ms = it.partition("=")
+        out[name] = float(ms)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local OpenAI chat-completions stub")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="median latency per request")
+    ap.add_argument("--tail-sigma", type=float, default=0.0, help="lognormal spread (0.5 gives a long tail)")
+    ap.add_argument("--model-latency", action="append", metavar="MODEL=MS", help="per-model median latency")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests that fail")
+    ap.add_argument("--fail-status", type=int, default=500)
+    ap.add_argument("--fail-model", action="append", default=[], help="always fail this model")
+    ap.add_argument("--canned", help="directory with bom.json / invoice.json / expenses.json / narrative.txt")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args()
+
+    config = StubConfig(args.latency_ms, args.tail_sigma, args.fail_rate, args.fail_status,
+                        _model_ms(args.model_latency), args.fail_model, seed=args.seed)
+    if args.canned:
+        config.load_canned(args.canned)
+    server = StubServer(config, args.host, args.port)
+    print(f"LLM stub on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 # loaders.py
 import csv, re, os
+from functools import lru_cache
 from pathlib import Path
 
 FT_TO_M = 0.3048
@@ -14,17 +15,88 @@ KG_PER_M = {
 
 # ---------- helpers ----------
 
-def to_float(x):
-    """Parse prices like '1,090.00', '$350', 'TTD 95' or simple formulas '390*1.308'."""
-    s = str(x)
-    s = s.replace(",", "").replace("$", "").replace("TTD", "").strip()
+_price_token_re = re.compile(r"\s*(?:(\d+(?:\.\d*)?|\.\d+)|([-+*/()]))")
+_price_num_re = re.compile(r"[\d\.]+")
+
+def eval_price_expr(s):
+    """
+    Evaluate a price formula such as '390*1.308' or '(120+15)/2' without eval().
+    Only decimal numbers, + - * / and parentheses are accepted; anything else
+    raises ValueError (ZeroDivisionError for x/0).
+    """
+    tokens = []
+    pos, n = 0, len(s)
+    while pos < n:
+        m = _price_token_re.match(s, pos)
+        if not m:
+            if s[pos:].strip():
+                raise ValueError(f"bad price expression: {s!r}")
+            break
+        tokens.append(float(m.group(1)) if m.group(1) else m.group(2))
+        pos = m.end()
+    if not tokens:
+        raise ValueError("empty price expression")
+    i = 0
+
+    def peek():
+        return tokens[i] if i < len(tokens) else None
+
+    def take():
+        nonlocal i
+        tok = peek()
+        i += 1
+        return tok
+
+    def expr():
+        v = term()
+        while peek() in ("+", "-"):
+            v = v + term() if take() == "+" else v - term()
+        return v
+
+    def term():
+        v = unary()
+        while peek() in ("*", "/"):
+            v = v * unary() if take() == "*" else v / unary()
+        return v
+
+    def unary():
+        if peek() in ("+", "-"):
+            return unary() if take() == "+" else -unary()
+        tok = take()
+        if tok == "(":
+            v = expr()
+            if take() != ")":
+                raise ValueError(f"unbalanced parentheses: {s!r}")
+            return v
+        if isinstance(tok, float):
+            return tok
+        raise ValueError(f"bad price expression: {s!r}")
+
+    value = expr()
+    if i < len(tokens):
+        raise ValueError(f"bad price expression: {s!r}")
+    return value
+
+@lru_cache(maxsize=65536)
+def _parse_price(text):
+    # price lists repeat the same cells heavily, so results are memoized on the raw text
+    s = text.replace(",", "").replace("$", "").replace("TTD", "").strip()
+    if any(ch in s for ch in "/*+-()"):
+        try:
+            return eval_price_expr(s)
+        except (ValueError, ZeroDivisionError):
+            pass
+    m = _price_num_re.findall(s)
+    if not m:
+        return None
     try:
-        if any(ch in s for ch in "/*+-") and re.match(r"^[\d\.\s/*+-]+$", s):
-            return float(eval(s))
-    except Exception:
-        pass
-    m = re.findall(r"[\d\.]+", s)
-    return float(m[-1]) if m else None
+        return float(m[-1])
+    except ValueError:  # e.g. '1.2.3'
+        return None
+
+def to_float(x):
+    """Parse prices like '1,090.00', '$350', 'TTD 95' or simple formulas '390*1.308' (no eval)."""
+    return _parse_price(str(x))
 
 _key_norm_re = re.compile(r"[^a-z0-9]+")
 
@@ -32,28 +104,53 @@ def norm_key(k: str) -> str:
     """lowercase and strip non-alphanum (so 'Item Name' -> 'itemname', 'Selling' -> 'selling')."""
     return _key_norm_re.sub("", (k or "").lower())
 
-def read_csv_rows(path):
+def iter_csv(path, columns):
     """
-    Read rows AND return each row with normalized keys added.
-    For example {'Item Name': 'x', 'Selling': '10'} becomes accessible via
-    row['itemname'] and row['selling'].
+    Stream a CSV as tuples holding only the requested columns, one value per entry
+    in `columns`. Each entry is a tuple of header aliases compared after norm_key(),
+    tried in order; the first non-empty value wins, else "".
+    For example columns=(("name", "itemname"), ("price", "selling")) reads both
+    'name,price' and 'Item Name,Selling' files. Nothing is kept once a row is yielded.
     """
     p = Path(path)
     if not p.exists():
-        return []
-    rows = []
-    with open(p, "r", encoding="utf-8", errors="ignore") as f:
-        rdr = csv.DictReader(f)
-        orig_fields = list(rdr.fieldnames or [])
-        norm_fields = [norm_key(c) for c in orig_fields]
+        return
+    with open(p, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        rdr = csv.reader(f)
+        header = next(rdr, None) or []
+        # normalize the header once; a later duplicate header wins, as with a dict
+        index = {norm_key(c): i for i, c in enumerate(header)}
+        slots = [[index[a] for a in aliases if a in index] for aliases in columns]
         for raw in rdr:
-            # build normalized dict
-            row = {}
-            for orig, norm in zip(orig_fields, norm_fields):
-                row[orig] = (raw.get(orig) or "").strip()
-                row[norm] = row[orig]  # duplicate under normalized key
-            rows.append(row)
-    return rows
+            if not raw:
+                continue
+            n = len(raw)
+            rec = []
+            for idxs in slots:
+                v = ""
+                for i in idxs:
+                    if i < n:
+                        v = raw[i].strip()
+                        if v: break
+                rec.append(v)
+            yield tuple(rec)
+
+# Precompiled feature patterns (compiled once at import, not per row)
+# Meters and feet share one scan; a meters hit anywhere still wins over feet.
+_LENGTH_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:(M|METERS|METRES)|(FT|FEET|FOOT))\b")
+_IMPLICIT_FT_RE = re.compile(r"x\s*(\d+(\.\d+)?)\b(?!\s*(MM|CM|M))")
+# Fraction and metric sizes cannot overlap, so one findall sees every size mentioned
+_STEEL_SIZE_RE = re.compile(r"\b(3/8|1/2|5/8|3/4)\b|(10|12|16|20)MM")
+_STEEL_SIZE_ORDER = ("3/8", "1/2", "5/8", "3/4")  # first listed wins, as before
+_MM_TO_SIZE = {"10": "3/8", "12": "1/2", "16": "5/8", "20": "3/4"}
+_GRADE_CORR_RE = re.compile(r"CORR|DEFORM|RIB|TENS")
+_GRADE_MILD_RE = re.compile(r"MILD|SMOOTH|\bMS\b")
+_BLOCK_SIZE_RE = re.compile(r'(?<!\S)([468])\s*"?\b')
+# Dimensional lumber 'T X W X L' (inches x inches x feet), e.g. 'Lumber 2X4X12` R.P.P'
+_LUMBER_DIMS_RE = re.compile(r"(\d+)\s*X\s*(\d+)\s*X\s*(\d+)")
+_FRACTION_RE = re.compile(r"\b(\d+/\d+)")
+_LUMBER_WORD_RE = re.compile(r"[A-Z.]+")
+_LUMBER_SPECIES = ("DPP", "RPP", "WP", "RT")  # dressed/rough pitch pine, white pine, RT
 
 def parse_length(text):
     """
@@ -61,14 +158,15 @@ def parse_length(text):
     Returns (value, unit) where unit is 'ft' or 'm'.
     """
     up = text.upper().replace("×", "X")
-    # explicit meters
-    m = re.search(r"(\d+(\.\d+)?)\s*(M|METERS|METRES)\b", up)
-    if m: return float(m.group(1)), "m"
-    # explicit feet
-    m = re.search(r"(\d+(\.\d+)?)\s*(FT|FEET|FOOT)\b", up)
-    if m: return float(m.group(1)), "ft"
+    feet = None
+    for m in _LENGTH_RE.finditer(up):
+        # explicit meters
+        if m.group(2): return float(m.group(1)), "m"
+        # explicit feet (only used if no meters anywhere)
+        if feet is None: feet = float(m.group(1))
+    if feet is not None: return feet, "ft"
     # implicit last 'xNN' => feet (e.g., 2x4x20 -> 20 ft)
-    m = re.search(r"x\s*(\d+(\.\d+)?)\b(?!\s*(MM|CM|M))", up)
+    m = _IMPLICIT_FT_RE.search(up)
     if m:
         val = float(m.group(1))
         if 5 <= val <= 40:
@@ -77,22 +175,19 @@ def parse_length(text):
 
 def steel_size_from_text(text):
     """Identify rebar diameter from text."""
-    up = text.upper().replace(" ", "")
-    pats = {
-        "3/8": r"\b3/8\b|10MM",
-        "1/2": r"\b1/2\b|12MM",
-        "5/8": r"\b5/8\b|16MM",
-        "3/4": r"\b3/4\b|20MM",  # optional
-    }
-    for size, pat in pats.items():
-        if re.search(pat, up):
+    found = _STEEL_SIZE_RE.findall(text.upper().replace(" ", ""))
+    if not found:
+        return None
+    sizes = {frac or _MM_TO_SIZE[mm] for frac, mm in found}
+    for size in _STEEL_SIZE_ORDER:
+        if size in sizes:
             return size
     return None
 
 def steel_grade_from_text(text):
     up = text.upper()
-    if re.search(r"CORR|DEFORM|RIB|TENS", up): return "corrugated"
-    if re.search(r"MILD|SMOOTH|\bMS\b", up):   return "mild"
+    if _GRADE_CORR_RE.search(up): return "corrugated"
+    if _GRADE_MILD_RE.search(up): return "mild"
     return "corrugated"
 
 def per_meter(price, length_value, length_unit, size_in, name_up):
@@ -108,19 +203,127 @@ def per_meter(price, length_value, length_unit, size_in, name_up):
     # default: assume 19 ft stick price
     return price / DEFAULT_19FT_M
 
+# ---------- row classification ----------
+
+# Declarative rules for building materials, tried in order; first match wins.
+# Each rule is (name, all_of, any_of, none_of) over the upper-cased item name.
+# An empty any_of always passes. Adding a product family is one new row here.
+BUILDING_RULES = (
+    ("cement",          ("CEMENT",),       (),                           ("BOARD", "ADHESIVE", "THINSET", "CONTACT")),
+    ("block",           ("BLOCK",),        (),                           ()),
+    ("mesh_A142_sheet", ("MESH", "A142"),  (),                           ()),
+    ("tie_wire_kg",     (),                ("TIE WIRE", "BINDING WIRE"), ()),
+    ("purlin",          ("PURLIN",),       (),                           ()),
+    ("paint_gal",       ("GAL",),          ("PAINT", "EMULSION"),        ()),
+)
+
+# Cement grades, same shape; the last rule is the catch-all.
+CEMENT_RULES = (
+    ("cement_bag_premium", (), ("PREMIUM",),             ()),
+    ("cement_bag_eco",     (), ("ECO",),                 ()),
+    ("cement_loose_lb",    (), ("LOOSE", " PER LB", "LB"), ()),
+    ("cement_bag",         (), (),                       ()),
+)
+
+# Lumber-yard rules, same shape as BUILDING_RULES.
+LUMBER_RULES = (
+    ("board",        ("LUMBER",),          (), ()),
+    ("plywood",      ("PLY",),             (), ()),
+    ("cement_board", ("CEMENT", "BOARD"),  (), ()),
+)
+
+def first_rule(up, rules):
+    """Return the name of the first rule matching the upper-cased text, else None."""
+    for name, all_of, any_of, none_of in rules:
+        for t in all_of:
+            if t not in up: break
+        else:
+            if any_of:
+                for t in any_of:
+                    if t in up: break
+                else:
+                    continue
+            for t in none_of:
+                if t in up: break
+            else:
+                return name
+    return None
+
+def block_size_from_text(up):
+    """'4'/'6'/'8' for block names like '6" BLOCK' or '6X8X16'; the largest size wins."""
+    sizes = _BLOCK_SIZE_RE.findall(up)
+    for size in ("8", "6", "4"):
+        if size in sizes or f"{size}X8X16" in up:
+            return size
+    return None
+
+def purlin_kind(up):
+    padded = f" {up} "
+    if " Z " in padded: return "purlin_z_m"
+    if " C " in padded: return "purlin_c_m"
+    return None
+
+def _length_per_m(price, lv, lu):
+    """Price per meter for a piece of length lv (m/ft); unchanged if length is unknown."""
+    if lv and lu:
+        if lu.lower().startswith("m"): return price / lv
+        if lu.lower().startswith("f"): return price / (lv * FT_TO_M)
+    return price
+
+def _length_value(lv):
+    try:
+        return float(lv) if lv not in (None, "") else None
+    except Exception:
+        return None
+
+def _keep_min(prices, key, value, offers=None, src=None):
+    """Keep the lowest value per key; also record the offer if an OfferIndex is given.
+    src is (name, unit_price, supplier, source, row) for the current CSV row."""
+    cur = prices.get(key)
+    if cur is None or value < cur:
+        prices[key] = value
+    if offers is not None:
+        name, unit_price, supplier, source, row = src
+        offers.add(key, value, unit_price=unit_price, supplier=supplier, name=name, source=source, row=row)
+
+def cement_preference(prices):
+    """Override for cement_bag implied by CEMENT_GRADE (eco/premium/loose), or {}."""
+    grade = (os.getenv("CEMENT_GRADE") or "").strip().lower()
+    if grade == "eco" and "cement_bag_eco" in prices:
+        return {"cement_bag": prices["cement_bag_eco"]}
+    if grade == "premium" and "cement_bag_premium" in prices:
+        return {"cement_bag": prices["cement_bag_premium"]}
+    if grade == "loose" and "cement_loose_lb" in prices:
+        bag_lbs = 42.5 * 2.20462
+        return {"cement_bag": round(bag_lbs * float(prices["cement_loose_lb"]), 2)}
+    return {}
+
 # ---------- loaders ----------
 
-def load_aggregates(path):
+# Column projections for iter_csv (aliases are norm_key() forms of accepted headers)
+_NAME = ("name", "item", "itemname")
+_PRICE = ("price", "selling")
+_SUPPLIER = ("supplier", "vendor")  # optional; offers default to the file name
+AGGREGATE_COLUMNS = (("key",), _PRICE, _SUPPLIER)
+ITEM_COLUMNS = (_NAME, _PRICE, _SUPPLIER)
+STEEL_COLUMNS = (_NAME, _PRICE, _SUPPLIER, ("lengthvalue",), ("lengthunit",), ("sizein",), ("grade",))
+
+# Every loader takes an optional offers=OfferIndex (see offers.py) that records each
+# priced row, not only the cheapest one per key.
+
+def load_aggregates(path, offers=None):
     """CSV with: key,price (per m^3)."""
     out = {}
-    for r in read_csv_rows(path):
-        k = (r.get("key") or r.get("Key") or r.get("KEY") or r.get("key") or "").strip()
-        v = to_float(r.get("price") or r.get("Price") or r.get("PRICE") or r.get("price") or r.get("selling"))
+    source = Path(path).stem
+    for row, (k, raw_price, supplier) in enumerate(iter_csv(path, AGGREGATE_COLUMNS), 1):
+        v = to_float(raw_price)
         if k and v is not None:
             out[k] = v
+            if offers is not None:
+                offers.add(k, v, supplier=supplier, name=k, source=source, row=row)
     return out
 
-def load_steel(path):
+def load_steel(path, offers=None):
     """
     Flexible steel loader for your CSV.
     Accepts headers like 'name,price' OR 'Item Name,Selling' (case/space insensitive).
@@ -130,34 +333,25 @@ def load_steel(path):
     """
     prices = {}
     rows = []
-    for r in read_csv_rows(path):
-        # pull using normalized keys as well
-        name = r.get("name") or r.get("Name") or r.get("ITEM") or r.get("Item Name") or r.get("itemname") or ""
-        price = to_float(
-            r.get("price") or r.get("Price") or r.get("SELLING") or r.get("Selling") or r.get("selling")
-        )
+    source = Path(path).stem
+    for row, (name, raw_price, supplier, raw_lv, lu, size_col, grade_col) in enumerate(iter_csv(path, STEEL_COLUMNS), 1):
+        price = to_float(raw_price)
         if not name or price is None:
             continue
         up = name.upper()
+        src = (name, price, supplier, source, row) if offers is not None else None
+
+        lv = _length_value(raw_lv)
+        if not lv or not lu:
+            lv2, lu2 = parse_length(up)
+            lv, lu = lv or lv2, lu or lu2
 
         # --- PURLINS (Z/C) ---
         if "PURLIN" in up:
-            lv = r.get("length_value"); lu = r.get("length_unit")
-            try:
-                lv = float(lv) if lv not in (None, "") else None
-            except Exception:
-                lv = None
-            if not lv or not lu:
-                lv2, lu2 = parse_length(up)
-                lv, lu = lv or lv2, lu or lu2
-            per_m = price
-            if lv and lu:
-                if lu.lower().startswith("m"): per_m = price / lv
-                elif lu.lower().startswith("f"): per_m = price / (lv * FT_TO_M)
-            kind = "purlin_z_m" if (" Z " in f" {up} " or up.startswith("Z ")) else (
-                   "purlin_c_m" if (" C " in f" {up} " or up.startswith("C ")) else None)
+            per_m = _length_per_m(price, lv, lu)
+            kind = purlin_kind(up)
             if kind:
-                prices[kind] = min(prices.get(kind, 1e18), per_m)
+                _keep_min(prices, kind, per_m, offers, src)
             rows.append({
                 "name": name, "kind": "purlin",
                 "length_value": lv or "", "length_unit": lu or "",
@@ -166,17 +360,8 @@ def load_steel(path):
             continue
 
         # --- REBAR (corrugated/mild) ---
-        size_in = r.get("size_in") or steel_size_from_text(up)
-        grade = (r.get("grade") or steel_grade_from_text(up)).lower()
-
-        lv = r.get("length_value"); lu = r.get("length_unit")
-        try:
-            lv = float(lv) if lv not in (None, "") else None
-        except Exception:
-            lv = None
-        if not lv or not lu:
-            lv2, lu2 = parse_length(up)
-            lv, lu = lv or lv2, lu or lu2
+        size_in = size_col or steel_size_from_text(up)
+        grade = (grade_col or steel_grade_from_text(up)).lower()
         # default for rebar
         if not lv or not lu:
             lv, lu = 19.0, "ft"
@@ -184,7 +369,7 @@ def load_steel(path):
         per_m = per_meter(price, lv, lu, size_in, up)
         if size_in:
             key = f"rebar_{'corr' if grade.startswith('corr') else 'mild'}_{size_in.replace('/','_')}_m"
-            prices[key] = min(prices.get(key, 1e18), per_m)
+            _keep_min(prices, key, per_m, offers, src)
         rows.append({
             "name": name, "kind": "rebar",
             "size_in": size_in or "", "grade": grade,
@@ -194,9 +379,9 @@ def load_steel(path):
 
     return prices, rows
 
-def load_building(path):
+def load_building(path, offers=None):
     """
-    General building materials mapped to app keys:
+    General building materials mapped to app keys (see BUILDING_RULES):
     - Cement (Eco/Premium/Loose lb) -> cement_bag(_eco/_premium) / cement_loose_lb (converted to bag if CEMENT_GRADE=loose)
     - Blocks (4/6/8 in, optional clay) -> block_4in/block_6in/block_8in/block_clay_4in
     - Mesh A142 -> mesh_A142_sheet
@@ -206,79 +391,138 @@ def load_building(path):
     """
     prices = {}
     purlins, blocks, cement = [], [], []
-    for r in read_csv_rows(path):
-        name = r.get("name") or r.get("Name") or r.get("ITEM") or r.get("Item") or r.get("Item Name") or r.get("itemname") or ""
-        price = to_float(r.get("price") or r.get("Price") or r.get("SELLING") or r.get("Selling") or r.get("selling"))
+    source = Path(path).stem
+    for row, (name, raw_price, supplier) in enumerate(iter_csv(path, ITEM_COLUMNS), 1):
+        price = to_float(raw_price)
         if not name or price is None: 
             continue
         up = name.upper()
+        src = (name, price, supplier, source, row) if offers is not None else None
 
-        # cement
-        if "CEMENT" in up and not any(w in up for w in ["BOARD","ADHESIVE","THINSET","CONTACT"]):
-            if "PREMIUM" in up: prices["cement_bag_premium"] = min(prices.get("cement_bag_premium", 1e18), price)
-            elif "ECO" in up:  prices["cement_bag_eco"]     = min(prices.get("cement_bag_eco", 1e18), price)
-            elif "LOOSE" in up or " PER LB" in up or "LB" in up:
-                prices["cement_loose_lb"] = min(prices.get("cement_loose_lb", 1e18), price)
-            else:
-                prices["cement_bag"] = min(prices.get("cement_bag", 1e18), price)
-            cement.append({"name": name, "price": price})
+        rule = first_rule(up, BUILDING_RULES)
+        if rule is None:
             continue
 
-        # blocks
-        if "BLOCK" in up:
-            size=None
-            if re.search(r'(^|\s)4\s*"?\b', up) or "4X8X16" in up: size="4"
-            if re.search(r'(^|\s)6\s*"?\b', up) or "6X8X16" in up: size="6"
-            if re.search(r'(^|\s)8\s*"?\b', up) or "8X8X16" in up: size="8"
+        if rule == "cement":
+            _keep_min(prices, first_rule(up, CEMENT_RULES), price, offers, src)
+            cement.append({"name": name, "price": price})
+
+        elif rule == "block":
+            size = block_size_from_text(up)
             clay = ("CLAY" in up) or ("RED" in up)
             if size:
                 key = "block_clay_4in" if (clay and size=="4") else (f"block_{size}in" if not clay else None)
                 if key:
-                    prices[key] = min(prices.get(key, 1e18), price)
+                    _keep_min(prices, key, price, offers, src)
                     blocks.append({"name":name,"size_in":size,"type":"clay" if clay else "concrete","unit":"piece","price":price})
-            continue
-
-        # mesh
-        if "MESH" in up and "A142" in up:
-            prices["mesh_A142_sheet"] = min(prices.get("mesh_A142_sheet", 1e18), price)
-            continue
-
-        # tie wire
-        if "TIE WIRE" in up or "BINDING WIRE" in up:
-            prices["tie_wire_kg"] = min(prices.get("tie_wire_kg", 1e18), price)
-            continue
 
-        # purlins
-        if "PURLIN" in up:
+        elif rule == "purlin":
             lv, lu = parse_length(up)
-            per_m = price
-            if lv and lu:
-                if lu.lower().startswith("m"): per_m = price / lv
-                elif lu.lower().startswith("f"): per_m = price / (lv * FT_TO_M)
-            kind = "purlin_z_m" if (" Z " in f" {up} " or up.startswith("Z ")) else (
-                   "purlin_c_m" if (" C " in f" {up} " or up.startswith("C ")) else None)
+            per_m = _length_per_m(price, lv, lu)
+            kind = purlin_kind(up)
             if kind:
-                prices[kind] = min(prices.get(kind, 1e18), per_m)
+                _keep_min(prices, kind, per_m, offers, src)
                 purlins.append({"kind":kind, "name":name, "price_per_m": per_m})
-            continue
 
-        # paint (optional)
-        if ("PAINT" in up or "EMULSION" in up) and "GAL" in up:
-            prices["paint_gal"] = min(prices.get("paint_gal", 1e18), price)
-            continue
+        else:
+            # single-key rules: mesh_A142_sheet, tie_wire_kg, paint_gal
+            _keep_min(prices, rule, price, offers, src)
 
     # cement default preference
-    grade = (os.getenv("CEMENT_GRADE") or "").strip().lower()
-    if grade == "eco" and "cement_bag_eco" in prices:
-        prices["cement_bag"] = prices["cement_bag_eco"]
-    elif grade == "premium" and "cement_bag_premium" in prices:
-        prices["cement_bag"] = prices["cement_bag_premium"]
-    elif grade == "loose" and "cement_loose_lb" in prices:
-        bag_lbs = 42.5 * 2.20462
-        prices["cement_bag"] = round(bag_lbs * float(prices["cement_loose_lb"]), 2)
+    prices.update(cement_preference(prices))
 
     return prices, {"purlins": purlins, "blocks": blocks, "cement": cement}
 
+def load_lumber(path, offers=None):
+    """
+    Lumber and sheet goods mapped to app keys:
+    - Dimensional lumber ('Lumber 2X4X12` R.P.P') -> lumber_2x4_m etc. (cheapest per-meter
+      across species and lengths); every board also gets price_per_m and price_per_bf
+    - Plywood (construction/plain/groove) by thickness -> plywood_1_2_sheet etc. (per sheet)
+    - Cement board by thickness -> cement_board_1_2_sheet etc. (per sheet)
+    meta["index"][section][species][length_ft] holds each board, so framing/formwork
+    lines resolve with dict lookups instead of text scans.
+    """
+    prices = {}
+    boards, sheets = [], []
+    source = Path(path).stem
+    for row, (name, raw_price, supplier) in enumerate(iter_csv(path, ITEM_COLUMNS), 1):
+        price = to_float(raw_price)
+        if not name or price is None or price <= 0:
+            continue
+        up = name.upper()
+        src = (name, price, supplier, source, row) if offers is not None else None
+
+        rule = first_rule(up, LUMBER_RULES)
+        if rule == "board":
+            m = _LUMBER_DIMS_RE.search(up)
+            if not m:
+                continue
+            t, w, length_ft = int(m.group(1)), int(m.group(2)), int(m.group(3))
+            if not length_ft:
+                continue
+            section = f"{t}x{w}"
+            tail = [tok.replace(".", "") for tok in _LUMBER_WORD_RE.findall(up, m.end())]
+            species = next((tok for tok in tail if tok in _LUMBER_SPECIES), "")
+            board = {
+                "name": name, "section": section, "species": species, "length_ft": length_ft,
+                "treated": "TREATED" in tail, "unit_price": price,
+                "price_per_m": price / (length_ft * FT_TO_M),
+                "price_per_bf": price / (t * w * length_ft / 12.0),
+            }
+            boards.append(board)
+            if offers is not None:
+                offers.add(f"lumber_{section}_m", board["price_per_m"], unit_price=price,
+                           supplier=supplier, name=name, source=source, row=row)
+
+        elif rule in ("plywood", "cement_board"):
+            m = _FRACTION_RE.search(up)
+            if not m:
+                continue
+            key = f"{rule}_{m.group(1).replace('/', '_')}_sheet"
+            _keep_min(prices, key, price, offers, src)
+            sheets.append({"name": name, "key": key, "unit": "sheet", "price": price})
+
+    # per-section price keys come straight off the index
+    index = lumber_index(boards)
+    for section, by_species in index.items():
+        for by_len in by_species.values():
+            for board in by_len.values():
+                _keep_min(prices, f"lumber_{section}_m", board["price_per_m"])
+
+    return prices, {"boards": boards, "sheets": sheets, "index": index}
+
+def lumber_index(boards):
+    """index[section][species][length_ft] -> cheapest board of that exact spec."""
+    index = {}
+    for board in boards:
+        by_len = index.setdefault(board["section"], {}).setdefault(board["species"], {})
+        cur = by_len.get(board["length_ft"])
+        if cur is None or board["unit_price"] < cur["unit_price"]:
+            by_len[board["length_ft"]] = board
+    return index
+
+def build_catalog(paths):
+    """
+    Load every price file into one catalog.
+    paths: {"aggregates": ..., "steel": ..., "building": ..., "lumber": ...}
+    Returns (prices, meta) where prices is the cheapest-offer view (plus the
+    CEMENT_GRADE preference) and meta["offers"] is the frozen OfferIndex.
+    """
+    from offers import OfferIndex
+
+    offers = OfferIndex()
+    agg = load_aggregates(paths["aggregates"], offers)
+    _, steel_rows = load_steel(paths["steel"], offers)
+    _, b_meta = load_building(paths["building"], offers)
+    _, l_meta = load_lumber(paths["lumber"], offers)
+    offers.freeze()
+    prices = offers.cheapest()
+    prices.update(cement_preference(prices))
+    meta = {"steel_rows": steel_rows, "building_meta": b_meta, "lumber_meta": l_meta,
+            "aggregates": agg, "offers": offers}
+    return prices, meta
+
 def merge_prices(*dicts):
     """Merge price dicts, keeping the lowest numeric price for duplicate keys."""
     out = {}
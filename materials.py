@@ -0,0 +1,152 @@
+# materials.py
+"""
+Single registry of the material keys BuildAdvisor prices.
+
+Each key has a canonical unit, the input units it accepts (with the factor that
+converts them to the canonical unit), a display name and a category. Keys get
+dense integer ids in registry order. Adding a material is one row in _TABLE.
+"""
+import hashlib
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+# Unit families: every unit in a family converts to the others via these factors
+# (value in the family's base unit). Count units are interchangeable 1:1.
+_LENGTH = {"m": 1.0, "ft": 0.3048, "yd": 0.9144, "in": 0.0254}
+_VOLUME = {"m3": 1.0, "yd3": 0.764554857, "ft3": 0.0283168466}
+_MASS = {"kg": 1.0, "lb": 0.45359237}
+_LIQUID = {"gal": 1.0, "l": 1 / 3.785411784}  # US gallon
+_COUNT = {"pcs": 1.0, "bag": 1.0, "sheet": 1.0}
+
+_FAMILIES = (_LENGTH, _VOLUME, _MASS, _LIQUID, _COUNT)
+
+# (key, canonical unit, category) in the order the models are shown them
+_TABLE: Tuple[Tuple[str, str, str], ...] = (
+    # Aggregates
+    ("sand_m3", "m3", "aggregates"), ("sharp_sand_m3", "m3", "aggregates"),
+    ("gravel_m3", "m3", "aggregates"), ("red_sand_m3", "m3", "aggregates"),
+    ("backfill_m3", "m3", "aggregates"), ("soakaway_boulders_m3", "m3", "aggregates"),
+    # Cement
+    ("cement_bag", "bag", "cement"), ("cement_bag_eco", "bag", "cement"),
+    ("cement_bag_premium", "bag", "cement"), ("cement_loose_lb", "lb", "cement"),
+    # Blocks
+    ("block_4in", "pcs", "blocks"), ("block_6in", "pcs", "blocks"),
+    ("block_8in", "pcs", "blocks"), ("block_clay_4in", "pcs", "blocks"),
+    # Steel (per meter)
+    ("rebar_corr_3_8_m", "m", "steel"), ("rebar_corr_1_2_m", "m", "steel"),
+    ("rebar_corr_5_8_m", "m", "steel"),
+    ("rebar_mild_3_8_m", "m", "steel"), ("rebar_mild_1_2_m", "m", "steel"),
+    ("rebar_mild_5_8_m", "m", "steel"),
+    # Mesh / wire / purlins
+    ("mesh_A142_sheet", "sheet", "steel"), ("tie_wire_kg", "kg", "steel"),
+    ("purlin_z_m", "m", "steel"), ("purlin_c_m", "m", "steel"),
+    # Paint
+    ("paint_gal", "gal", "finishes"),
+    # Lumber (per meter, by section in inches)
+    ("lumber_1x3_m", "m", "lumber"), ("lumber_1x4_m", "m", "lumber"),
+    ("lumber_1x6_m", "m", "lumber"), ("lumber_1x8_m", "m", "lumber"),
+    ("lumber_1x10_m", "m", "lumber"), ("lumber_1x12_m", "m", "lumber"),
+    ("lumber_2x2_m", "m", "lumber"), ("lumber_2x4_m", "m", "lumber"),
+    ("lumber_2x6_m", "m", "lumber"), ("lumber_4x4_m", "m", "lumber"),
+    # Sheet goods (per sheet, by thickness)
+    ("plywood_1_4_sheet", "sheet", "sheet_goods"), ("plywood_3_8_sheet", "sheet", "sheet_goods"),
+    ("plywood_1_2_sheet", "sheet", "sheet_goods"), ("plywood_5_8_sheet", "sheet", "sheet_goods"),
+    ("plywood_3_4_sheet", "sheet", "sheet_goods"),
+    ("cement_board_3_8_sheet", "sheet", "sheet_goods"), ("cement_board_1_2_sheet", "sheet", "sheet_goods"),
+)
+
+# Free-text unit spellings -> unit token
+UNIT_ALIASES: Mapping[str, str] = MappingProxyType({
+    **{u: "m" for u in ("meter", "meters", "metre", "metres")},
+    **{u: "ft" for u in ("foot", "feet")},
+    **{u: "m3" for u in ("m^3", "m³", "cubic meter", "cubic meters", "cubic metre", "cubic metres")},
+    "bags": "bag",
+    "sheets": "sheet",
+    **{u: "pcs" for u in ("pieces", "piece")},
+    **{u: "gal" for u in ("gallon", "gallons")},
+    **{u: "lb" for u in ("pound", "pounds")},
+    **{u: "kg" for u in ("kgs", "kilogram", "kilograms")},
+    **{u: "l" for u in ("litre", "litres", "liter", "liters")},
+})
+
+# Staff purchase/receipt text also says "yards" meaning cubic yards of aggregate
+STAFF_UNIT_ALIASES: Mapping[str, str] = MappingProxyType({
+    **{u: "yd3" for u in ("yd", "yds", "yard", "yards", "yd^3", "yd³", "cubic yard", "cubic yards")},
+})
+
+# Unit tokens models are told to use for BOM lines, and staff purchase units
+BOM_UNITS = frozenset({"m3", "m", "kg", "bag", "sheet", "pcs", "gal", "lb"})
+STAFF_UNITS = BOM_UNITS | {"yd3"}
+
+_SUFFIX_UNITS = (("_m3", "m³"), ("_m", "m"), ("_gal", "gal"), ("_bag", "bag"),
+                 ("_sheet", "sheet"), ("_kg", "kg"))
+
+
+def _display(key: str) -> str:
+    """"rebar_corr_3_8_m" -> "rebar corr 3 8 (m)". Only the suffix is rewritten."""
+    for suffix, label in _SUFFIX_UNITS:
+        if key.endswith(suffix):
+            return key[:-len(suffix)].replace("_", " ") + f" ({label})"
+    return key.replace("_", " ")
+
+
+def _factors(unit: str) -> Mapping[str, float]:
+    """{input unit: multiplier to the canonical unit} for the family unit belongs to."""
+    for fam in _FAMILIES:
+        if unit in fam:
+            base = fam[unit]
+            return MappingProxyType({u: f / base for u, f in fam.items()})
+    return MappingProxyType({unit: 1.0})
+
+
+class Material(NamedTuple):
+    id: int
+    key: str
+    unit: str
+    category: str
+    display: str
+    factors: Mapping[str, float]  # accepted input unit -> factor to `unit`
+
+
+MATERIALS: Mapping[str, Material] = MappingProxyType({
+    key: Material(i, key, unit, category, _display(key), _factors(unit))
+    for i, (key, unit, category) in enumerate(_TABLE)
+})
+
+KEYS: Tuple[str, ...] = tuple(MATERIALS)              # id -> key
+KEY_IDS: Mapping[str, int] = MappingProxyType({k: m.id for k, m in MATERIALS.items()})
+ALLOWED_KEYS = frozenset(KEYS)
+# Changes whenever a key, unit or category is added/edited; cache keys include it
+REGISTRY_VERSION = hashlib.sha256(repr(_TABLE).encode("utf-8")).hexdigest()[:12]
+DISPLAY_NAMES: Tuple[str, ...] = tuple(m.display for m in MATERIALS.values())  # id -> name
+CATEGORIES: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    c: tuple(k for k, m in MATERIALS.items() if m.category == c)
+    for c in dict.fromkeys(m.category for m in MATERIALS.values())
+})
+
+
+def display_name(key: str) -> str:
+    m = MATERIALS.get(key)
+    return m.display if m is not None else _display(key)
+
+
+def norm_unit(u, staff: bool = False) -> str:
+    """Normalize a free-text unit to its token ("" for non-strings)."""
+    if not isinstance(u, str):
+        return ""
+    u = u.strip().lower()
+    if staff and u in STAFF_UNIT_ALIASES:
+        return STAFF_UNIT_ALIASES[u]
+    return UNIT_ALIASES.get(u, u)
+
+
+def to_canonical(key: str, qty: float, unit: str) -> Optional[Tuple[float, str]]:
+    """(qty, unit) converted to key's canonical unit, or None if unit does not fit key."""
+    m = MATERIALS.get(key)
+    if m is None:
+        return None
+    f = m.factors.get(unit)
+    if f is None:
+        return None
+    return (qty if f == 1.0 else qty * f), m.unit
+
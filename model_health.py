@@ -0,0 +1,164 @@
+# model_health.py
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+log = logging.getLogger(__name__)
+
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))          # consecutive failures to open
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10"))
+HEDGE_DEFAULT_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_SECONDS", "12"))  # until enough samples
+HEDGE_FLOOR_SECONDS = float(os.getenv("LLM_HEDGE_FLOOR_SECONDS", "2"))
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """Absolute wall-clock budget shared by every model call made for one request."""
+    __slots__ = ("expires_at", "seconds")
+
+    def __init__(self, seconds: float):
+        self.seconds = float(seconds)
+        self.expires_at = time.monotonic() + self.seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def clamp(self, timeout: float) -> float:
+        """timeout capped to what is left; raises DeadlineExceeded if nothing is."""
+        left = self.remaining()
+        if left <= 0.0:
+            raise DeadlineExceeded(f"deadline of {self.seconds:g}s exceeded")
+        return min(float(timeout), left)
+
+
+def percentile(data: Iterable[float], q: float) -> Optional[float]:
+    """Nearest-rank q-quantile of data, or None if it is empty."""
+    data = sorted(data)
+    if not data:
+        return None
+    return data[min(len(data) - 1, int(q * len(data)))]
+
+
+class ModelHealth:
+    """
+    Latency window and circuit breaker for one model.
+    closed -> open after BREAKER_FAILURES consecutive failures; open models are
+    skipped for BREAKER_COOLDOWN seconds, then one probe call is let through
+    (half-open): success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, name: str, window: int = 100):
+        self.name = name
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=window)  # seconds, successful calls only
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= BREAKER_COOLDOWN:
+            return "half_open"
+        return "open"
+
+    def available(self) -> bool:
+        """Not skipped by the breaker right now (does not reserve the half-open probe)."""
+        return self.state != "open"
+
+    def allow(self) -> bool:
+        """Reserve a call: True if closed, or if this is the half-open probe."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record(self, ok: bool, seconds: float, error: Optional[BaseException] = None,
+               sample: bool = True) -> None:
+        """A call's outcome; sample=False keeps its time out of the latency window (stream first bytes)."""
+        with self._lock:
+            self._probe_in_flight = False
+            if ok:
+                self.successes += 1
+                self.consecutive_failures = 0
+                if sample:
+                    self.latencies.append(seconds)
+                if self.opened_at is not None:
+                    log.info("Model %s breaker closed", self.name)
+                self.opened_at = None
+                return
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = f"{type(error).__name__}: {error}" if error else None
+            if self.opened_at is not None or self.consecutive_failures >= BREAKER_FAILURES:
+                if self.opened_at is None:
+                    log.warning("Model %s breaker opened after %s failures", self.name, self.consecutive_failures)
+                self.opened_at = time.monotonic()
+
+    def record_rejected(self, error: BaseException) -> None:
+        """A request the API refused for its own content (4xx): says nothing about the model's health."""
+        with self._lock:
+            self._probe_in_flight = False
+            self.rejected += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            data = list(self.latencies)
+        return percentile(data, q)
+
+    def hedge_after(self) -> float:
+        """Seconds to wait on this model before also asking the next one."""
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_SECONDS
+        return max(HEDGE_FLOOR_SECONDS, self.percentile(HEDGE_PERCENTILE) or HEDGE_DEFAULT_SECONDS)
+
+    def info(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "state": self.state,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "consecutive_failures": self.consecutive_failures,
+            "p50_ms": round(p50 * 1000.0, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000.0, 1) if p95 is not None else None,
+            "hedge_after_ms": round(self.hedge_after() * 1000.0, 1),
+            "last_error": self.last_error,
+        }
+
+
+_registry: Dict[str, ModelHealth] = {}
+_registry_lock = threading.Lock()
+
+
+def health(name: str) -> ModelHealth:
+    h = _registry.get(name)
+    if h is None:
+        with _registry_lock:
+            h = _registry.setdefault(name, ModelHealth(name))
+    return h
+
+
+def snapshot() -> Dict[str, dict]:
+    return {name: h.info() for name, h in list(_registry.items())}
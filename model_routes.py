@@ -0,0 +1,203 @@
+# model_routes.py
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+from model_health import percentile
+
+log = logging.getLogger(__name__)
+
+# Cheapest/fastest first; a downgrade moves a route one step to the left
+TIERS = ("fast", "standard", "strong")
+
+
+class Route(NamedTuple):
+    tier: str
+    max_tokens: Optional[int]  # None: not sent (extractions must never be cut short)
+    timeout: float   # seconds per attempt
+    slo: float       # seconds; p95 wall time the route should stay under
+    images: bool = False  # sends images: never moved below its tier (a lower tier's model may be text-only)
+
+
+# Short, high-volume parses go to the fast tier; drawings and scanned
+# documents stay on standard with strong as the fallback. Only the free-text
+# narratives are capped: a BOM or invoice has as many lines as it has, and a
+# capped one would come back cut off.
+DEFAULT_ROUTES: Dict[str, Route] = {
+    "propose_bom_with_ai": Route("standard", None, 60.0, 20.0),
+    "expand_steps_with_ai": Route("standard", 1500, 60.0, 20.0),
+    "stream_steps_with_ai": Route("standard", 1500, 60.0, 25.0),
+    "propose_bom_from_vision": Route("standard", None, 60.0, 45.0, images=True),
+    "propose_purchase_from_text": Route("fast", None, 30.0, 8.0),
+    "propose_expenses_from_text": Route("fast", None, 30.0, 6.0),
+    "propose_invoice_from_vision": Route("standard", None, 90.0, 45.0, images=True),
+    "propose_invoice_from_pdf_text": Route("fast", None, 60.0, 15.0),
+    "propose_expenses_from_vision": Route("standard", None, 90.0, 30.0, images=True),
+    "propose_expenses_from_pdf_text": Route("fast", None, 60.0, 10.0),
+}
+
+
+def tier_models() -> Dict[str, str]:
+    """Model per tier: OPENAI_MODEL_FAST (default OPENAI_MODEL), OPENAI_MODEL, OPENAI_MODEL_STRONG."""
+    standard = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    return {
+        "fast": os.getenv("OPENAI_MODEL_FAST", "") or standard,
+        "standard": standard,
+        "strong": os.getenv("OPENAI_MODEL_STRONG", "gpt-4o"),
+    }
+
+
+class _RouteState:
+    __slots__ = ("latencies", "downgraded_until", "downgrades")
+
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)  # seconds, successful calls only
+        self.downgraded_until: Optional[float] = None
+        self.downgrades = 0
+
+
+class RouteTable:
+    """
+    Which tier, max output tokens, timeout and latency SLO each ai_text
+    entry point (op) uses. When a route's p95 over its last window calls
+    exceeds its SLO, it is moved one tier down for downgrade_seconds; it
+    then returns to its configured tier with a fresh window. Routes that
+    send images are never downgraded and never fall back below their tier,
+    since OPENAI_MODEL_FAST may not read images. Ops without a route fall
+    back to the caller's defaults.
+    """
+
+    def __init__(self, routes: Dict[str, Route], window: int = 50, min_samples: int = 10,
+                 downgrade_seconds: float = 300.0, auto_downgrade: bool = True):
+        self.routes = dict(routes)
+        self.window = int(window)
+        self.min_samples = int(min_samples)
+        self.downgrade_seconds = float(downgrade_seconds)
+        self.auto_downgrade = auto_downgrade
+        self._lock = threading.Lock()
+        self._state: Dict[str, _RouteState] = {op: _RouteState(self.window) for op in self.routes}
+
+    @classmethod
+    def from_env(cls) -> "RouteTable":
+        """
+        LLM_ROUTES='{"op": {"tier": "fast", "max_tokens": 800, "timeout": 20, "slo": 5}}'
+        overrides fields of the default routes (or adds routes; "max_tokens":
+        null sends no cap); bad entries are logged and skipped. LLM_ROUTE_DOWNGRADE=0 turns downgrades off.
+        """
+        routes = dict(DEFAULT_ROUTES)
+        try:
+            overrides = json.loads(os.getenv("LLM_ROUTES", "") or "{}")
+        except ValueError as e:
+            log.warning("LLM_ROUTES is not valid JSON, using the default routes: %s", e)
+            overrides = {}
+        for op, fields in overrides.items():
+            try:
+                base = routes.get(op, Route("standard", None, 60.0, 30.0))
+                route = base._replace(**fields)
+                route = Route(str(route.tier), int(route.max_tokens) if route.max_tokens is not None else None,
+                              float(route.timeout), float(route.slo), bool(route.images))
+                if route.tier not in TIERS:
+                    raise ValueError(f"tier must be one of {TIERS}")
+            except (TypeError, ValueError) as e:
+                log.warning("Ignoring LLM_ROUTES entry %r: %s", op, e)
+                continue
+            routes[op] = route
+        return cls(
+            routes,
+            window=int(os.getenv("LLM_ROUTE_WINDOW", "50")),
+            min_samples=int(os.getenv("LLM_ROUTE_MIN_SAMPLES", "10")),
+            downgrade_seconds=float(os.getenv("LLM_ROUTE_DOWNGRADE_SECONDS", "300")),
+            auto_downgrade=os.getenv("LLM_ROUTE_DOWNGRADE", "1") != "0",
+        )
+
+    def get(self, op: str) -> Optional[Route]:
+        return self.routes.get(op)
+
+    def _tier(self, op: str) -> str:
+        """The tier op runs on now (its configured one unless downgraded); ends an expired downgrade."""
+        route, state = self.routes[op], self._state[op]
+        if state.downgraded_until is None:
+            return route.tier
+        if time.monotonic() < state.downgraded_until:
+            return TIERS[max(0, TIERS.index(route.tier) - 1)]
+        with self._lock:
+            if state.downgraded_until is not None and time.monotonic() >= state.downgraded_until:
+                state.downgraded_until = None
+                state.latencies.clear()
+                log.info("Route %s back on the %s tier", op, route.tier)
+        return route.tier
+
+    def models(self, op: str) -> Optional[List[str]]:
+        """
+        Model sequence for op: its current tier's model, then the tiers above
+        it, then the ones below unless the route sends images
+        (OPENAI_MODEL_FALLBACKS replaces the rest). None if op has no route.
+        """
+        if op not in self.routes:
+            return None
+        tier = self._tier(op)
+        by_tier = tier_models()
+        i = TIERS.index(tier)
+        fallbacks_env = os.getenv("OPENAI_MODEL_FALLBACKS", "").strip()
+        if fallbacks_env:
+            rest = [m.strip() for m in fallbacks_env.split(",") if m.strip()]
+        else:
+            below = () if self.routes[op].images else TIERS[:i][::-1]
+            rest = [by_tier[t] for t in TIERS[i + 1:] + below]
+        sequence: List[str] = []
+        for m in [by_tier[tier]] + rest:
+            if m and m not in sequence:
+                sequence.append(m)
+        return sequence
+
+    def observe(self, op: str, seconds: float) -> None:
+        """Record a successful call's wall time; downgrade op if its p95 is over the SLO."""
+        route = self.routes.get(op)
+        if route is None:
+            return
+        with self._lock:
+            state = self._state[op]
+            state.latencies.append(seconds)
+            if not self.auto_downgrade or state.downgraded_until is not None:
+                return
+            if len(state.latencies) < self.min_samples:
+                return
+            p95 = percentile(state.latencies, 0.95)
+            if p95 <= route.slo or route.tier == TIERS[0] or route.images:
+                return
+            lower = TIERS[TIERS.index(route.tier) - 1]
+            if tier_models()[lower] == tier_models()[route.tier]:
+                return  # same model on both tiers; nothing to gain
+            state.downgraded_until = time.monotonic() + self.downgrade_seconds
+            state.downgrades += 1
+            state.latencies.clear()
+        log.warning("Route %s p95 %.0f ms is over its %.0f ms SLO; using the %s tier for %.0f s",
+                    op, p95 * 1000.0, route.slo * 1000.0, lower, self.downgrade_seconds)
+
+    def stats(self) -> Dict[str, dict]:
+        out = {}
+        for op, route in self.routes.items():
+            tier = self._tier(op)
+            with self._lock:
+                state = self._state[op]
+                p95 = percentile(state.latencies, 0.95)
+                until = state.downgraded_until
+                out[op] = {
+                    "tier": route.tier,
+                    "current_tier": tier,
+                    "model": tier_models()[tier],
+                    "max_tokens": route.max_tokens,
+                    "images": route.images,
+                    "timeout_s": route.timeout,
+                    "slo_ms": round(route.slo * 1000.0, 1),
+                    "p95_ms": round(p95 * 1000.0, 1) if p95 is not None else None,
+                    "samples": len(state.latencies),
+                    "downgrades": state.downgrades,
+                    "downgraded_for_s": round(until - time.monotonic(), 1) if until is not None else None,
+                }
+        return out
+
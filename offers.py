@@ -0,0 +1,145 @@
+# offers.py
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+class OfferIndex:
+    """
+    Columnar store of every supplier offer seen by the loaders, not just the cheapest.
+
+    Offers are kept in parallel arrays (key id, supplier id, listed unit price,
+    normalized per-unit price, source file id, source row) with interned string
+    tables. freeze() builds, per key, the offers sorted by normalized price and a
+    one-per-supplier list of each supplier's best offer, so:
+      - top(key, n)                  -> O(n)
+      - best(key, exclude={...})     -> O(len(exclude) + 1)
+      - cheapest()                   -> {key: price}, the view price_bom_lines uses
+    """
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.suppliers: List[str] = []
+        self.sources: List[str] = []
+        self._key_ids: Dict[str, int] = {}
+        self._supplier_ids: Dict[str, int] = {}
+        self._source_ids: Dict[str, int] = {}
+
+        self.key_id = array("i")
+        self.supplier_id = array("i")
+        self.unit_price = array("d")
+        self.price = array("d")
+        self.source_id = array("i")
+        self.row = array("i")
+        self.names: List[str] = []
+
+        self._sorted: Dict[int, array] = {}
+        self._by_supplier: Dict[int, array] = {}
+        self.frozen = False
+
+    def __len__(self):
+        return len(self.key_id)
+
+    @staticmethod
+    def _intern(table: List[str], ids: Dict[str, int], value: str) -> int:
+        i = ids.get(value)
+        if i is None:
+            i = ids[value] = len(table)
+            table.append(value)
+        return i
+
+    def add(self, key: str, price: float, *, unit_price: Optional[float] = None,
+            supplier: str = "", name: str = "", source: str = "", row: int = 0) -> None:
+        """Record one offer. price is normalized per key unit (per m, per sheet, …)."""
+        if self.frozen:
+            raise RuntimeError("OfferIndex is frozen")
+        self.key_id.append(self._intern(self.keys, self._key_ids, key))
+        self.supplier_id.append(self._intern(self.suppliers, self._supplier_ids, supplier or source))
+        self.price.append(float(price))
+        self.unit_price.append(float(price if unit_price is None else unit_price))
+        self.source_id.append(self._intern(self.sources, self._source_ids, source))
+        self.row.append(int(row))
+        self.names.append(name)
+
+    def freeze(self) -> "OfferIndex":
+        """Build the per-key sorted indexes. No more offers can be added afterwards."""
+        groups: Dict[int, List[int]] = {}
+        for i, k in enumerate(self.key_id):
+            groups.setdefault(k, []).append(i)
+        price = self.price
+        for k, ids in groups.items():
+            ids.sort(key=lambda i: (price[i], i))
+            self._sorted[k] = array("i", ids)
+            seen, best = set(), []
+            for i in ids:
+                s = self.supplier_id[i]
+                if s not in seen:
+                    seen.add(s)
+                    best.append(i)
+            self._by_supplier[k] = array("i", best)
+        self.frozen = True
+        return self
+
+    def runs(self):
+        """Flattened per-key indexes for serialization:
+        (sorted, sorted_start, best, best_start), key ids in order, starts of length len(keys)+1."""
+        flat, start = array("i"), array("i", [0])
+        bflat, bstart = array("i"), array("i", [0])
+        for k in range(len(self.keys)):
+            flat.extend(self._sorted[k])
+            start.append(len(flat))
+            bflat.extend(self._by_supplier[k])
+            bstart.append(len(bflat))
+        return flat, start, bflat, bstart
+
+    @classmethod
+    def from_columns(cls, *, keys: Sequence[str], suppliers: Sequence[str], sources: Sequence[str],
+                     names: Sequence[str], key_id, supplier_id, unit_price, price, source_id, row,
+                     sorted_flat, sorted_start, best_flat, best_start) -> "OfferIndex":
+        """Rebuild a frozen index over existing columns (arrays or memoryviews, e.g. from
+        an mmap'd snapshot) without copying them."""
+        self = cls()
+        self.keys, self.suppliers, self.sources = list(keys), list(suppliers), list(sources)
+        self._key_ids = {k: i for i, k in enumerate(self.keys)}
+        self._supplier_ids = {s: i for i, s in enumerate(self.suppliers)}
+        self._source_ids = {s: i for i, s in enumerate(self.sources)}
+        self.names = names
+        self.key_id, self.supplier_id, self.source_id, self.row = key_id, supplier_id, source_id, row
+        self.unit_price, self.price = unit_price, price
+        for k in range(len(self.keys)):
+            self._sorted[k] = sorted_flat[sorted_start[k]:sorted_start[k + 1]]
+            self._by_supplier[k] = best_flat[best_start[k]:best_start[k + 1]]
+        self.frozen = True
+        return self
+
+    def offer(self, i: int) -> dict:
+        return {
+            "key": self.keys[self.key_id[i]],
+            "supplier": self.suppliers[self.supplier_id[i]],
+            "name": self.names[i],
+            "price": self.price[i],
+            "unit_price": self.unit_price[i],
+            "source": self.sources[self.source_id[i]],
+            "row": self.row[i],
+        }
+
+    def top(self, key: str, n: int = 3) -> List[dict]:
+        """The n cheapest offers for key (several may come from one supplier)."""
+        k = self._key_ids.get(key)
+        if k is None or k not in self._sorted:
+            return []
+        return [self.offer(i) for i in self._sorted[k][:max(0, n)]]
+
+    def best(self, key: str, exclude: Iterable[str] = ()) -> Optional[dict]:
+        """Cheapest offer for key from a supplier not in exclude (e.g. out of stock)."""
+        k = self._key_ids.get(key)
+        if k is None or k not in self._by_supplier:
+            return None
+        skip = {self._supplier_ids[s] for s in exclude if s in self._supplier_ids}
+        for i in self._by_supplier[k]:
+            if self.supplier_id[i] not in skip:
+                return self.offer(i)
+        return None
+
+    def cheapest(self) -> Dict[str, float]:
+        """{key: lowest normalized price} — the min-only view loaders used to return."""
+        return {self.keys[k]: self.price[ids[0]] for k, ids in self._sorted.items()}
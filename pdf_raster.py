@@ -0,0 +1,287 @@
+# pdf_raster.py
+import os
+import atexit
+import io
+import time
+import hashlib
+import logging
+import contextlib
+import textwrap
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Sequence, Tuple
+
+import disk_cache
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join("instance", "pdf_cache"))
+CACHE_MAX_BYTES = int(float(os.getenv("PDF_CACHE_MAX_MB", "200")) * 1024 * 1024)
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "2"))  # fewer pages render inline
+WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+# A page whose text layer has fewer letters/digits than this is treated as scanned
+TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "40"))
+TEXT_COLUMNS = 120  # page width in characters for layout-preserving text
+
+# pdfium is not thread-safe; in-process calls from request threads take this.
+# Pool workers are single-threaded processes and render without it.
+_PDFIUM_LOCK = threading.Lock()
+
+
+def _render_page(pdf_path: str, index: int, scale: float, lock=None) -> bytes:
+    """One page as PNG bytes. lock, if given, is held for the pdfium calls only, not the PNG encode."""
+    import pypdfium2 as pdfium  # type: ignore
+
+    with lock or contextlib.nullcontext():
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            page = pdf[index]
+            try:
+                image = page.render(scale=scale).to_pil()  # requires Pillow
+            finally:
+                page.close()
+        finally:
+            pdf.close()
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _layout_text(page) -> str:
+    """
+    The page's text with its layout kept: runs on the same baseline share a
+    line and sit at their horizontal position (TEXT_COLUMNS across the page),
+    so invoice tables keep their columns.
+    """
+    textpage = page.get_textpage()
+    try:
+        width = page.get_width() or 1.0
+        runs = []
+        for i in range(textpage.count_rects()):
+            left, bottom, right, top = textpage.get_rect(i)
+            text = textpage.get_text_bounded(left, bottom, right, top).replace("\r", " ").replace("\n", " ").strip()
+            if text:
+                runs.append((top, bottom, left, text))
+    finally:
+        textpage.close()
+    runs.sort(key=lambda r: (-r[0], r[2]))
+    lines: List[List[Tuple[float, str]]] = []
+    line_mid = None
+    for top, bottom, left, text in runs:
+        mid = (top + bottom) / 2.0
+        if line_mid is None or abs(mid - line_mid) > max(2.0, (top - bottom) / 2.0):
+            lines.append([])
+            line_mid = mid
+        lines[-1].append((left, text))
+    out = []
+    for line in lines:
+        row = ""
+        for left, text in sorted(line):
+            col = int(left / width * TEXT_COLUMNS)
+            row += " " * max(1 if row else 0, col - len(row)) + text
+        out.append(row.rstrip())
+    return textwrap.dedent("\n".join(out))
+
+
+def _usable(text: str) -> bool:
+    """Enough real characters, and not the mojibake of a font without a Unicode map."""
+    alnum = sum(c.isalnum() for c in text)
+    bad = sum(c == "\ufffd" or (ord(c) < 32 and c not in "\n\t") or 0xE000 <= ord(c) <= 0xF8FF for c in text)
+    return alnum >= TEXT_MIN_CHARS and bad <= 0.05 * max(1, len(text))
+
+
+def _page_count(pdf_path: str) -> int:
+    import pypdfium2 as pdfium  # type: ignore
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+class PdfRasterizer:
+    """
+    Renders PDF pages to PNG bytes, caching each page on disk by
+    (content hash, page, scale). The cache is trimmed to max_bytes, least
+    recently used first; a hit refreshes the file's mtime. Uncached runs of
+    parallel_min_pages or more render in a process pool, and once the pool is
+    up every render goes there, so request threads do not queue on pdfium's
+    in-process lock. Nothing is left in temp directories: pages come
+    back as in-memory buffers and cache files are written via rename.
+    """
+
+    def __init__(self, cache_dir: Optional[str], max_bytes: int = CACHE_MAX_BYTES,
+                 workers: int = WORKERS, parallel_min_pages: int = PARALLEL_MIN_PAGES):
+        self.cache_dir = cache_dir or None
+        self.max_bytes = int(max_bytes)
+        self.workers = max(1, int(workers))
+        self.parallel_min_pages = int(parallel_min_pages)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.pages_rendered = 0
+        self.pages_cached = 0
+        self.render_ms = 0.0
+        self.evicted = 0
+        self.text_pages = 0
+        self.scanned_pages = 0
+        self.text_ms = 0.0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # forkserver: forking a threaded web worker is unsafe
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _cache_path(self, digest: str, index: int, scale: float) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}_p{index + 1}_s{scale:g}.png")
+
+    def _read_cached(self, path: Optional[str]) -> Optional[bytes]:
+        if not path:
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # LRU: mtime is last use
+            return data
+        except OSError:
+            return None
+
+    def _store(self, path: Optional[str], data: bytes) -> None:
+        if not path:
+            return
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning("PDF page cache write failed (%s): %s", path, e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def evict(self) -> int:
+        """Trim the cache to max_bytes, oldest mtime first. Returns files removed."""
+        if not self.cache_dir:
+            return 0
+        removed = disk_cache.trim_lru(self.cache_dir, self.max_bytes)
+        with self._lock:
+            self.evicted += removed
+        return removed
+
+    def render(self, pdf_path: str, max_pages: int = 3, scale: float = 2.0,
+               pages: Optional[Sequence[int]] = None) -> List[bytes]:
+        """PNG bytes for the first max_pages pages (or just the 0-based pages given). Returns [] on failure."""
+        try:
+            with open(pdf_path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            with _PDFIUM_LOCK:
+                count = min(_page_count(pdf_path), int(max_pages))
+        except Exception:
+            log.exception("Cannot open PDF %s", pdf_path)
+            return []
+        indices = [i for i in (range(count) if pages is None else pages) if 0 <= i < count]
+
+        t0 = time.perf_counter()
+        out: List[Optional[bytes]] = []
+        for i in indices:
+            out.append(self._read_cached(self._cache_path(digest, i, scale)))
+        missing = [n for n, data in enumerate(out) if data is None]
+        try:
+            if missing and self.workers > 1 and (len(missing) >= self.parallel_min_pages or self._pool is not None):
+                pool = self._executor()
+                futures = {n: pool.submit(_render_page, pdf_path, indices[n], scale) for n in missing}
+                for n, fut in futures.items():
+                    out[n] = fut.result()
+            else:
+                for n in missing:
+                    out[n] = _render_page(pdf_path, indices[n], scale, _PDFIUM_LOCK)
+        except BrokenProcessPool:
+            log.exception("PDF render pool died rendering %s; starting a new one next time", pdf_path)
+            self.shutdown()
+            return []
+        except Exception:
+            log.exception("PDF rasterization failed for %s", pdf_path)
+            return []
+        for n in missing:
+            self._store(self._cache_path(digest, indices[n], scale), out[n])
+
+        with self._lock:
+            self.pages_rendered += len(missing)
+            self.pages_cached += len(indices) - len(missing)
+            self.render_ms += (time.perf_counter() - t0) * 1000.0
+            self._writes += len(missing)
+            sweep = missing and self._writes >= 20
+            if sweep:
+                self._writes = 0
+        if sweep:  # amortized: walk the cache every ~20 new pages
+            self.evict()
+        return out  # type: ignore[return-value]
+
+    def extract_text(self, pdf_path: str, max_pages: int = 3) -> List[Optional[str]]:
+        """
+        Layout-preserving text of the first max_pages pages: a string for each
+        page with a usable text layer, None for scanned pages (render those).
+        Returns [] if the PDF cannot be read.
+        """
+        t0 = time.perf_counter()
+        try:
+            import pypdfium2 as pdfium  # type: ignore
+
+            with _PDFIUM_LOCK:
+                pdf = pdfium.PdfDocument(pdf_path)
+                try:
+                    texts: List[Optional[str]] = []
+                    for i in range(min(len(pdf), int(max_pages))):
+                        page = pdf[i]
+                        try:
+                            text = _layout_text(page)
+                        finally:
+                            page.close()
+                        texts.append(text if _usable(text) else None)
+                finally:
+                    pdf.close()
+        except Exception:
+            log.exception("PDF text extraction failed for %s", pdf_path)
+            return []
+        with self._lock:
+            self.text_pages += sum(t is not None for t in texts)
+            self.scanned_pages += sum(t is None for t in texts)
+            self.text_ms += (time.perf_counter() - t0) * 1000.0
+        return texts
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pages_rendered": self.pages_rendered,
+                "pages_cached": self.pages_cached,
+                "render_ms": round(self.render_ms, 1),
+                "evicted": self.evicted,
+                "text_pages": self.text_pages,
+                "scanned_pages": self.scanned_pages,
+                "text_ms": round(self.text_ms, 1),
+                "cache": bool(self.cache_dir),
+                "max_mb": round(self.max_bytes / 1024 / 1024, 1),
+                "pool": self._pool is not None,
+            }
+
+
+RASTERIZER = PdfRasterizer(CACHE_DIR)
+atexit.register(RASTERIZER.shutdown)
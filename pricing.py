@@ -0,0 +1,84 @@
+# pricing.py
+from typing import List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from materials import DISPLAY_NAMES, KEY_IDS, KEYS
+
+# cement_bag is priced off whichever grade the catalog has, in this order
+CEMENT_FALLBACK = ("cement_bag", "cement_bag_eco", "cement_bag_premium")
+
+
+def lookup_price(prices: Mapping[str, float], key: str) -> Optional[float]:
+    if key == "cement_bag":
+        for alt in CEMENT_FALLBACK:
+            if prices.get(alt) is not None:
+                return prices[alt]
+        return None
+    return prices.get(key)
+
+
+class BomPricer:
+    """
+    Prices many BOMs in one shot against one catalog snapshot.
+
+    The catalog becomes a float64 vector over the registry's dense key ids
+    (NaN = unpriced, cement_bag fallback already resolved).
+    N BOMs are flattened into a sparse COO quantity matrix (bom row, key id, qty);
+    line totals are qty * price[key id] and BOM totals one weighted bincount over
+    the rows, i.e. Q @ price. Lines and totals match price_bom_lines exactly,
+    including skipped unknown keys and "— UNPRICED" lines.
+    """
+
+    def __init__(self, prices: Mapping[str, float]):
+        self.ids = KEY_IDS
+        self.names = DISPLAY_NAMES
+        self.price = np.full(len(KEYS), np.nan)
+        for i, k in enumerate(KEYS):
+            up = lookup_price(prices, k)
+            if up is not None:
+                self.price[i] = float(up)
+
+    def price_many(self, boms: Sequence[Sequence[dict]], with_lines: bool = True) -> List[dict]:
+        """
+        boms: list of BOM line lists ({"key", "qty", "unit"} dicts).
+        Returns one {"lines", "total"} per BOM (just {"total"} if with_lines=False).
+        Raises ValueError/TypeError on a malformed qty; lines whose key is not a
+        known string are skipped, like price_bom_lines.
+        """
+        ids = self.ids
+        rows, cols, qtys, units = [], [], [], []
+        for b, lines in enumerate(boms):
+            for it in (lines or []):
+                key = it.get("key"); qty = float(it.get("qty", 0) or 0)
+                k = ids.get(key) if isinstance(key, str) else None  # a list/dict key is unknown, not a bad qty
+                if k is None:
+                    continue
+                rows.append(b); cols.append(k); qtys.append(qty); units.append(it.get("unit"))
+
+        n = len(boms)
+        r = np.array(rows, dtype=np.intp)
+        c = np.array(cols, dtype=np.intp)
+        q = np.array(qtys, dtype=np.float64)
+        up = self.price[c]
+        line_total = q * up
+        priced = ~np.isnan(up)
+        # bincount adds weights in input order, so each total sums the same
+        # floats in the same order as the per-line loop in price_bom_lines
+        totals = np.bincount(r[priced], weights=line_total[priced], minlength=n)
+        totals = totals.astype(np.float64, copy=False).tolist()  # int64 when nothing is priced
+
+        if not with_lines:
+            return [{"total": round(t, 2)} for t in totals]
+
+        out = [{"lines": [], "total": round(t, 2)} for t in totals]
+        names = self.names
+        for b, k, qty, unit, p, lt, ok in zip(rows, cols, qtys, units, up.tolist(),
+                                              line_total.tolist(), priced.tolist()):
+            if not ok:
+                out[b]["lines"].append({"name": names[k] + " — UNPRICED", "qty": qty, "unit": unit,
+                                        "unit_price": 0, "total": 0})
+            else:
+                out[b]["lines"].append({"name": names[k], "qty": round(qty, 2), "unit": unit,
+                                        "unit_price": round(p, 2), "total": round(lt, 2)})
+        return out
@@ -0,0 +1,198 @@
+# response_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    key         TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    expires_at  REAL NOT NULL,
+    latency_ms  REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_response_cache_created ON response_cache (created_at);
+"""
+
+
+def normalize_prompt(text: Any) -> str:
+    """Case- and whitespace-insensitive form of a prompt."""
+    return " ".join(str(text or "").lower().split())
+
+
+def canonical_json(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def make_key(kind: str, *parts: Any) -> str:
+    return hashlib.sha256(canonical_json([kind, *parts]).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for model responses.
+    - Tier 1: in-process LRU (max_memory entries), checked first, no I/O.
+    - Tier 2: SQLite file shared by all workers (max_disk rows), promoted into
+      tier 1 on a hit. Pass db_path=None for memory only.
+    Entries expire after ttl_seconds. Values must be JSON-serializable.
+    Each entry remembers how long the original call took, so hits can report
+    the latency they saved.
+    """
+
+    def __init__(self, db_path: Optional[str], ttl_seconds: float = 86400.0,
+                 max_memory: int = 512, max_disk: int = 10000):
+        self.db_path = db_path
+        self.ttl = float(ttl_seconds)
+        self.max_memory = int(max_memory)
+        self.max_disk = int(max_disk)
+        # key -> (JSON text, expires_at, latency_ms); hits decode a fresh copy
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.stores = 0
+        self.saved_ms = 0.0
+        self.disk_error: Optional[str] = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db().executescript(_SCHEMA)
+            except Exception as e:
+                log.warning("Response cache disk tier disabled (%s): %s", db_path, e)
+                self.disk_error = str(e)
+                self.db_path = None
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """RESPONSE_CACHE=0 disables; RESPONSE_CACHE_DB="" keeps it memory-only."""
+        if os.getenv("RESPONSE_CACHE", "1") == "0":
+            return None
+        return cls(
+            os.getenv("RESPONSE_CACHE_DB", os.path.join("instance", "response_cache.db")) or None,
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400")),
+            max_memory=int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", "512")),
+            max_disk=int(os.getenv("RESPONSE_CACHE_DISK_ENTRIES", "10000")),
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, text: str, expires_at: float, latency_ms: float) -> None:
+        with self._lock:
+            self._lru[key] = (text, expires_at, latency_ms)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_memory:
+                self._lru.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is not None:
+                if hit[1] > now:
+                    self._lru.move_to_end(key)
+                    self.hits_memory += 1
+                    self.saved_ms += hit[2]
+                    return json.loads(hit[0])
+                del self._lru[key]
+        if self.db_path:
+            try:
+                row = self._db().execute(
+                    "SELECT value, expires_at, latency_ms FROM response_cache WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                log.warning("Response cache read failed: %s", e)
+                row = None
+            if row is not None and row[1] > now:
+                value = json.loads(row[0])
+                self._remember(key, row[0], row[1], row[2])
+                with self._lock:
+                    self.hits_disk += 1
+                    self.saved_ms += row[2]
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, kind: str, value: Any, latency_ms: float = 0.0) -> None:
+        now = time.time()
+        expires_at = now + self.ttl
+        text = canonical_json(value)
+        self._remember(key, text, expires_at, latency_ms)
+        with self._lock:
+            self.stores += 1
+            self._puts += 1
+            sweep = self._puts % 100 == 1
+        if not self.db_path:
+            return
+        try:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO response_cache (key, kind, value, created_at, expires_at, latency_ms) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, text, now, expires_at, float(latency_ms)),
+            )
+            if sweep:  # amortized: expire + trim to max_disk every 100 writes
+                db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+                db.execute(
+                    "DELETE FROM response_cache WHERE key IN (SELECT key FROM response_cache "
+                    "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_disk,)
+                )
+        except sqlite3.Error as e:
+            log.warning("Response cache write failed: %s", e)
+
+    def get_or_call(self, kind: str, key: str, fn: Callable[[], Any],
+                    keep: Callable[[Any], bool] = bool) -> Any:
+        """Cached value for key, else fn() (stored only if keep(result))."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        t0 = time.perf_counter()
+        value = fn()
+        latency_ms = (time.perf_counter() - t0) * 1000.0
+        if keep(value):
+            self.put(key, kind, value, latency_ms)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+        if self.db_path:
+            self._db().execute("DELETE FROM response_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.hits_memory + self.hits_disk
+            lookups = hits + self.misses
+            out = {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "stores": self.stores,
+                "saved_ms": round(self.saved_ms, 1),
+                "memory_entries": len(self._lru),
+                "ttl_seconds": self.ttl,
+                "disk": bool(self.db_path),
+            }
+        if self.disk_error:
+            out["disk_error"] = self.disk_error
+        return out
@@ -0,0 +1,225 @@
+# singleflight.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS singleflight_lease (
+    key         TEXT PRIMARY KEY,
+    token       TEXT NOT NULL,
+    expires_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS singleflight_result (
+    token       TEXT PRIMARY KEY,
+    value       TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+"""
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while do(key, fn) is running, other
+    callers with the same key wait for it and get the same result (or
+    exception) instead of calling fn again. Nothing is kept once the call
+    finishes; caching is the response cache's job.
+
+    With db_path, callers in other processes are coalesced too: the process
+    that runs fn holds a lease row in SQLite and writes the JSON result for
+    the others to pick up. A lease expires after lease_seconds, so a dead
+    holder does not block anyone for longer than that. Pass db_path=None to
+    coalesce within this process only. Values must be JSON-serializable.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, lease_seconds: float = 120.0,
+                 poll_seconds: float = 0.1):
+        self.db_path = db_path
+        self.lease_seconds = float(lease_seconds)
+        self.poll_seconds = float(poll_seconds)
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._leases = 0
+        self.leaders = 0
+        self.shared_local = 0
+        self.shared_remote = 0
+        self.gave_up = 0
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._db().executescript(_SCHEMA)
+            except Exception as e:
+                log.warning("Cross-worker single-flight disabled (%s): %s", db_path, e)
+                self.db_path = None
+
+    @classmethod
+    def from_env(cls) -> Optional["SingleFlight"]:
+        """SINGLE_FLIGHT=0 disables; SINGLE_FLIGHT_DB="" coalesces within each process only."""
+        if os.getenv("SINGLE_FLIGHT", "1") == "0":
+            return None
+        return cls(
+            os.getenv("SINGLE_FLIGHT_DB", os.path.join("instance", "singleflight.db")) or None,
+            lease_seconds=float(os.getenv("SINGLE_FLIGHT_LEASE_SECONDS", "120")),
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def do(self, key: str, fn: Callable[[], Any], wait: Optional[float] = None) -> Any:
+        """
+        fn(), shared with every concurrent caller of the same key. A caller
+        that has waited wait seconds (default lease_seconds) for someone
+        else's call stops waiting and calls fn itself.
+        """
+        wait = self.lease_seconds if wait is None else max(0.0, float(wait))
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.done.wait(wait):
+                with self._lock:
+                    self.shared_local += 1
+                if call.error is not None:
+                    raise call.error
+                return call.value
+            with self._lock:
+                self.gave_up += 1
+            return fn()
+
+        try:
+            call.value = self._run(key, fn, wait) if self.db_path else self._count_leader(fn)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.value
+
+    def _count_leader(self, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.leaders += 1
+        return fn()
+
+    # -- cross-worker --
+    def _acquire(self, key: str) -> Tuple[bool, str]:
+        """(True, our token) if we took the lease, else (False, the live holder's token)."""
+        db = self._db()
+        now = time.time()
+        token = uuid.uuid4().hex
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT token, expires_at FROM singleflight_lease WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                db.execute("COMMIT")
+                return False, row[0]
+            db.execute("INSERT OR REPLACE INTO singleflight_lease (key, token, expires_at) VALUES (?, ?, ?)",
+                       (key, token, now + self.lease_seconds))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return True, token
+
+    def _release(self, key: str, token: str, value: Any, publish: bool) -> None:
+        db = self._db()
+        now = time.time()
+        try:
+            if publish:
+                db.execute("INSERT OR REPLACE INTO singleflight_result (token, value, created_at) VALUES (?, ?, ?)",
+                           (token, json.dumps(value), now))
+            db.execute("DELETE FROM singleflight_lease WHERE key = ? AND token = ?", (key, token))
+            with self._lock:
+                self._leases += 1
+                sweep = self._leases % 100 == 0
+            if sweep:  # amortized: results only need to outlive the waiters' polling
+                db.execute("DELETE FROM singleflight_result WHERE created_at < ?", (now - self.lease_seconds,))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            log.warning("Single-flight release failed: %s", e)
+
+    def _run(self, key: str, fn: Callable[[], Any], wait: float) -> Any:
+        end = time.monotonic() + wait
+        while True:
+            try:
+                ours, token = self._acquire(key)
+            except sqlite3.Error as e:
+                log.warning("Single-flight lease failed, calling directly: %s", e)
+                return self._count_leader(fn)
+            if ours:
+                with self._lock:
+                    self.leaders += 1
+                try:
+                    value = fn()
+                except BaseException:
+                    self._release(key, token, None, publish=False)
+                    raise
+                self._release(key, token, value, publish=True)
+                return value
+            # Another worker is running it: wait for its result or for the lease to go
+            outcome, value = self._await(key, token, end)
+            if outcome == "result":
+                with self._lock:
+                    self.shared_remote += 1
+                return value
+            if outcome == "timeout":
+                with self._lock:
+                    self.gave_up += 1
+                return fn()
+            # "gone": the holder failed or its lease expired; try to take over
+
+    def _await(self, key: str, held: str, end: float):
+        """("result", value) once the holder publishes, ("gone", None) if its lease is dropped, or ("timeout", None)."""
+        while time.monotonic() < end:
+            time.sleep(self.poll_seconds)
+            try:
+                db = self._db()
+                row = db.execute("SELECT value FROM singleflight_result WHERE token = ?", (held,)).fetchone()
+                if row is not None:
+                    return "result", json.loads(row[0])
+                lease = db.execute("SELECT token FROM singleflight_lease WHERE key = ?", (key,)).fetchone()
+                if lease is None or lease[0] != held:
+                    # the holder may have published and released between the two reads
+                    row = db.execute("SELECT value FROM singleflight_result WHERE token = ?", (held,)).fetchone()
+                    if row is not None:
+                        return "result", json.loads(row[0])
+                    return "gone", None
+            except sqlite3.Error as e:
+                log.warning("Single-flight poll failed: %s", e)
+                return "timeout", None
+        return "timeout", None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "shared_local": self.shared_local,
+                "shared_remote": self.shared_remote,
+                "gave_up": self.gave_up,
+                "in_flight": len(self._calls),
+                "cross_worker": bool(self.db_path),
+            }
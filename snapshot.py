@@ -0,0 +1,257 @@
+# snapshot.py
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import hashlib
+import logging
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+from pathlib import Path
+
+from loaders import build_catalog, lumber_index
+from offers import OfferIndex
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"BACATSN1"
+FORMAT = 1
+_HEAD = struct.Struct("<8sI")  # magic, header length
+_ALIGN = 8
+
+# Files whose source decides what a CSV row turns into; a change to any of them
+# invalidates the snapshot just like a CSV edit does.
+_CODE_FILES = ("loaders.py", "offers.py", "snapshot.py")
+
+
+def content_hash(paths):
+    """sha256 over the price CSVs, the loader code and CEMENT_GRADE."""
+    h = hashlib.sha256(f"format={FORMAT}".encode())
+    for name in sorted(paths):
+        h.update(f"\0{name}\0".encode())
+        try:
+            h.update(Path(paths[name]).read_bytes())
+        except OSError:
+            h.update(b"<missing>")
+    here = Path(__file__).resolve().parent
+    for fname in _CODE_FILES:
+        h.update((here / fname).read_bytes())
+    h.update(("CEMENT_GRADE=" + (os.getenv("CEMENT_GRADE") or "").strip().lower()).encode())
+    return h.hexdigest()
+
+
+def _native():
+    """Layout facts a reader must share with the writer to cast the arrays in place."""
+    return {"byteorder": sys.byteorder, "i": array("i").itemsize,
+            "I": array("I").itemsize, "d": array("d").itemsize}
+
+
+def _pad(n):
+    return (-n) % _ALIGN
+
+
+class StringTable:
+    """Read-only sequence of strings over a utf-8 blob + offsets; decodes on access."""
+    __slots__ = ("_blob", "_offs")
+
+    def __init__(self, blob, offs):
+        self._blob = blob
+        self._offs = offs
+
+    def __len__(self):
+        return len(self._offs) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return bytes(self._blob[self._offs[i]:self._offs[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def _strings(values):
+    blob, offs = bytearray(), array("I", [0])
+    for v in values:
+        blob += v.encode("utf-8")
+        offs.append(len(blob))
+    return bytes(blob), offs
+
+
+class LazyMeta(Mapping):
+    """
+    Catalog meta whose bulky JSON part (steel rows, boards, …) is only decoded
+    the first time one of those keys is read. "offers" and "origin" are eager.
+    """
+
+    def __init__(self, eager, keys, raw):
+        self._eager = dict(eager)
+        self._keys = list(eager) + [k for k in keys if k not in eager]
+        self._raw = raw
+        self._decoded = None
+
+    def _load(self):
+        if self._decoded is None:
+            data = json.loads(bytes(self._raw))
+            lm = data.get("lumber_meta")
+            if isinstance(lm, dict) and "boards" in lm:
+                lm["index"] = lumber_index(lm["boards"])
+            self._decoded = data
+        return self._decoded
+
+    def __getitem__(self, key):
+        if key in self._eager:
+            return self._eager[key]
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def write_snapshot(out_path, prices, meta, digest):
+    """Serialize (prices, meta) to out_path atomically (tmp file + rename)."""
+    offers = meta["offers"]
+    sections = {}
+
+    def put(name, data, typecode="B"):
+        sections[name] = (typecode, data.tobytes() if isinstance(data, array) else bytes(data))
+
+    price_keys = sorted(prices)
+    for name, values in (("keys", offers.keys), ("suppliers", offers.suppliers),
+                         ("sources", offers.sources), ("names", offers.names),
+                         ("price_keys", price_keys)):
+        blob, offs = _strings(values)
+        put(f"{name}.blob", blob)
+        put(f"{name}.offs", offs, "I")
+    put("price_values", array("d", (float(prices[k]) for k in price_keys)), "d")
+    for col, tc in (("key_id", "i"), ("supplier_id", "i"), ("source_id", "i"), ("row", "i"),
+                    ("unit_price", "d"), ("price", "d")):
+        put(col, array(tc, getattr(offers, col)), tc)
+    for name, arr in zip(("sorted_flat", "sorted_start", "best_flat", "best_start"), offers.runs()):
+        put(name, arr, "i")
+
+    rest = {k: v for k, v in meta.items() if k not in ("offers", "origin")}
+    if isinstance(rest.get("lumber_meta"), dict):
+        # the index is keyed by float lengths; rebuilt from boards on load
+        rest["lumber_meta"] = {k: v for k, v in rest["lumber_meta"].items() if k != "index"}
+    put("meta", json.dumps(rest, separators=(",", ":"), default=str).encode("utf-8"))
+
+    layout, offset = {}, 0
+    for name, (tc, data) in sections.items():
+        layout[name] = [offset, len(data), tc]
+        offset += len(data) + _pad(len(data))
+    header = json.dumps({
+        "format": FORMAT,
+        "hash": digest,
+        "built_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "native": _native(),
+        "meta_keys": list(rest),
+        "offers": len(offers),
+        "sections": layout,
+    }).encode("utf-8")
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEAD.pack(MAGIC, len(header)))
+        f.write(header)
+        f.write(b"\0" * _pad(_HEAD.size + len(header)))
+        for _, data in sections.values():
+            f.write(data)
+            f.write(b"\0" * _pad(len(data)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, out_path)
+    return out_path.stat().st_size
+
+
+def read_snapshot(path, digest):
+    """
+    mmap a snapshot and return (prices, meta), or None if it is missing, corrupt,
+    built on another platform, or for different inputs than digest.
+    Offer columns are memoryviews over the mapping (no copy, no parse).
+    """
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    buf = cols = offers = prices = None
+    try:
+        magic, hlen = _HEAD.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError("bad magic")
+        header = json.loads(mm[_HEAD.size:_HEAD.size + hlen])
+        if header.get("format") != FORMAT or header.get("native") != _native():
+            raise ValueError("incompatible snapshot format")
+        if header.get("hash") != digest:
+            mm.close()
+            return None
+        base = _HEAD.size + hlen + _pad(_HEAD.size + hlen)
+        buf = memoryview(mm)
+        layout = header["sections"]
+
+        def section(name):
+            offset, length, tc = layout[name]
+            if base + offset + length > len(mm):
+                raise ValueError(f"truncated section {name}")
+            mv = buf[base + offset:base + offset + length]
+            return mv if tc == "B" else mv.cast(tc)
+
+        def strings(name):
+            return StringTable(section(f"{name}.blob"), section(f"{name}.offs"))
+
+        cols = {c: section(c) for c in ("key_id", "supplier_id", "source_id", "row", "unit_price",
+                                         "price", "sorted_flat", "sorted_start", "best_flat",
+                                         "best_start")}
+        offers = OfferIndex.from_columns(
+            keys=strings("keys"), suppliers=strings("suppliers"), sources=strings("sources"),
+            names=strings("names"), **cols,
+        )
+        prices = dict(zip(strings("price_keys"), section("price_values").tolist()))
+        meta = LazyMeta({"offers": offers, "origin": "snapshot", "snapshot_built_at": header.get("built_at")},
+                        header.get("meta_keys", ()), section("meta"))
+        return prices, meta
+    except Exception as e:
+        log.warning("Ignoring unreadable catalog snapshot %s: %s", path, e)
+    # Out of the except block, so the traceback's frames (and their views) are gone
+    buf = cols = offers = prices = None
+    try:
+        mm.close()
+    except BufferError:
+        pass  # a view is still referenced somewhere; the mapping goes when it does
+    return None
+
+
+def compile_snapshot(paths, out_path):
+    """Parse the CSVs and write the snapshot. Returns a small summary dict."""
+    t0 = time.perf_counter()
+    digest = content_hash(paths)
+    prices, meta = build_catalog(paths)
+    size = write_snapshot(out_path, prices, meta, digest)
+    return {"path": str(out_path), "bytes": size, "hash": digest, "price_keys": len(prices),
+            "offers": len(meta["offers"]), "build_ms": round((time.perf_counter() - t0) * 1000.0, 1)}
+
+
+def load_catalog(paths, snapshot_path=None):
+    """
+    (prices, meta) from the snapshot when its hash matches the current CSVs,
+    else straight from the CSVs. meta["origin"] says which.
+    """
+    if snapshot_path:
+        loaded = read_snapshot(snapshot_path, content_hash(paths))
+        if loaded is not None:
+            return loaded
+        log.info("Catalog snapshot %s missing or stale; parsing CSVs", snapshot_path)
+    prices, meta = build_catalog(paths)
+    meta["origin"] = "csv"
+    return prices, meta
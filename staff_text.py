@@ -0,0 +1,232 @@
+# staff_text.py
+"""
+Local parser for the short, structured notes staff type into the purchase
+and expense "AI assist" boxes, so those endpoints can skip the model:
+
+    parse_purchase("10 yd3 sand @ 350 from XYZ")   # (data, confidence)
+    parse_expenses("fuel 250, salaries 4000")
+
+data has the same shape as propose_purchase_from_text /
+propose_expenses_from_text (it goes through the same validators).
+confidence is 1.0 when every part of the text was understood and lower when
+something was left over or guessed; callers send low-confidence text to the
+model instead.
+"""
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from ai_text import _ALLOWED_UNITS_STAFF, _norm_unit_staff, _validate_expenses, _validate_purchase_lines
+
+# Below this the model is asked instead (see app.STAFF_TEXT_MIN_CONFIDENCE)
+GUESS = 0.5
+
+_NUM = r"(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+_MONEY = r"(?:\$|tt\$|us\$)?\s*" + _NUM
+_DATE_RE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+# Dates we do not resolve locally ("yesterday", "last friday", "3/2")
+_OTHER_DATE_RE = re.compile(
+    r"\b(?:today|yesterday|tomorrow|last|ago|(?:mon|tues|wednes|thurs|fri|satur|sun)day|"
+    r"jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b", re.I)
+# Items are separated by newlines, ";", "," (not a thousands separator) or "and" before a number
+_SPLIT_RE = re.compile(r"\s*(?:[\n;]|,(?!\d{3}\b)|\band\s+(?=[$\d]))\s*")
+
+# Expense category words (the model's categories: salaries|fuel|maintenance|other)
+_EXPENSE_WORDS = {
+    "salaries": ("salary", "salaries", "wage", "wages", "payroll"),
+    "fuel": ("fuel", "diesel", "gas", "gasoline", "petrol"),
+    "maintenance": ("maintenance", "repair", "repairs", "service", "servicing", "tyres", "tires", "parts"),
+    "other": ("other", "misc", "miscellaneous", "sundry", "sundries"),
+}
+_EXPENSE_CATEGORY = {w: c for c, words in _EXPENSE_WORDS.items() for w in words}
+# Words that leave the amount or its sign in doubt: a unit ("diesel 40 gallons"
+# may be a quantity), money coming back, or a payment that is not an expense
+_EXPENSE_DOUBT = {
+    "gal", "gals", "gallon", "gallons", "l", "litre", "litres", "liter", "liters", "lb", "lbs", "kg",
+    "bag", "bags", "pcs", "units", "km", "miles", "hrs", "hours",
+    "refund", "refunded", "credit", "credited", "rebate", "returned", "reimbursed", "reimbursement",
+    "pay", "back", "loan", "advance", "deposit", "owed", "owe", "cr",
+}
+# A sign or bracket on the amount itself ("-250", "-$250", "(250)"); "fuel - 250" is a separator
+_NEGATIVE_RE = re.compile(r"[-\u2212(](?:\$|tt\$|us\$)?$", re.I)
+
+# Purchase grammar pieces, tried on each item in this order
+_LEAD_RE = re.compile(r"^(?:bought|purchased|got|paid\s+for|received)\s+", re.I)
+_SUPPLIER_RE = re.compile(r"\b(?:from|supplier:?)\s+([a-z][\w&'. -]*?)\s*(?=$|\s(?:@|at|for|on)\b|[@=])", re.I)
+_PRICE_RE = re.compile(r"(?:@|\bat\b)\s*" + _MONEY + r"(?:\s*(?:/|per\s+)\s*([a-z0-9³^]+)|\s*(?:each|ea)\b)?", re.I)
+_LINE_TOTAL_RE = re.compile(r"(?:\bfor\b|=)\s*" + _MONEY + r"\b", re.I)
+_QTY_FIRST_RE = re.compile(r"^" + _NUM + r"\s*([a-z][a-z0-9³^]*(?:\s+yards?)?)\.?\s+(?:of\s+)?(.+)$", re.I)
+_QTY_LAST_RE = re.compile(r"^(.+?)\s+" + _NUM + r"\s*([a-z][a-z0-9³^]*)$", re.I)
+_HEADER_RES = (
+    ("invoice_number", re.compile(r"^(?:invoice|inv)\s*(?:no\.?|number|#)?\s*:?\s*#?\s*([a-z0-9][\w/-]*)$", re.I)),
+    ("tax", re.compile(r"^(?:tax|vat)\s*:?\s*" + _MONEY + r"$", re.I)),
+    ("total", re.compile(r"^(?:total|grand\s+total)\s*:?\s*" + _MONEY + r"$", re.I)),
+    ("supplier_name", re.compile(r"^(?:from|supplier:?)\s+([a-z][\w&'. -]*)$", re.I)),
+)
+
+
+def _num(s: str) -> float:
+    return float(s.replace(",", ""))
+
+
+def _currency(text: str) -> str:
+    return "USD" if re.search(r"\busd\b|\bus\$", text, re.I) else "TTD"
+
+
+def _strip_noise(text: str) -> str:
+    return re.sub(r"\b(?:ttd|usd)\b|tt\$|us\$", " ", text, flags=re.I)
+
+
+def _purchase_line(item: str) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+    """(raw line, supplier named in it, confidence) for one item."""
+    conf = 1.0
+    item = _LEAD_RE.sub("", item.strip())
+    supplier = None
+    m = _SUPPLIER_RE.search(item)
+    if m:
+        supplier = m.group(1).strip(" .")
+        item = (item[:m.start()] + " " + item[m.end():]).strip()
+    line: Dict[str, Any] = {}
+    m = _PRICE_RE.search(item)
+    if m:
+        line["unit_price"] = _num(m.group(1))
+        per = m.group(2)
+        item = (item[:m.start()] + " " + item[m.end():]).strip()
+    else:
+        per = None
+    m = _LINE_TOTAL_RE.search(item)
+    if m:
+        line["line_total"] = _num(m.group(1))
+        item = (item[:m.start()] + " " + item[m.end():]).strip()
+    item = re.sub(r"\s+", " ", item).strip(" ,.-")
+
+    m = _QTY_FIRST_RE.match(item)
+    if m and _norm_unit_staff(m.group(2)) in _ALLOWED_UNITS_STAFF:
+        qty, unit, desc = m.group(1), m.group(2), m.group(3)
+    else:
+        m = _QTY_LAST_RE.match(item)
+        if not m or _norm_unit_staff(m.group(3)) not in _ALLOWED_UNITS_STAFF:
+            return None, supplier, 0.0
+        desc, qty, unit = m.group(1), m.group(2), m.group(3)
+    unit = _norm_unit_staff(unit)
+    if per and _norm_unit_staff(per) != unit:
+        conf = GUESS  # "@ 350/bag" on a line measured in yd3
+    desc = desc.strip(" ,.-")
+    # A bare number left in the description is a price or quantity we did not place
+    if re.search(r"(?<![\w./])\d+(?:\.\d+)?(?![\w./\"'])", desc):
+        conf = GUESS
+    line.update(description=desc, unit=unit, qty=_num(qty))
+    return line, supplier, conf
+
+
+def parse_purchase(text: str) -> Tuple[dict, float]:
+    """Purchase text -> (propose_purchase_from_text-shaped dict, confidence)."""
+    out: Dict[str, Any] = {"supplier_name": None, "invoice_date": None, "invoice_number": None,
+                           "currency": _currency(text), "lines": []}
+    conf = 1.0
+    body = _strip_noise(text)
+    dates = set(_DATE_RE.findall(body))
+    if len(dates) > 1 or _OTHER_DATE_RE.search(body):
+        conf = GUESS
+    if dates:
+        out["invoice_date"] = sorted(dates)[0]
+        body = _DATE_RE.sub(" ", body)
+    body = re.sub(r"\bon\s+(?=[\n;,]|$)", " ", body)  # "on 2025-01-15" leaves a dangling "on"
+    raw_lines: List[Dict[str, Any]] = []
+    suppliers = set()
+    for item in _SPLIT_RE.split(body.strip()):
+        item = item.strip(" .")
+        if not item:
+            continue
+        for field, rx in _HEADER_RES:
+            m = rx.match(item)
+            if m:
+                value = m.group(1).strip()
+                if field == "supplier_name":
+                    suppliers.add(value)
+                else:
+                    out[field] = _num(value) if field in ("tax", "total") else value
+                break
+        else:
+            line, supplier, c = _purchase_line(item)
+            conf = min(conf, c)
+            if line is None:
+                continue
+            raw_lines.append(line)
+            if supplier:
+                suppliers.add(supplier)
+    if len({s.lower() for s in suppliers}) > 1:
+        conf = GUESS
+    if suppliers:
+        out["supplier_name"] = sorted(suppliers)[0]
+    out["lines"] = _validate_purchase_lines(raw_lines)
+    if not out["lines"] or len(out["lines"]) != len(raw_lines):
+        conf = min(conf, GUESS)
+    if isinstance(out.get("total"), float) and out["lines"]:
+        lines_total = sum(li.get("line_total", 0.0) for li in out["lines"]) + (out.get("tax") or 0.0)
+        if all("line_total" in li for li in out["lines"]) and abs(lines_total - out["total"]) > 0.01:
+            conf = min(conf, GUESS)  # the stated total disagrees with the lines
+    return out, conf
+
+
+def _expense(item: str) -> Tuple[Optional[Dict[str, Any]], float]:
+    amounts = list(re.finditer(_MONEY, item, re.I))
+    if len(amounts) != 1:
+        return None, 0.0
+    m = amounts[0]
+    negative = bool(_NEGATIVE_RE.search(item[:m.start(1)]))
+    rest = re.sub(r"\s+", " ", (item[:m.start()] + " " + item[m.end():])).strip(" :-=,.")
+    rest = re.sub(r"^(?:paid|spent)\s+|\s+(?:paid|spent)$", "", rest, flags=re.I)
+    words = re.findall(r"[a-z]+", rest.lower())
+    categories = {_EXPENSE_CATEGORY[w] for w in words if w in _EXPENSE_CATEGORY}
+    if len(categories) != 1 or negative or _EXPENSE_DOUBT.intersection(words):
+        return {"category": "other", "description": rest, "amount": _num(m.group(1))}, GUESS
+    return {"category": categories.pop(), "description": rest, "amount": _num(m.group(1))}, 1.0
+
+
+def parse_expenses(text: str) -> Tuple[dict, float]:
+    """Expense text -> (propose_expenses_from_text-shaped dict, confidence)."""
+    conf = 1.0
+    body = _strip_noise(text)
+    dates = set(_DATE_RE.findall(body))
+    out: Dict[str, Any] = {"expenses": []}
+    if len(dates) > 1 or _OTHER_DATE_RE.search(body):
+        conf = GUESS
+    if dates:
+        out["date"] = sorted(dates)[0]
+        body = _DATE_RE.sub(" ", body)
+    body = re.sub(r"\bon\s+(?=[\n;,]|$)", " ", body)
+    raw = []
+    for item in _SPLIT_RE.split(body.strip()):
+        item = item.strip(" .")
+        if not item:
+            continue
+        exp, c = _expense(item)
+        conf = min(conf, c)
+        if exp is not None:
+            raw.append(exp)
+    out["expenses"] = _validate_expenses(raw)
+    if not out["expenses"] or len(out["expenses"]) != len(raw):
+        conf = min(conf, GUESS)
+    return out, conf
+
+
+class HitRate:
+    """Counts of texts answered locally vs sent to the model, per kind."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, List[int]] = {}
+
+    def record(self, kind: str, local: bool) -> None:
+        with self._lock:
+            c = self._counts.setdefault(kind, [0, 0])
+            c[0 if local else 1] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {kind: {"local": l, "model": m, "hit_rate": round(l / (l + m), 3) if l + m else None}
+                    for kind, (l, m) in self._counts.items()}
+
+
+HITS = HitRate()
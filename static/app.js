@@ -10,6 +10,33 @@ function addMsg(role, text) {
   bubble.textContent = text;
   chatDiv.appendChild(bubble);
   chatDiv.scrollTop = chatDiv.scrollHeight;
+  return bubble;
+}
+
+function renderEstimate(data) {
+  if (!data || !data.estimate) return;
+  const results = document.getElementById("results");
+  const bomTbody = document.querySelector("#bom tbody");
+  const totalDiv = document.getElementById("total");
+  const notesDiv = document.getElementById("notes");
+
+  results.style.display = "block";
+  bomTbody.innerHTML = "";
+
+  (data.estimate.lines || []).forEach((l) => {
+    const tr = document.createElement("tr");
+    tr.innerHTML = `
+      <td>${l.name}</td>
+      <td>${Number(l.qty).toFixed(2)}</td>
+      <td>${l.unit}</td>
+      <td>${Number(l.unit_price || 0).toFixed(2)}</td>
+      <td>${Number(l.total || 0).toFixed(2)}</td>
+    `;
+    bomTbody.appendChild(tr);
+  });
+
+  totalDiv.textContent = "Total: " + Number(data.estimate.total || 0).toFixed(2);
+  notesDiv.textContent = data.ai_notes ? "Notes: " + data.ai_notes : "";
 }
 
 function setSending(isSending) {
@@ -38,15 +65,37 @@ async function onSend() {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        "Accept": "text/event-stream, application/json",
         "Cache-Control": "no-cache"
       },
       cache: "no-store",
       body: JSON.stringify({ message: text, spec })
     });
 
+    // Streaming: estimate first, then the narrative token by token
+    const ct = resp.headers.get("content-type") || "";
+    if (ct.includes("text/event-stream")) {
+      const bubble = addMsg("assistant", "…");
+      let narrative = "";
+      await readEventStream(resp, (name, ev) => {
+        if (name === "estimate") {
+          renderEstimate(ev);
+        } else if (name === "token") {
+          narrative += ev.text || "";
+          bubble.textContent = narrative;
+        } else if (name === "error") {
+          console.error("Stream error:", ev.error);
+          bubble.textContent = (narrative ? narrative + "\n\n" : "") + "(The explanation was cut off: " + (ev.error || "error") + ")";
+        } else if (name === "done") {
+          spec = ev.spec || spec;
+          bubble.textContent = ev.assistant || narrative || "OK.";
+        }
+      });
+      return;
+    }
+
     // Try JSON first; fall back to text for debugging
     let data = null;
-    const ct = resp.headers.get("content-type") || "";
     if (ct.includes("application/json")) {
       data = await resp.json();
     } else {
@@ -65,31 +114,7 @@ async function onSend() {
 
     spec = data.spec || spec;
     addMsg("assistant", data.assistant || "OK.");
-
-    if (data.estimate) {
-      const results = document.getElementById("results");
-      const bomTbody = document.querySelector("#bom tbody");
-      const totalDiv = document.getElementById("total");
-      const notesDiv = document.getElementById("notes");
-
-      results.style.display = "block";
-      bomTbody.innerHTML = "";
-
-      (data.estimate.lines || []).forEach((l) => {
-        const tr = document.createElement("tr");
-        tr.innerHTML = `
-          <td>${l.name}</td>
-          <td>${Number(l.qty).toFixed(2)}</td>
-          <td>${l.unit}</td>
-          <td>${Number(l.unit_price || 0).toFixed(2)}</td>
-          <td>${Number(l.total || 0).toFixed(2)}</td>
-        `;
-        bomTbody.appendChild(tr);
-      });
-
-      totalDiv.textContent = "Total: " + Number(data.estimate.total || 0).toFixed(2);
-      notesDiv.textContent = data.ai_notes ? "Notes: " + data.ai_notes : "";
-    }
+    renderEstimate(data);
   } catch (e) {
     console.error(e);
     addMsg("assistant", "Sorry, something went wrong.");
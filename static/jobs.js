@@ -0,0 +1,28 @@
+// static/jobs.js
+
+// POST body to an extraction endpoint as a background job and poll until it
+// finishes. Resolves with the same JSON the synchronous endpoint returns
+// ({ok: true, ...result}); rejects with the job's error message.
+async function runJob(url, body, onStatus) {
+  const r = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(Object.assign({}, body, { async: true })),
+  });
+  const j = await r.json().catch(() => ({}));
+  if (!r.ok || !j.ok) throw new Error(j.error || r.statusText);
+  if (!j.job_id) return j; // server answered inline
+
+  let delay = 500;
+  for (;;) {
+    await new Promise((res) => setTimeout(res, delay));
+    delay = Math.min(delay * 1.5, 3000);
+    const pr = await fetch(j.poll, { headers: { Accept: "application/json" } });
+    const pj = await pr.json().catch(() => ({}));
+    if (!pr.ok || !pj.ok) throw new Error(pj.error || pr.statusText);
+    const job = pj.job;
+    if (onStatus) onStatus(job.status);
+    if (job.status === "done") return Object.assign({ ok: true }, job.result);
+    if (job.status === "failed") throw new Error(job.error || "Job failed");
+  }
+}
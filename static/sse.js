@@ -0,0 +1,39 @@
+// static/sse.js
+
+// Read a text/event-stream fetch() response, calling onEvent(name, data) per event.
+// data is the parsed JSON payload of the event's data: line(s).
+async function readEventStream(resp, onEvent) {
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+
+  const dispatch = (block) => {
+    let name = "message";
+    const data = [];
+    block.split("\n").forEach((line) => {
+      if (line.startsWith("event:")) name = line.slice(6).trim();
+      else if (line.startsWith("data:")) data.push(line.slice(5).trimStart());
+    });
+    if (!data.length) return;
+    let payload = null;
+    try {
+      payload = JSON.parse(data.join("\n"));
+    } catch (e) {
+      console.error("Bad SSE payload:", data);
+      return;
+    }
+    onEvent(name, payload);
+  };
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let idx;
+    while ((idx = buf.indexOf("\n\n")) >= 0) {
+      dispatch(buf.slice(0, idx));
+      buf = buf.slice(idx + 2);
+    }
+  }
+  if (buf.trim()) dispatch(buf);
+}
@@ -51,7 +51,7 @@
         const anchors = Array.from(document.getElementById('exp-uploaded').querySelectorAll('a'));
         const ids = anchors.map(a => a.textContent);
         if (!ids.length) { alert('Upload a file first.'); return; }
-        const j = await postJSON('/api/staff/expenses/extract', { file_ids: ids });
+        const j = await runJob('/api/staff/expenses/extract', { file_ids: ids });
         const data = j.data||{}; const items = data.expenses||[];
         if (data.date && !document.getElementById('exp-date').value){ document.getElementById('exp-date').value = data.date; }
         if (items.length){
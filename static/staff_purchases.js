@@ -98,7 +98,7 @@
     const ids = anchors.map(a => a.textContent);
     if (!ids.length) { alert('Upload the bill first.'); return; }
     try{
-      const j = await postJSON('/api/staff/purchases/extract', { file_ids: ids });
+      const j = await runJob('/api/staff/purchases/extract', { file_ids: ids });
       mergeAIData(j.data||{});
     }catch(e){ alert('AI extract failed: '+ e.message); }
   }
@@ -0,0 +1,109 @@
+// static/staff_purchases_batch.js
+
+(function(){
+  const $ = sel => document.querySelector(sel);
+
+  function fmt(n){ n = Number(n); return isNaN(n)? '—' : n.toFixed(2); }
+  function esc(s){ const d = document.createElement('div'); d.textContent = s == null ? '' : String(s); return d.innerHTML; }
+
+  let total = 0;
+
+  function row(index){
+    let tr = document.getElementById('inv-' + index);
+    if (!tr) {
+      tr = document.createElement('tr');
+      tr.id = 'inv-' + index;
+      tr.innerHTML = '<td>' + (index + 1) + '</td><td class="file"></td><td class="status">queued</td>'
+        + '<td class="supplier"></td><td class="number"></td><td class="lines"></td><td class="total"></td><td class="draft"></td>';
+      $('#results tbody').appendChild(tr);
+    }
+    return tr;
+  }
+
+  function showResult(r){
+    const tr = row(r.index);
+    let status = r.status;
+    if (r.status === 'duplicate') status = 'duplicate of #' + (r.duplicate_of + 1);
+    if (r.status === 'failed') status = 'failed: ' + (r.error || '');
+    tr.querySelector('.status').textContent = status;
+    if (r.status === 'extracted') {
+      tr.querySelector('.supplier').textContent = r.supplier_name || '—';
+      tr.querySelector('.number').textContent = r.invoice_number || '—';
+      tr.querySelector('.lines').textContent = r.lines;
+      tr.querySelector('.total').textContent = fmt(r.total);
+    }
+  }
+
+  function showSaved(s){
+    const tr = row(s.index);
+    tr.querySelector('.status').textContent = 'saved';
+    tr.querySelector('.draft').innerHTML = '<a href="/staff/purchases/new?id=' + s.invoice_id + '">#' + s.invoice_id + '</a>';
+  }
+
+  function showCounts(p){
+    const bar = $('#bar');
+    bar.style.display = '';
+    bar.max = p.total || total || 1;
+    bar.value = p.done || 0;
+    $('#summary').textContent = (p.done || 0) + ' / ' + (p.total || total) + ' done'
+      + (p.failed ? ', ' + p.failed + ' failed' : '')
+      + (p.duplicates ? ', ' + p.duplicates + ' duplicates' : '');
+  }
+
+  async function upload(files){
+    const fd = new FormData();
+    files.forEach(f => fd.append('file', f));
+    const resp = await fetch('/api/uploads', { method:'POST', body: fd });
+    const j = await resp.json();
+    if (!resp.ok || !j.ok) throw new Error(j.error||'Upload failed');
+    return j.files || [];
+  }
+
+  async function onStart(){
+    const files = Array.from($('#files').files||[]);
+    if (!files.length) { alert('Choose invoice files first'); return; }
+    const btn = $('#btn-start');
+    btn.disabled = true;
+    $('#results tbody').innerHTML = '';
+    try{
+      $('#summary').textContent = 'Uploading ' + files.length + ' files…';
+      const uploaded = await upload(files);
+      total = uploaded.length;
+      uploaded.forEach((f, i) => { row(i).querySelector('.file').innerHTML = '<a href="' + f.url + '" target="_blank">' + esc(f.filename) + '</a>'; });
+      const r = await fetch('/api/staff/purchases/extract-batch', {
+        method:'POST', headers:{'Content-Type':'application/json'},
+        body: JSON.stringify({ file_ids: uploaded.map(f => f.id) })
+      });
+      const j = await r.json().catch(() => ({}));
+      if (!r.ok || !j.ok) throw new Error(j.error || r.statusText);
+      showCounts({ total, done: 0 });
+      const ev = await fetch(j.events, { headers: { Accept: 'text/event-stream' } });
+      if (!ev.ok) throw new Error('Could not follow the batch');
+      await readEventStream(ev, (name, data) => {
+        if (name === 'progress') {
+          (data.results || []).forEach(showResult);
+          (data.saved || []).forEach(showSaved);
+          showCounts(data);
+        } else if (name === 'done') {
+          const job = data.job || {};
+          if (job.status === 'failed') { $('#summary').textContent = 'Batch failed: ' + (job.error || ''); return; }
+          const p = job.result || {};
+          (p.results || []).forEach(showResult);
+          (p.saved || []).forEach(showSaved);
+          showCounts(p);
+          $('#summary').textContent += ' — ' + (p.saved || []).length + ' drafts saved';
+        } else if (name === 'error') {
+          $('#summary').textContent = data.error || 'Error';
+        }
+      });
+    }catch(e){
+      alert(e.message);
+    }finally{
+      btn.disabled = false;
+    }
+  }
+
+  document.addEventListener('DOMContentLoaded', () => {
+    $('#btn-start').addEventListener('click', onStart);
+  });
+})();